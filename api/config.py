@@ -1,5 +1,6 @@
 """API config, contains all required config for the API."""
 from pathlib import Path
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # path to the env file
@@ -14,10 +15,100 @@ class Config(BaseSettings):
     DB_PASSWORD: str
     DB_NAME: str
     DB_PORT: str
+    # database connection pool, see SQLAlchemy QueuePool
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    # -1 keeps connections forever
+    DB_POOL_RECYCLE_SECONDS: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # PgBouncer in transaction mode can't keep prepared statements
+    DB_PGBOUNCER: bool = False
+    # most entries in one bulk create request
+    DB_BULK_MAX_ITEMS: int = 1000
+
+    REDIS_PORT: int = 6379
+    REDIS_DB: int = 1
 
     AI_API_KEY: str
     AI_MODEL_NAME: str
+    # models for certain tasks, AI_MODEL_NAME is used if not set
+    AI_PLAN_MODEL_NAME: Optional[str] = None
+    AI_CHAT_MODEL_NAME: Optional[str] = None
+    # if chat model doesn't answer in time, the same request
+    # is sent to the hedge model, the first answer is used
+    AI_HEDGE_MODEL_NAME: Optional[str] = None
+    AI_HEDGE_AFTER_SECONDS: Optional[float] = None
     AI_API_MAX_RETRIES: int = 10
+    # all attempts of a request must fit into the deadline
+    AI_REQUEST_DEADLINE_SECONDS: float = 120
+    AI_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    AI_RETRY_MAX_DELAY_SECONDS: float = 10
+    # circuit opens when this share of requests in the window fails
+    AI_CIRCUIT_FAILURE_RATE: float = 0.5
+    AI_CIRCUIT_MIN_REQUESTS: int = 10
+    AI_CIRCUIT_WINDOW_SECONDS: float = 60
+    AI_CIRCUIT_OPEN_SECONDS: float = 30
+    # AI provider HTTP connection pool
+    AI_HTTP_MAX_CONNECTIONS: int = 100
+    AI_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    AI_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30
+    AI_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5
+    # share identical AI calls between API workers using Redis
+    AI_SINGLE_FLIGHT_USE_REDIS: bool = False
+    AI_SINGLE_FLIGHT_LOCK_SECONDS: float = 300
+    # limits of outbound AI requests, shared between workers with Redis
+    AI_MAX_CONCURRENCY: int = 8
+    AI_TOKENS_PER_MINUTE: Optional[int] = None
+    AI_SCHEDULER_USE_REDIS: bool = False
+    # cache of AI responses, TTL 0 disables caching for the kind
+    AI_CACHE_MAX_ENTRIES: int = 1000
+    AI_CACHE_CHAT_TTL_SECONDS: float = 3600
+    AI_CACHE_PLAN_TTL_SECONDS: float = 0
+    AI_CACHE_USE_REDIS: bool = False
+    # answers to similar questions that were asked before
+    AI_FAQ_ENABLED: bool = False
+    AI_FAQ_MAX_ENTRIES: int = 100000
+    AI_FAQ_DIMENSIONS: int = 512
+    AI_FAQ_THRESHOLD: float = 0.85
+    # send user's own answer without AI if their data hasn't changed,
+    # otherwise found answers are hints for the FAQ model
+    AI_FAQ_ANSWER_DIRECTLY: bool = False
+    AI_FAQ_MODEL_NAME: Optional[str] = None
+    # token budget of a single AI request
+    AI_CONTEXT_TOKENS: int = 16000
+    AI_MAX_OUTPUT_TOKENS: int = 3000
+    AI_MIN_OUTPUT_TOKENS: int = 256
+    # limit for user's free text fields (goal, plan wishes)
+    AI_MAX_TEXT_FIELD_TOKENS: int = 300
+
+    # reload activity levels in all API workers after a change using Redis
+    ACTIVITY_LEVELS_SYNC_USE_REDIS: bool = True
+
+    # background plan generation
+    PLAN_JOB_WORKERS: int = 4
+    PLAN_JOB_QUEUE_SIZE: int = 100
+    PLAN_JOB_RESULT_TTL_SECONDS: float = 3600
+    # share job states between API workers, without Redis run the API in one worker
+    PLAN_JOBS_USE_REDIS: bool = True
+    # generate a plan draft in the background when a profile is created or updated
+    PLAN_PREGENERATE: bool = False
+    # changes within this time after the last one make one draft
+    PLAN_DRAFT_DELAY_SECONDS: float = 30
+    # plan wishes about this many days at most regenerate only these days, 0 disables
+    PLAN_INCREMENTAL_MAX_DAYS: int = 3
+    # ready plans for similar profiles, used for plans without wishes
+    PLAN_TEMPLATES_ENABLED: bool = False
+    PLAN_TEMPLATE_MAX_DISTANCE: float = 0.15
+    # generated plans are kept as templates until there are this many
+    PLAN_TEMPLATES_MAX_COUNT: int = 1000
+    # load new templates in all API workers using Redis
+    PLAN_TEMPLATES_SYNC_USE_REDIS: bool = True
+    # add a short AI advice to the template, otherwise it's given at once
+    PLAN_TEMPLATE_PERSONALIZE: bool = False
+    # gzip plan responses of this size and bigger if the client accepts it, 0 disables
+    PLAN_GZIP_MIN_BYTES: int = 0
 
     model_config = SettingsConfigDict(env_file=ENV_PATH,
                                       env_file_encoding='utf-8',
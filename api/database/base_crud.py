@@ -1,7 +1,8 @@
 """Base Database Access Object for CRUD operations."""
-from typing import Generic, TypeVar, Iterable
+from typing import Any, AsyncIterator, Generic, TypeVar, Iterable
+import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Select, delete, insert, inspect, select, update
 from pydantic import BaseModel
 from api.exceptions import NotFoundError
 from api.database.base_model import BaseDatabaseModel
@@ -16,8 +17,21 @@ class BaseCRUD(Generic[DatabaseModelT]):
     Base DAO class for CRUD operations for any model.
 
     Override '_model' to use with some specific model.
+
+    Override '_loader_profiles' to choose what relations are
+    loaded with entries, e.g. 'summary' without heavy relations.
+    Relations are loaded as set in the model if there is no profile.
     """
     _model: type[DatabaseModelT]
+    # profile name -> loader options
+    _loader_profiles: dict[str, list[Any]] = {}
+
+    @classmethod
+    def _get_loader_options(cls, profile: str | None) -> list[Any]:
+        """Get loader options of the profile, model's defaults if there is none."""
+        if profile is None:
+            return []
+        return cls._loader_profiles.get(profile, [])
 
     @classmethod
     async def create(cls, data: BaseModel, session: AsyncSession) -> DatabaseModelT:
@@ -34,26 +48,129 @@ class BaseCRUD(Generic[DatabaseModelT]):
         return entry
 
     @classmethod
-    async def get_all(cls, session: AsyncSession) -> Iterable[DatabaseModelT] | None:
-        """Get all model's entries in the database.
+    async def create_many(cls, data: list[BaseModel], session: AsyncSession) -> int:
+        """Create many entries in the database with one executemany.
+
+        Entries are not loaded back, returns the number of created entries.
 
         Args:
+            data (`list[pydantic.BaseModel]`): pydantic model instances with required data
             session (`AsyncSession`): an asynchronous database session
         """
-        query = select(cls._model).filter_by()
+        if not data:
+            return 0
+        await session.execute(insert(cls._model), [entry.model_dump() for entry in data])
+        return len(data)
+
+    @classmethod
+    def _get_page_query(cls, after_id: int | None, limit: int | None = None) -> Select:
+        """Make a query for entries ordered by the primary key.
+
+        Keyset pagination: the next page starts after the last
+        primary key of the previous one, so it's an index range scan
+        instead of skipping rows with OFFSET.
+        """
+        primary_key = inspect(cls._model).primary_key[0]
+        query = select(cls._model).order_by(primary_key)
+        if after_id is not None:
+            query = query.where(primary_key > after_id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    @classmethod
+    async def get_all(cls,
+                      session: AsyncSession,
+                      after_id: int | None = None,
+                      limit: int | None = None) -> Iterable[DatabaseModelT] | None:
+        """Get model's entries in the database ordered by the ID/primary key.
+
+        Args:
+            session (`AsyncSession`): an asynchronous database session
+            after_id (`int | None`): get entries with greater ID/primary key only
+            limit (`int | None`): maximum number of entries, all if not set
+        """
+        query = cls._get_page_query(after_id, limit)
         result = await session.execute(query)
         entries = result.scalars().all()
         return entries
 
     @classmethod
-    async def get_by_id(cls, entry_id: int, session: AsyncSession) -> None | DatabaseModelT:
+    async def stream_all(cls,
+                         session: AsyncSession,
+                         after_id: int | None = None,
+                         batch_size: int = 500) -> AsyncIterator[DatabaseModelT]:
+        """Yield model's entries ordered by the ID/primary key one by one.
+
+        Uses a server-side cursor, only one batch of
+        entries is in memory at a time.
+
+        Args:
+            session (`AsyncSession`): an asynchronous database session
+            after_id (`int | None`): get entries with greater ID/primary key only
+            batch_size (`int`): entries fetched from the database at once
+        """
+        query = cls._get_page_query(after_id).execution_options(yield_per=batch_size)
+        result = await session.stream_scalars(query)
+        async for entry in result:
+            yield entry
+
+    @classmethod
+    async def copy_to_csv(cls,
+                          session: AsyncSession,
+                          queue_size: int = 16) -> AsyncIterator[bytes]:
+        """Yield all model's entries as CSV with a header, ordered by the ID/primary key.
+
+        Uses COPY ... TO STDOUT of asyncpg, rows are not turned into
+        objects. At most `queue_size` chunks wait to be sent,
+        COPY waits while the reader is slow.
+
+        Args:
+            session (`AsyncSession`): an asynchronous database session
+            queue_size (`int`): chunks kept in memory at most
+        """
+        primary_key = inspect(cls._model).primary_key[0]
+        query = select(*cls._model.__table__.columns).order_by(primary_key)
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        sql = str(query.compile(dialect=connection.dialect))
+
+        chunks: asyncio.Queue[bytes] = asyncio.Queue(maxsize=queue_size)
+        copy = asyncio.create_task(
+            raw_connection.driver_connection.copy_from_query(sql,
+                                                             output=chunks.put,
+                                                             format='csv',
+                                                             header=True))
+        try:
+            while not (copy.done() and chunks.empty()):
+                chunk = asyncio.ensure_future(chunks.get())
+                await asyncio.wait((chunk, copy), return_when=asyncio.FIRST_COMPLETED)
+                if chunk.done():
+                    # asyncpg gives bytearrays, responses take bytes
+                    yield bytes(chunk.result())
+                else:
+                    chunk.cancel()
+            # raise COPY errors
+            copy.result()
+        finally:
+            # the reader stopped early, stop COPY too
+            copy.cancel()
+            await asyncio.gather(copy, return_exceptions=True)
+
+    @classmethod
+    async def get_by_id(cls,
+                        entry_id: int,
+                        session: AsyncSession,
+                        profile: str | None = None) -> None | DatabaseModelT:
         """Get a model entry by the ID/primary key.
 
         Args:
             entry_id (`int`): entry's ID OR primary key
             session (`AsyncSession`): an asynchronous database session
+            profile (`str | None`): loader profile, e.g. 'summary' or 'full'
         """
-        return await session.get(cls._model, entry_id)
+        return await session.get(cls._model, entry_id,
+                                 options=cls._get_loader_options(profile))
 
     @classmethod
     async def update_by_id(cls,
@@ -62,36 +179,44 @@ class BaseCRUD(Generic[DatabaseModelT]):
                            session: AsyncSession):
         """Update an entry with new data by its ID/primary key.
 
+        It's one UPDATE ... RETURNING statement, the entry is not loaded.
+
         Args:
             entry_id (`int`): entry's ID OR primary key
             update_data (`pydantic.BaseModel`): a pydantic model instance with new data
             session (`AsyncSession`): an asynchronous database session
         """
         update_data_dict = update_data.model_dump(exclude_unset=True)
-        entry = await session.get(cls._model, entry_id)
+        primary_key = inspect(cls._model).primary_key[0]
+        if update_data_dict:
+            query = update(cls._model) \
+                .where(primary_key == entry_id) \
+                .values(**update_data_dict) \
+                .returning(primary_key)
+        else:
+            # nothing to change, only check the entry exists
+            query = select(primary_key).where(primary_key == entry_id)
+        result = await session.execute(query)
 
-        if entry is None:
+        if result.scalar_one_or_none() is None:
             raise NotFoundError(
                 f"There is no {cls._model.__name__.lower()} entry with such ID: {entry_id}.")
 
-        for key, value in update_data_dict.items():
-            setattr(entry, key, value)
-        await session.flush()
-
     @classmethod
-    async def delete_by_id(cls, entry_id: int, session: AsyncSession) -> DatabaseModelT:
+    async def delete_by_id(cls, entry_id: int, session: AsyncSession):
         """Delete an entry by its ID/primary key.
 
+        It's one DELETE ... RETURNING statement, the entry is not loaded.
+        Related entries are deleted by the database (ON DELETE).
+
         Args:
             entry_id (`int`): entry's ID OR primary key
             session (`AsyncSession`): an asynchronous database session
         """
-        entry = await session.get(cls._model, entry_id)
+        primary_key = inspect(cls._model).primary_key[0]
+        query = delete(cls._model).where(primary_key == entry_id).returning(primary_key)
+        result = await session.execute(query)
 
-        if entry is None:
+        if result.scalar_one_or_none() is None:
             raise NotFoundError(
                 f"There is no {cls._model.__name__.lower()} entry with such ID: {entry_id}.")
-
-        await session.delete(entry)
-        await session.flush()
-        return entry
@@ -1,6 +1,6 @@
 """Base model of the API database."""
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import DateTime, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.ext.asyncio import AsyncAttrs
 
@@ -12,6 +12,8 @@ class BaseDatabaseModel(AsyncAttrs, DeclarativeBase):
     All of the models must inherit this model.
     """
     __abstract__ = True
+    # times are stored with the time zone, so they don't depend on the server's one
+    type_annotation_map = {datetime: DateTime(timezone=True)}
 
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), 
@@ -3,18 +3,29 @@ Database Access Objects for CRUD operations.
 
 Created for all models in the database.
 """
-from sqlalchemy import select
+from sqlalchemy import CTE, Integer, Select, String, case, column, delete, func, select, \
+    true, tuple_, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row, RowMapping
+from sqlalchemy.orm import noload
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from api.exceptions import NotFoundError
 from api.schemas.training_plan import TrainingPlanUpdate
 from .base_crud import BaseCRUD
-from .models import TrainingPlanModel, UserModel, ActivityLevelModel
+from .models import TrainingPlanModel, TrainingPlanDayModel, UserModel, ActivityLevelModel, \
+    PlanTemplateModel, TrainingPlanDraftModel
 
 
 class UserCRUD(BaseCRUD[UserModel]):
     """DAO class for CRUD operations with UserModel."""
     _model = UserModel
+    _loader_profiles = {
+        # profile data only, the plan (the biggest part) is not loaded
+        'summary': [noload(UserModel.training_plan)],
+        # profile data with the plan and its days
+        'full': []
+    }
 
     @classmethod
     async def create(cls, data: BaseModel, session: AsyncSession) -> UserModel:
@@ -23,6 +34,68 @@ class UserCRUD(BaseCRUD[UserModel]):
         await session.refresh(entry, attribute_names=["training_plan"])
         return entry
 
+    @classmethod
+    async def upsert(cls,
+                     user_id: int,
+                     user_data: BaseModel,
+                     session: AsyncSession) -> RowMapping:
+        """Create the user or update them if they exist.
+
+        It's one INSERT ... ON CONFLICT DO UPDATE statement,
+        returns the user's columns (relations are not loaded)
+        and `changed`: if the user is new or their data is changed.
+        The update time is kept when the data is the same.
+
+        Args:
+            user_id (`int`)
+            user_data (`pydantic.BaseModel`): a pydantic model instance with user data
+            session (`AsyncSession`): an asynchronous database session
+        """
+        user_data_dict = user_data.model_dump()
+        table = cls._model.__table__
+        query = pg_insert(table).values(**user_data_dict, id=user_id)
+        changed = tuple_(*(table.c[key] for key in user_data_dict)).is_distinct_from(
+            tuple_(*(query.excluded[key] for key in user_data_dict)))
+        query = query.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={**{key: query.excluded[key] for key in user_data_dict},
+                  'updated_at': case((changed, func.now()), else_=table.c.updated_at)}
+        )
+        # now() is the same in the whole transaction, a kept time is older
+        query = query.returning(*table.c, (table.c.updated_at == func.now()).label('changed'))
+        result = await session.execute(query)
+        return result.mappings().one()
+
+    @classmethod
+    async def get_version(cls,
+                          user_id: int,
+                          session: AsyncSession,
+                          with_plan: bool = False) -> Row | None:
+        """Get the values that change with the user, the user is not loaded.
+
+        It's update times of the user and their activity level
+        (and the plan's ID and update time with `with_plan`),
+        looked up by primary and unique keys.
+
+        Args:
+            user_id (`int`)
+            session (`AsyncSession`): an asynchronous database session
+            with_plan (`bool`): add the training plan
+        """
+        query = select(UserModel.updated_at,
+                       UserModel.activity_level,
+                       ActivityLevelModel.updated_at) \
+            .select_from(UserModel) \
+            .outerjoin(ActivityLevelModel, UserModel.activity_level == ActivityLevelModel.level) \
+            .where(UserModel.id == user_id)
+        if with_plan:
+            # plan's update time changes with its days too
+            query = query.add_columns(TrainingPlanModel.id, TrainingPlanModel.updated_at) \
+                .outerjoin(TrainingPlanModel, TrainingPlanModel.user_id == UserModel.id)
+        result = await session.execute(query)
+        return result.one_or_none()
+
+
 class TrainingPlanCRUD(BaseCRUD[TrainingPlanModel]):
     """
     DAO class for CRUD operations with TrainingPlanModel.
@@ -45,6 +118,20 @@ class TrainingPlanCRUD(BaseCRUD[TrainingPlanModel]):
         entry = result.scalar_one_or_none()
         return entry
 
+    @classmethod
+    async def get_version_by_user_id(cls,
+                                     user_id: int,
+                                     session: AsyncSession) -> Row | None:
+        """Get the ID and update time of the user's plan, the plan is not loaded.
+
+        Args:
+            user_id (`int`)
+            session (`AsyncSession`): an asynchronous database session
+        """
+        query = select(cls._model.id, cls._model.updated_at).filter_by(user_id=user_id)
+        result = await session.execute(query)
+        return result.one_or_none()
+
     @classmethod
     async def create_for_user(cls,
                               user_id: int,
@@ -57,58 +144,167 @@ class TrainingPlanCRUD(BaseCRUD[TrainingPlanModel]):
             session (`AsyncSession`): an asynchronous database session
         """
         plan_data_dict = plan_data.model_dump(exclude_unset=True)
+        days = plan_data_dict.pop('days', None) or []
         entry = cls._model(**plan_data_dict, user_id=user_id)
+        entry.days = [TrainingPlanDayModel(**day) for day in days]
         session.add(instance=entry)
         await session.flush()
         return entry
 
+    @classmethod
+    async def upsert_for_user(cls,
+                              user_id: int,
+                              plan_data: BaseModel,
+                              session: AsyncSession) -> RowMapping:
+        """Create the training plan for the user or replace the existing one.
+
+        The plan and its days are written with one statement:
+        INSERT ... ON CONFLICT DO UPDATE for the plan, and CTEs that
+        upsert new days and delete days that are not in the plan anymore.
+        Returns the plan's columns.
+
+        Args:
+            user_id (`int`)
+            plan_data (`pydantic.BaseModel`): a pydantic model instance with plan data
+            session (`AsyncSession`): an asynchronous database session
+        """
+        plan_data_dict = plan_data.model_dump()
+        days = plan_data_dict.pop('days', None) or []
+        plans = cls._model.__table__
+
+        plan_query = pg_insert(plans).values(**plan_data_dict, user_id=user_id)
+        plan_query = plan_query.on_conflict_do_update(
+            index_elements=[plans.c.user_id],
+            set_={**{key: plan_query.excluded[key] for key in plan_data_dict},
+                  'updated_at': func.now()}
+        ).returning(plans.c.id, plans.c.user_id, plans.c.plan_description)
+        plan = plan_query.cte('plan')
+
+        query = select(plan.c.id, plan.c.user_id, plan.c.plan_description)
+        query = cls._add_days_ctes(query, plan, days)
+        result = await session.execute(query)
+        return result.mappings().one()
+
+    @staticmethod
+    def _add_days_ctes(query: Select, plan: CTE, days: list[dict]) -> Select:
+        """Add CTEs that replace the days of the plan written by the `plan` CTE.
+
+        Days of the old plan that the new one doesn't have are deleted,
+        the others are inserted or updated by weekday.
+        """
+        plan_days = TrainingPlanDayModel.__table__
+        old_days_query = delete(plan_days).where(
+            plan_days.c.plan_id == select(plan.c.id).scalar_subquery(),
+            plan_days.c.weekday.not_in([day['weekday'] for day in days]))
+        query = query.add_cte(old_days_query.cte('old_days'))
+        if not days:
+            return query
+
+        new_days = values(column('weekday', Integer),
+                          column('title', String),
+                          column('description', String),
+                          name='new_days').data(
+            [(day['weekday'], day['title'], day['description']) for day in days])
+        days_query = pg_insert(plan_days).from_select(
+            ['plan_id', 'weekday', 'title', 'description'],
+            # every new day belongs to the one written plan
+            select(plan.c.id, new_days.c.weekday, new_days.c.title, new_days.c.description)
+            .select_from(plan).join(new_days, true()))
+        days_query = days_query.on_conflict_do_update(
+            index_elements=[plan_days.c.plan_id, plan_days.c.weekday],
+            set_={'title': days_query.excluded.title,
+                  'description': days_query.excluded.description,
+                  'updated_at': func.now()})
+        return query.add_cte(days_query.cte('days'))
+
     @classmethod
     async def update_by_user_id(cls,
                                 user_id: int,
                                 plan_data: TrainingPlanUpdate,
-                                session: AsyncSession) -> TrainingPlanModel:
+                                session: AsyncSession) -> RowMapping:
         """Update a training plan with new data by the user_id field.
 
+        It's one UPDATE ... RETURNING statement, the plan is not loaded.
+        If there are days in the data, they replace the plan's days
+        in the same statement. Returns the plan's columns.
+
         Args:
             user_id (`int`)
             plan_data (`TrainingPlanUpdate`): a pydantic model instance with new data
             session (`AsyncSession`): an asynchronous database session
         """
         update_data_dict = plan_data.model_dump(exclude_unset=True)
-        # there can be only one entry or none
-        query = select(cls._model).filter_by(user_id=user_id)
-        entry = await session.execute(query)
-        entry = entry.scalar_one_or_none()
+        days = update_data_dict.pop('days', None)
+        plans = cls._model.__table__
+
+        plan_query = update(plans) \
+            .where(plans.c.user_id == user_id) \
+            .values(**update_data_dict, updated_at=func.now()) \
+            .returning(plans.c.id, plans.c.user_id, plans.c.plan_description)
+        if days is None:
+            query = plan_query
+        else:
+            plan = plan_query.cte('plan')
+            query = select(plan.c.id, plan.c.user_id, plan.c.plan_description)
+            query = cls._add_days_ctes(query, plan, days)
 
+        result = await session.execute(query)
+        entry = result.mappings().one_or_none()
         if entry is None:
             raise NotFoundError(
                 f"There is no plan for user with such ID: {user_id}.")
-
-        for key, value in update_data_dict.items():
-            setattr(entry, key, value)
-        await session.flush()
         return entry
 
     @classmethod
     async def delete_by_user_id(cls,
                                 user_id: int,
-                                session: AsyncSession) -> TrainingPlanModel:
+                                session: AsyncSession):
         """Delete an entry by the user_id field.
 
+        It's one DELETE ... RETURNING statement, the plan is not loaded.
+        Plan days are deleted by the database (ON DELETE CASCADE).
+
         Args:
             user_id (`int`)
             session (`AsyncSession`): an asynchronous database session
         """
-        query = select(cls._model).filter_by(user_id=user_id)
-        entry = await session.execute(query)
-        entry = entry.scalar_one_or_none()
+        query = delete(cls._model) \
+            .where(cls._model.user_id == user_id) \
+            .returning(cls._model.id)
+        result = await session.execute(query)
 
-        if entry is None:
+        if result.scalar_one_or_none() is None:
             raise NotFoundError(
                 f"There is no plan for user with such ID: {user_id}.")
 
-        await session.delete(entry)
-        await session.flush()
+
+class TrainingPlanDayCRUD(BaseCRUD[TrainingPlanDayModel]):
+    """
+    DAO class for CRUD operations with TrainingPlanDayModel.
+    """
+    _model = TrainingPlanDayModel
+
+    @classmethod
+    async def get_by_user_id(cls,
+                             user_id: int,
+                             weekday: int,
+                             session: AsyncSession) -> None | TrainingPlanDayModel:
+        """Get a day of the user's training plan.
+
+        Only the day row is loaded, not the whole plan.
+
+        Args:
+            user_id (`int`)
+            weekday (`int`): day of the week, 0 is Monday
+            session (`AsyncSession`): an asynchronous database session
+        """
+        query = (select(cls._model)
+                 .join(TrainingPlanModel)
+                 .where(TrainingPlanModel.user_id == user_id,
+                        cls._model.weekday == weekday))
+        result = await session.execute(query)
+        # there can be only one entry or none
+        entry = result.scalar_one_or_none()
         return entry
 
 
@@ -117,3 +313,76 @@ class ActivityLevelCRUD(BaseCRUD[ActivityLevelModel]):
     DAO class for CRUD operations with ActivityLevelModel.
     """
     _model = ActivityLevelModel
+
+    @classmethod
+    async def get_version(cls, session: AsyncSession) -> Row:
+        """Get the number of levels and the last update time.
+
+        Args:
+            session (`AsyncSession`): an asynchronous database session
+        """
+        query = select(func.count(), func.max(cls._model.updated_at))
+        result = await session.execute(query)
+        return result.one()
+
+
+class TrainingPlanDraftCRUD(BaseCRUD[TrainingPlanDraftModel]):
+    """
+    DAO class for CRUD operations with TrainingPlanDraftModel.
+    """
+    _model = TrainingPlanDraftModel
+
+    @classmethod
+    async def get_by_user_id(cls,
+                             user_id: int,
+                             session: AsyncSession) -> None | TrainingPlanDraftModel:
+        """Get the plan draft for a user using their ID.
+
+        Args:
+            user_id (`int`)
+            session (`AsyncSession`): an asynchronous database session
+        """
+        query = select(cls._model).filter_by(user_id=user_id)
+        result = await session.execute(query)
+        # there can be only one entry or none
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def save_for_user(cls,
+                            user_id: int,
+                            draft_data: BaseModel,
+                            session: AsyncSession) -> TrainingPlanDraftModel:
+        """Create the plan draft for the user or replace the old one.
+
+        Args:
+            user_id (`int`)
+            draft_data (`pydantic.BaseModel`): a pydantic model instance with draft data
+            session (`AsyncSession`): an asynchronous database session
+        """
+        draft_data_dict = draft_data.model_dump(exclude_unset=True)
+        entry = await cls.get_by_user_id(user_id, session=session)
+        if entry is None:
+            entry = cls._model(**draft_data_dict, user_id=user_id)
+            session.add(instance=entry)
+        else:
+            for key, value in draft_data_dict.items():
+                setattr(entry, key, value)
+        await session.flush()
+        return entry
+
+    @classmethod
+    async def delete_by_user_id(cls, user_id: int, session: AsyncSession):
+        """Delete the plan draft of the user if there is one.
+
+        Args:
+            user_id (`int`)
+            session (`AsyncSession`): an asynchronous database session
+        """
+        await session.execute(delete(cls._model).filter_by(user_id=user_id))
+
+
+class PlanTemplateCRUD(BaseCRUD[PlanTemplateModel]):
+    """
+    DAO class for CRUD operations with PlanTemplateModel.
+    """
+    _model = PlanTemplateModel
@@ -1,10 +1,35 @@
 """Database related tools. Use to get sessions."""
 from functools import wraps
+from uuid import uuid4
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from api.config import config
+from .pool import InstrumentedQueuePool
 
 
-engine = create_async_engine(url=config.api_db_url)
+def get_connect_args() -> dict:
+    """Get asyncpg connection arguments.
+
+    With PgBouncer, statement caches are disabled and prepared
+    statements get unique names, because the next query
+    can go to another server connection.
+    """
+    if config.DB_PGBOUNCER:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+        }
+    return {"prepared_statement_cache_size": config.DB_PREPARED_STATEMENT_CACHE_SIZE}
+
+
+engine = create_async_engine(url=config.api_db_url,
+                             poolclass=InstrumentedQueuePool,
+                             pool_size=config.DB_POOL_SIZE,
+                             max_overflow=config.DB_POOL_MAX_OVERFLOW,
+                             pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+                             pool_recycle=config.DB_POOL_RECYCLE_SECONDS,
+                             pool_pre_ping=config.DB_POOL_PRE_PING,
+                             connect_args=get_connect_args())
 
 # use to work with database
 session_maker = async_sessionmaker(engine, expire_on_commit=False)
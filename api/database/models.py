@@ -1,7 +1,9 @@
 """All models of the API database."""
+from datetime import datetime
 from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from api.database.base_model import BaseDatabaseModel
 
 
@@ -35,7 +37,7 @@ class UserModel(BaseDatabaseModel):
     # connect to activity levels
     # one activity level per user
     activity_level: Mapped[Optional[int]] = mapped_column(
-        ForeignKey('activity_levels.level'))
+        ForeignKey('activity_levels.level', ondelete="SET NULL"))
     activity_level_relation: Mapped[Optional['ActivityLevelModel']] = relationship("ActivityLevelModel",
                                                                                    back_populates="users",
                                                                                    foreign_keys=[
@@ -51,7 +53,9 @@ class UserModel(BaseDatabaseModel):
                                                                         uselist=False,
                                                                         # load with user
                                                                         lazy="joined",
-                                                                        cascade="all, delete-orphan")
+                                                                        cascade="all, delete-orphan",
+                                                                        # deleted by the database
+                                                                        passive_deletes=True)
 
 
 class ActivityLevelModel(BaseDatabaseModel):
@@ -75,7 +79,9 @@ class ActivityLevelModel(BaseDatabaseModel):
     # multiple users for a level
     users: Mapped[list['UserModel']] = relationship("UserModel",
                                                     back_populates="activity_level_relation",
-                                                    foreign_keys="UserModel.activity_level")
+                                                    foreign_keys="UserModel.activity_level",
+                                                    # unset by the database
+                                                    passive_deletes=True)
 
 
 class TrainingPlanModel(BaseDatabaseModel):
@@ -90,6 +96,7 @@ class TrainingPlanModel(BaseDatabaseModel):
     - plan description - a string with the training plan
     content
     - user_id (FK) - a foreign key, the user who owns the plan
+    - days - the plan for every day of the week (from TrainingPlanDay)
     """
     __tablename__ = 'training_plans'
 
@@ -99,9 +106,103 @@ class TrainingPlanModel(BaseDatabaseModel):
 
     # connect to user
     # one user per plan
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), unique=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"),
+                                         unique=True)
     user: Mapped["UserModel"] = relationship("UserModel",
                                              back_populates="training_plan",
                                              # one-to-one
                                              uselist=False,
                                              single_parent=True)
+
+    # connect to plan days
+    # seven days per plan
+    days: Mapped[list['TrainingPlanDayModel']] = relationship("TrainingPlanDayModel",
+                                                              back_populates="plan",
+                                                              order_by="TrainingPlanDayModel.weekday",
+                                                              # load with plan
+                                                              lazy="selectin",
+                                                              cascade="all, delete-orphan",
+                                                              passive_deletes=True)
+
+
+class TrainingPlanDayModel(BaseDatabaseModel):
+    """
+    Training plan day database model.
+
+    A part of the TrainingPlan model, one
+    entry for every day of the week.
+
+    Fields:
+    - id (PK)
+    - plan_id (FK) - the plan that contains the day
+    - weekday - day of the week (0 is Monday)
+    - title - short description of the day (workout or rest)
+    - description - exercises, repetitions and advice
+    """
+    __tablename__ = 'training_plan_days'
+    # one entry per plan and day, also an index for day lookups
+    __table_args__ = (UniqueConstraint('plan_id', 'weekday'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True,
+                                    autoincrement=True)
+    plan_id: Mapped[int] = mapped_column(ForeignKey("training_plans.id", ondelete="CASCADE"))
+    weekday: Mapped[int]
+    title: Mapped[str]
+    description: Mapped[str]
+
+    # connect to plan
+    # one plan per day
+    plan: Mapped["TrainingPlanModel"] = relationship("TrainingPlanModel",
+                                                     back_populates="days")
+
+
+class TrainingPlanDraftModel(BaseDatabaseModel):
+    """
+    Training plan draft database model.
+
+    A plan generated in advance, right after the user
+    changed their profile. It becomes the user's plan
+    when they ask for a plan without wishes.
+
+    Fields:
+    - id (PK)
+    - user_id (FK) - the user the draft is made for
+    - profile_updated_at - user's `updated_at` at generation,
+    the draft is outdated if the profile changed after that
+    - days - the plan for every day of the week (JSON list)
+    """
+    __tablename__ = 'training_plan_drafts'
+
+    id: Mapped[int] = mapped_column(primary_key=True,
+                                    autoincrement=True)
+    # drafts are deleted with the user by the database
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"),
+                                         unique=True)
+    profile_updated_at: Mapped[datetime]
+    days: Mapped[list[dict]] = mapped_column(JSONB)
+
+
+class PlanTemplateModel(BaseDatabaseModel):
+    """
+    Plan template database model.
+
+    A ready training plan for some kind of users,
+    given to similar users without AI generation.
+
+    Fields:
+    - id (PK)
+    - gender, age, weight_kg, height_cm, activity_level, goal -
+    the profile the plan was made for
+    - days - the plan for every day of the week (JSON list)
+    """
+    __tablename__ = 'plan_templates'
+
+    id: Mapped[int] = mapped_column(primary_key=True,
+                                    autoincrement=True)
+    gender: Mapped[str]
+    age: Mapped[int]
+    weight_kg: Mapped[float]
+    height_cm: Mapped[float]
+    activity_level: Mapped[Optional[int]]
+    goal: Mapped[Optional[str]]
+    days: Mapped[list[dict]] = mapped_column(JSONB)
@@ -0,0 +1,67 @@
+"""Instrumented database connection pool."""
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from api.schemas.stats import DBPoolStats
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Connection pool that measures waiting for connections.
+
+    Checkouts, new and invalidated connections are counted
+    with pool events. Pool events have no "waiting started"
+    moment, so waiting time and timeouts are measured around `_do_get`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = DBPoolStats()
+        # a recreated pool gets the listeners of the old one
+        if '_dispatch' not in kwargs:
+            event.listen(self, 'connect', self._on_connect)
+            event.listen(self, 'checkout', self._on_checkout)
+            event.listen(self, 'invalidate', self._on_invalidate)
+
+    # `_do_get` is private API: it's where QueuePool waits for a free
+    # connection in SQLAlchemy 2.0 (2.0.41 in requirements.txt),
+    # check that it still is when SQLAlchemy is upgraded
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        wait_seconds = time.monotonic() - started
+        self.stats.total_wait_seconds += wait_seconds
+        self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, wait_seconds)
+        return connection
+
+    def recreate(self):
+        # keep statistics when the pool is recreated (e.g. engine.dispose()),
+        # old listeners keep updating them
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def get_stats(self) -> DBPoolStats:
+        """Get current pool usage and wait statistics."""
+        stats = self.stats.model_copy()
+        stats.size = self.size()
+        stats.checked_out = self.checkedout()
+        stats.overflow = max(self.overflow(), 0)
+        return stats
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        """Count a new database connection."""
+        self.stats.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        """Count a connection given from the pool."""
+        self.stats.checkouts += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        """Count a connection dropped because of an error."""
+        self.stats.invalidations += 1
@@ -0,0 +1,10 @@
+"""Redis related tools. Use to share state between API workers."""
+from redis.asyncio import Redis
+from api.config import config
+
+
+# use to work with Redis
+# connects on the first command, so it's safe to import without Redis
+redis = Redis(host=config.HOST,
+              port=config.REDIS_PORT,
+              db=config.REDIS_DB)
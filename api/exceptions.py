@@ -38,6 +38,13 @@ class AIRequestError(BaseCustomException):
         super().__init__(message, status_code=500)
 
 
+class QueueFullError(BaseCustomException):
+    """Too many queued tasks error."""
+
+    def __init__(self, message: str = "Queue is full"):
+        super().__init__(message, status_code=503)
+
+
 class UnexpectedError(BaseCustomException):
     """Unidentified error.
 
@@ -1,56 +1,517 @@
 """The client for OpenAI API."""
-from openai import AsyncOpenAI
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+import asyncio
+import logging
+import time
+from openai import NOT_GIVEN, AsyncOpenAI, AsyncStream, DefaultAsyncHttpxClient
+from pydantic import ValidationError as PydanticValidationError
+import httpx
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from api.schemas.user import User
+from api.schemas.training_plan import GeneratedTrainingPlan, GeneratedTrainingPlanDays, \
+    TrainingPlanDayInput
+from api.schemas.stats import AIFAQStats, AIUsageStats
 from api.config import config
 from api.exceptions import AIRequestError
+from api.database.redis import redis
 from .prompt import PromptManager
+from .single_flight import SingleFlight
+from .cache import ResponseCache
+from .resilience import CircuitBreaker, RetryPolicy
+from .retrieval import FAQIndex, HashedNgramEmbedder
+from .scheduler import LLMScheduler, Priority
+from .token_budget import estimate_messages_tokens, get_max_tokens
+
+
+logger = logging.getLogger(__name__)
+
+ResultT = TypeVar("ResultT")
 
 
 class AIClient:
     """The client for OpenAI API usage. Use to get responses from the model."""
+    # retries are made by RETRY_POLICY, not by the SDK
     CLIENT = AsyncOpenAI(api_key=config.AI_API_KEY,
                          base_url="https://openrouter.ai/api/v1",
-                         max_retries=config.AI_API_MAX_RETRIES)
-    MODEL = config.AI_MODEL_NAME
+                         max_retries=0,
+                         http_client=DefaultAsyncHttpxClient(
+                             limits=httpx.Limits(
+                                 max_connections=config.AI_HTTP_MAX_CONNECTIONS,
+                                 max_keepalive_connections=config.AI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                                 keepalive_expiry=config.AI_HTTP_KEEPALIVE_EXPIRY_SECONDS),
+                             timeout=httpx.Timeout(config.AI_REQUEST_DEADLINE_SECONDS,
+                                                   connect=config.AI_HTTP_CONNECT_TIMEOUT_SECONDS)))
+    # models for every task, the default model is used if not set
+    PLAN_MODEL = config.AI_PLAN_MODEL_NAME or config.AI_MODEL_NAME
+    CHAT_MODEL = config.AI_CHAT_MODEL_NAME or config.AI_MODEL_NAME
+    FAQ_MODEL = config.AI_FAQ_MODEL_NAME or CHAT_MODEL
+    # identical concurrent requests share one AI call
+    SINGLE_FLIGHT = SingleFlight(redis=redis if config.AI_SINGLE_FLIGHT_USE_REDIS else None,
+                                 lock_ttl_seconds=config.AI_SINGLE_FLIGHT_LOCK_SECONDS)
+    # recent responses, identical prompts are answered from here
+    CACHE = ResponseCache(max_entries=config.AI_CACHE_MAX_ENTRIES,
+                          redis=redis if config.AI_CACHE_USE_REDIS else None)
+    # answered questions, similar ones of any user are answered with their help
+    FAQ_INDEX = FAQIndex(HashedNgramEmbedder(config.AI_FAQ_DIMENSIONS),
+                         capacity=config.AI_FAQ_MAX_ENTRIES) if config.AI_FAQ_ENABLED else None
+    FAQ_STATS = AIFAQStats()
+    # limits concurrent requests and tokens per minute
+    SCHEDULER = LLMScheduler(max_concurrency=config.AI_MAX_CONCURRENCY,
+                             tokens_per_minute=config.AI_TOKENS_PER_MINUTE,
+                             redis=redis if config.AI_SCHEDULER_USE_REDIS else None)
+    RETRY_POLICY = RetryPolicy(max_retries=config.AI_API_MAX_RETRIES,
+                               deadline_seconds=config.AI_REQUEST_DEADLINE_SECONDS,
+                               base_delay_seconds=config.AI_RETRY_BASE_DELAY_SECONDS,
+                               max_delay_seconds=config.AI_RETRY_MAX_DELAY_SECONDS)
+    # fail fast when a model is down, one breaker per model
+    BREAKERS: dict[str, CircuitBreaker] = {}
+    # token usage statistics of this process
+    USAGE = AIUsageStats()
+
+    @classmethod
+    def get_breaker(cls, model: str) -> CircuitBreaker:
+        """Get the circuit breaker of the model."""
+        if model not in cls.BREAKERS:
+            cls.BREAKERS[model] = CircuitBreaker(
+                failure_rate_threshold=config.AI_CIRCUIT_FAILURE_RATE,
+                min_requests=config.AI_CIRCUIT_MIN_REQUESTS,
+                window_seconds=config.AI_CIRCUIT_WINDOW_SECONDS,
+                open_seconds=config.AI_CIRCUIT_OPEN_SECONDS)
+        return cls.BREAKERS[model]
+
+    @classmethod
+    async def _hedge(cls,
+                     call: Callable[[str], Awaitable[ResultT]],
+                     model: str,
+                     priority: Priority,
+                     tokens: int,
+                     discard: Callable[[ResultT], Awaitable[None]] | None = None
+                     ) -> tuple[str, ResultT]:
+        """
+        Make the call with the model, if it takes too long,
+        make the same call with the hedge model too.
+        Returns the model of the first successful call and its result,
+        the other call is cancelled.
+
+        The primary call runs in the caller's scheduler slot,
+        the hedge call takes a slot of its own.
+
+        Args:
+            call (`Callable[[str], Awaitable[ResultT]]`): makes the call with the model
+            model (`str`): the primary model
+            priority (`Priority`): priority of the hedge call's slot
+            tokens (`int`): estimated tokens of the hedge call
+            discard (`Callable[[ResultT], Awaitable[None]] | None`): releases
+            the result of the call that finished, but lost
+        """
+        hedge_model = config.AI_HEDGE_MODEL_NAME
+        if not hedge_model or config.AI_HEDGE_AFTER_SECONDS is None or hedge_model == model:
+            return model, await call(model)
+
+        async def call_hedge() -> ResultT:
+            async with cls.SCHEDULER.slot(priority, tokens):
+                return await call(hedge_model)
+
+        primary = asyncio.create_task(call(model))
+        tasks = [primary]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=config.AI_HEDGE_AFTER_SECONDS)
+            if done:
+                winner = primary
+                return model, primary.result()
+
+            cls.USAGE.hedged_requests += 1
+            hedge = asyncio.create_task(call_hedge())
+            tasks.append(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        cls.USAGE.hedge_wins += 1
+                        return hedge_model, winner.result()
+                    return model, winner.result()
+            # both calls failed
+            return model, primary.result()
+        finally:
+            cancelled = [task for task in tasks if not task.done()]
+            for task in cancelled:
+                task.cancel()
+            # wait until the cancelled calls release their connections and slots
+            await asyncio.gather(*cancelled, return_exceptions=True)
+            for task in tasks:
+                # a cancelled call could finish before the cancellation
+                if (task is not winner and discard is not None
+                        and not task.cancelled() and task.exception() is None):
+                    await discard(task.result())
 
     @classmethod
-    async def _create_text_response(cls, prompt: str) -> str:
+    async def _request_completion(cls,
+                                  model: str,
+                                  messages: list[dict],
+                                  max_tokens: int,
+                                  response_format: dict | None = None) -> ChatCompletion:
+        """Request a completion from the model with retries."""
+        return await cls.RETRY_POLICY.run(
+            lambda: cls.CLIENT.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                response_format=response_format or NOT_GIVEN
+            ),
+            breaker=cls.get_breaker(model))
+
+    @classmethod
+    async def _open_stream(cls,
+                           model: str,
+                           messages: list[dict],
+                           max_tokens: int) -> tuple[AsyncStream[ChatCompletionChunk],
+                                                     list[ChatCompletionChunk]]:
+        """
+        Open a completion stream of the model and wait for the first text.
+        Returns the stream and the chunks that are already read.
+        """
+        # only opening the stream is retried, not the answer itself
+        stream = await cls.RETRY_POLICY.run(
+            lambda: cls.CLIENT.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                stream=True,
+                # usage is sent in the last chunk
+                stream_options={"include_usage": True}
+            ),
+            breaker=cls.get_breaker(model))
+        chunks = []
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    break
+        except BaseException:
+            # the connection is released on errors and cancellation
+            await stream.close()
+            raise
+        return stream, chunks
+
+    @classmethod
+    async def _create_text_response(cls,
+                                    messages: list[dict],
+                                    priority: Priority,
+                                    model: str,
+                                    hedge: bool = False,
+                                    response_format: dict | None = None) -> str:
         """
         Short-cut function for getting response
-        from ai client using text.
-        Returns client's answer text.
-        """
-        # making a request
-        completion = await cls.CLIENT.chat.completions.create(
-            model=config.AI_MODEL_NAME,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text",
-                         "text": prompt},
-                    ]
-                }
-            ]
-        )
+        from ai client using chat messages.
+
+        Response format makes the model answer with
+        structured output (e.g. JSON of some schema).
+        """
+        max_tokens = get_max_tokens(messages)
+        tokens = estimate_messages_tokens(messages) + max_tokens
+        async with cls.SCHEDULER.slot(priority, tokens):
+            started = time.monotonic()
+            # making a request
+            if hedge:
+                _, completion = await cls._hedge(
+                    lambda model_name: cls._request_completion(model_name, messages,
+                                                               max_tokens, response_format),
+                    model, priority, tokens)
+            else:
+                completion = await cls._request_completion(model, messages,
+                                                           max_tokens, response_format)
+            cls._record_usage(completion.usage, time.monotonic() - started)
         # extracting the response
         response = completion.choices[0].message.content
         if response:
             return response
         raise AIRequestError(
-            f"AI couldn't provide any answer to the request:\n{prompt[:200]}...")
+            f"AI couldn't provide any answer to the request:\n{messages[-1]['content'][:200]}...")
+
+    @classmethod
+    async def _stream_text_response(cls,
+                                    messages: list[dict],
+                                    priority: Priority,
+                                    model: str,
+                                    hedge: bool = False) -> AsyncIterator[str]:
+        """
+        Short-cut function for getting streamed response
+        from ai client using chat messages.
+        Yields pieces of the answer text as soon as they arrive.
+
+        With hedging, the stream that sends the first text wins.
+
+        The answer is read from the model in a separate task and
+        buffered, so the scheduler slot is released as soon as the
+        model finishes, not when the caller reads the last piece.
+        """
+        max_tokens = get_max_tokens(messages)
+        tokens = estimate_messages_tokens(messages) + max_tokens
+        # pieces of the answer, None when the model has finished
+        pieces: asyncio.Queue[str | None] = asyncio.Queue()
+
+        async def generate():
+            try:
+                await cls._read_stream(messages, priority, model, hedge,
+                                       max_tokens, tokens, pieces)
+            finally:
+                pieces.put_nowait(None)
+
+        generation = asyncio.create_task(generate())
+        try:
+            while (piece := await pieces.get()) is not None:
+                yield piece
+            # raises the error of the generation
+            await generation
+        finally:
+            # the caller stopped reading early
+            if not generation.done():
+                generation.cancel()
+                await asyncio.gather(generation, return_exceptions=True)
+
+    @classmethod
+    async def _read_stream(cls,
+                           messages: list[dict],
+                           priority: Priority,
+                           model: str,
+                           hedge: bool,
+                           max_tokens: int,
+                           tokens: int,
+                           pieces: asyncio.Queue[str | None]):
+        """Read the answer of the model to the queue in a scheduler slot."""
+        received = False
+        async with cls.SCHEDULER.slot(priority, tokens):
+            started = time.monotonic()
+            if hedge:
+                _, (stream, first_chunks) = await cls._hedge(
+                    lambda model_name: cls._open_stream(model_name, messages, max_tokens),
+                    model, priority, tokens,
+                    discard=lambda result: result[0].close())
+            else:
+                stream, first_chunks = await cls._open_stream(model, messages, max_tokens)
+
+            usage = None
+            async with stream:
+                async for chunk in cls._chain_chunks(first_chunks, stream):
+                    if chunk.usage:
+                        usage = chunk.usage
+                    # some chunks (e.g. usage) have no choices
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        received = True
+                        pieces.put_nowait(delta)
+            cls._record_usage(usage, time.monotonic() - started)
+        if not received:
+            raise AIRequestError(
+                f"AI couldn't provide any answer to the request:\n{messages[-1]['content'][:200]}...")
+
+    @staticmethod
+    async def _chain_chunks(first_chunks: list[ChatCompletionChunk],
+                            stream: AsyncStream[ChatCompletionChunk]
+                            ) -> AsyncIterator[ChatCompletionChunk]:
+        """Yield the chunks that are already read, then the rest of the stream."""
+        for chunk in first_chunks:
+            yield chunk
+        async for chunk in stream:
+            yield chunk
+
+    @classmethod
+    def _record_usage(cls, usage: CompletionUsage | None, latency_seconds: float):
+        """Add request's token usage to the statistics and log it."""
+        cls.USAGE.record(usage, latency_seconds)
+        if usage:
+            details = usage.prompt_tokens_details
+            logger.info("AI request took %.2f s, tokens: prompt=%i (cached=%i), completion=%i",
+                        latency_seconds,
+                        usage.prompt_tokens,
+                        (details.cached_tokens or 0) if details else 0,
+                        usage.completion_tokens)
+
+    @staticmethod
+    def _get_profile_version(user: User) -> str:
+        """
+        Get the version of user's data in the prompts,
+        it changes with the user or their activity level.
+        """
+        level_info = user.activity_level_info
+        return f"{user.updated_at}:{level_info.model_dump_json() if level_info else None}"
+
+    @classmethod
+    def _make_cache_key(cls, user: User, kind: str, model: str, messages: list[dict]) -> str:
+        """
+        Make the response cache key of the prompt.
+        Changes of the user or their activity level make a new key.
+        """
+        return ResponseCache.make_key(kind, model, messages, cls._get_profile_version(user))
+
+    @classmethod
+    async def _get_response(cls,
+                            user: User,
+                            kind: str,
+                            messages: list[dict],
+                            model: str,
+                            ttl_seconds: float,
+                            func: Callable[[], Awaitable[str]]) -> str:
+        """
+        Get the response from the cache or make the call.
+        Identical concurrent calls are made once, whatever their priority:
+        a user who asks for a plan that is being generated in advance
+        joins that call instead of making another one.
+
+        The response is cached for the requested model, even if the
+        hedge model answered, so the same request finds it later.
+        The cache is not used if the TTL is 0.
+        """
+        cache_key = cls._make_cache_key(user, kind, model, messages)
+        if ttl_seconds > 0:
+            response = await cls.CACHE.get(cache_key)
+            if response is not None:
+                return response
+
+        async def call() -> str:
+            response = await func()
+            await cls.CACHE.set(cache_key, response, ttl_seconds)
+            return response
+
+        key = SingleFlight.make_key(user.id, kind, messages[-1]['content'])
+        return await cls.SINGLE_FLIGHT.run(key, call)
 
     @classmethod
     async def generate_user_plan(cls,
                                  user: User,
-                                 extra: str | None) -> str:
+                                 extra: str | None,
+                                 priority: Priority = Priority.BACKGROUND) -> GeneratedTrainingPlan:
         """
         Generate training plan for the user using
         their data.
+
+        The model answers with JSON, every day
+        of the week is a separate object.
         """
-        prompt = PromptManager.get_plan_prompt(user, extra)
-        response = await cls._create_text_response(prompt)
-        return response
+        messages = PromptManager.get_plan_prompt(user, extra)
+
+        async def request() -> str:
+            response = await cls._create_text_response(
+                messages, priority, cls.PLAN_MODEL,
+                response_format=PromptManager.PLAN_RESPONSE_FORMAT)
+            # check the plan before it's cached
+            cls._parse_plan(response)
+            return response
+
+        response = await cls._get_response(
+            user, 'plan', messages, cls.PLAN_MODEL,
+            config.AI_CACHE_PLAN_TTL_SECONDS, request)
+        return cls._parse_plan(response)
+
+    @classmethod
+    async def generate_user_plan_days(cls,
+                                      user: User,
+                                      extra: str | None,
+                                      weekdays: list[int]) -> list[TrainingPlanDayInput]:
+        """
+        Rewrite some days of user's training plan.
+
+        The model gets other days as a short context
+        and answers only with the requested days,
+        so it writes a few times less than for the whole plan.
+        """
+        messages = PromptManager.get_plan_days_prompt(user, extra, weekdays)
+        response_format = PromptManager.get_plan_days_response_format(weekdays)
+
+        async def request() -> str:
+            response = await cls._create_text_response(
+                messages, Priority.BACKGROUND, cls.PLAN_MODEL,
+                response_format=response_format)
+            # check the days before they're cached
+            cls._parse_plan_days(response, weekdays)
+            return response
+
+        response = await cls._get_response(
+            user, 'plan_days', messages, cls.PLAN_MODEL,
+            config.AI_CACHE_PLAN_TTL_SECONDS, request)
+        return cls._parse_plan_days(response, weekdays)
+
+    @classmethod
+    async def generate_plan_advice(cls,
+                                   user: User,
+                                   days: list[TrainingPlanDayInput]) -> str:
+        """
+        Generate a short personal advice to a ready plan
+        (e.g. a template) for the user.
+        """
+        messages = PromptManager.get_plan_advice_prompt(user, days)
+        return await cls._get_response(
+            user, 'plan_advice', messages, cls.PLAN_MODEL,
+            config.AI_CACHE_PLAN_TTL_SECONDS,
+            lambda: cls._create_text_response(messages, Priority.BACKGROUND, cls.PLAN_MODEL))
+
+    @staticmethod
+    def _parse_plan_days(response: str, weekdays: list[int]) -> list[TrainingPlanDayInput]:
+        """Get the requested days from the model's JSON answer."""
+        try:
+            days = GeneratedTrainingPlanDays.model_validate_json(response).days
+        except PydanticValidationError as exc:
+            raise AIRequestError(
+                f"AI answered with plan days in a wrong format:\n{str(exc)}") from exc
+        if sorted(day.weekday for day in days) != sorted(weekdays):
+            raise AIRequestError(
+                f"AI answered with wrong plan days: {[day.weekday for day in days]}")
+        return days
+
+    @staticmethod
+    def _parse_plan(response: str) -> GeneratedTrainingPlan:
+        """Get the plan from the model's JSON answer."""
+        try:
+            return GeneratedTrainingPlan.model_validate_json(response)
+        except PydanticValidationError as exc:
+            raise AIRequestError(
+                f"AI answered with a plan in a wrong format:\n{str(exc)}") from exc
+
+    @classmethod
+    def _find_faq_answer(cls,
+                         user: User,
+                         user_request: str | None,
+                         personal: bool = False) -> str | None:
+        """
+        Find the answer to a similar question.
+
+        Answers of any user are found, they are hints for the model.
+        Personal answers are the ones given to this user for their
+        current data, they can be sent as they are.
+        """
+        if cls.FAQ_INDEX is None or not user_request:
+            return None
+        started = time.monotonic()
+        if personal:
+            matches = cls.FAQ_INDEX.search(user_request, owner=user.id,
+                                           version=cls._get_profile_version(user))
+        else:
+            matches = cls.FAQ_INDEX.search(user_request)
+        cls.FAQ_STATS.lookups += 1
+        cls.FAQ_STATS.total_lookup_seconds += time.monotonic() - started
+        if matches and matches[0].score >= config.AI_FAQ_THRESHOLD:
+            cls.FAQ_STATS.hits += 1
+            return matches[0].answer
+        return None
+
+    @classmethod
+    def _remember_faq_answer(cls, user: User, user_request: str | None, response: str):
+        """Store the answered question for similar ones."""
+        if cls.FAQ_INDEX is not None and user_request:
+            cls.FAQ_INDEX.add(user.id, user_request, response, cls._get_profile_version(user))
+
+    @classmethod
+    def get_faq_stats(cls) -> AIFAQStats:
+        """Get answered questions retrieval statistics."""
+        stats = cls.FAQ_STATS.model_copy()
+        stats.entries = len(cls.FAQ_INDEX) if cls.FAQ_INDEX is not None else 0
+        return stats
 
     @classmethod
     async def generate_user_response(cls,
@@ -61,7 +522,62 @@ class AIClient:
 
         User can ask questions, ask for help,
         guidance, etc.
+
+        If the user asked a similar question before and their data
+        hasn't changed since, the answer can be sent directly.
+        Otherwise an answer to a similar question of any user
+        is used as a hint for the FAQ model.
         """
-        prompt = PromptManager.get_user_request_prompt(user, user_request)
-        response = await cls._create_text_response(prompt)
+        if config.AI_FAQ_ANSWER_DIRECTLY:
+            answer = cls._find_faq_answer(user, user_request, personal=True)
+            if answer is not None:
+                return answer
+        reference = cls._find_faq_answer(user, user_request)
+
+        messages = PromptManager.get_user_request_prompt(user, user_request, reference)
+        model = cls.CHAT_MODEL if reference is None else cls.FAQ_MODEL
+        response = await cls._get_response(
+            user, 'chat', messages, model, config.AI_CACHE_CHAT_TTL_SECONDS,
+            lambda: cls._create_text_response(messages, Priority.INTERACTIVE,
+                                              model, hedge=True))
+        if reference is None:
+            cls._remember_faq_answer(user, user_request, response)
         return response
+
+    @classmethod
+    async def stream_user_response(cls,
+                                   user: User,
+                                   user_request: str | None) -> AsyncIterator[str]:
+        """
+        Stream a general response for user request.
+
+        Same as `generate_user_response`, but the answer
+        is yielded piece by piece while the model generates it.
+        A cached answer is yielded at once.
+        """
+        if config.AI_FAQ_ANSWER_DIRECTLY:
+            answer = cls._find_faq_answer(user, user_request, personal=True)
+            if answer is not None:
+                yield answer
+                return
+        reference = cls._find_faq_answer(user, user_request)
+
+        messages = PromptManager.get_user_request_prompt(user, user_request, reference)
+        model = cls.CHAT_MODEL if reference is None else cls.FAQ_MODEL
+        ttl_seconds = config.AI_CACHE_CHAT_TTL_SECONDS
+        cache_key = cls._make_cache_key(user, 'chat', model, messages)
+        if ttl_seconds > 0:
+            response = await cls.CACHE.get(cache_key)
+            if response is not None:
+                yield response
+                return
+
+        chunks = []
+        async for chunk in cls._stream_text_response(messages, Priority.INTERACTIVE,
+                                                     model, hedge=True):
+            chunks.append(chunk)
+            yield chunk
+        response = ''.join(chunks)
+        await cls.CACHE.set(cache_key, response, ttl_seconds)
+        if reference is None:
+            cls._remember_faq_answer(user, user_request, response)
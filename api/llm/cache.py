@@ -0,0 +1,91 @@
+"""Cache of AI responses."""
+from collections import OrderedDict
+import hashlib
+import json
+import time
+from redis.asyncio import Redis
+from api.schemas.stats import AICacheStats
+
+
+class ResponseCache:
+    """
+    Exact-match cache of AI responses.
+
+    Keeps recent responses in process memory (LRU with TTL),
+    with Redis they are also shared between API workers.
+    """
+
+    def __init__(self, max_entries: int, redis: Redis | None = None):
+        self._max_entries = max_entries
+        self._redis = redis
+        # key -> (expiry time, response)
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._stats = AICacheStats()
+
+    @staticmethod
+    def make_key(kind: str, model: str, messages: list[dict], version: str | None) -> str:
+        """Make a key for the response.
+
+        Args:
+            kind (`str`): request kind (plan, chat, etc.)
+            model (`str`): model name
+            messages (`list[dict]`): rendered prompt
+            version (`str | None`): changes when the response must not be reused,
+            e.g. user's `updated_at`
+        """
+        content = json.dumps([model, messages, version], ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        return f"ai_cache:{kind}:{digest}"
+
+    async def get(self, key: str) -> str | None:
+        """Get the cached response.
+
+        Args:
+            key (`str`): response key, see `make_key`
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, response = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats.hits += 1
+                return response
+            del self._entries[key]
+
+        if self._redis is not None:
+            cached = await self._redis.get(key)
+            if cached is not None:
+                ttl = await self._redis.ttl(key)
+                self._set_local(key, cached.decode(), max(ttl, 1))
+                self._stats.hits += 1
+                return cached.decode()
+
+        self._stats.misses += 1
+        return None
+
+    async def set(self, key: str, response: str, ttl_seconds: float):
+        """Cache the response.
+
+        Args:
+            key (`str`): response key, see `make_key`
+            response (`str`): response to cache
+            ttl_seconds (`float`): how long to keep the response, 0 to not cache
+        """
+        if ttl_seconds <= 0:
+            return
+        self._set_local(key, response, ttl_seconds)
+        if self._redis is not None:
+            await self._redis.set(key, response, px=max(1, int(ttl_seconds * 1000)))
+
+    def get_stats(self) -> AICacheStats:
+        """Get cache hits and misses statistics."""
+        stats = self._stats.model_copy()
+        stats.entries = len(self._entries)
+        return stats
+
+    def _set_local(self, key: str, response: str, ttl_seconds: float):
+        """Put the response in memory, evict the least recently used ones."""
+        self._entries[key] = (time.monotonic() + ttl_seconds, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
@@ -1,106 +1,129 @@
 """Prepared AI prompts for AI API requests."""
+from textwrap import dedent
+from api.config import config
 from api.schemas.user import User
+from api.schemas.training_plan import TrainingPlan, TrainingPlanDayInput, WEEKDAYS, \
+    split_plan_description
+from .token_budget import truncate_to_tokens
 
 
-class PromptManager:
-    """
-    Manages and constructs different prompt types for AI API request usage.
-    """
-    @classmethod
-    def get_base_prompt(cls, user: User) -> str:
-        """
-        Get base prompt for AI API.
-        This prompt takes the data and information that
-        should be provided in every single request to
-        the model.
-        """
-        return f"""
+# Instructions are compiled once on import and are sent
+# as the first (system) message. They must stay byte-identical
+# between requests, so the provider can reuse the cached prefix.
+# Anything that depends on the user goes to the user message.
+_BASE_INSTRUCTIONS = dedent("""
     Ты — профессиональный фитнес-тренер.
     Твоя задача — помогать пользователям достигать целей
     с помощью плана тренировок, советов и поддержки.
     Будь вежлив, дружелюбен и поддерживающим.
 
     К тебе поступает запрос от пользователя.
-
-    ДАННЫЕ О ПОЛЬЗОВАТЕЛЕ:
-        Имя: "{user.username}"
-        Пол: "{user.gender}"
-        Возраст: "{user.age}"
-        Рост: "{user.height_cm} см"
-        Вес: "{user.weight_kg} кг"
-        Уровень активности: "{user.activity_level}"
-        Описание уровня активности: 
-        "{user.activity_level_info.description if user.activity_level_info else None}"
-
-    Цель: "{user.goal}"
+    В начале запроса указаны ДАННЫЕ О ПОЛЬЗОВАТЕЛЕ.
 
     ВАЖНО:
         1) Если цель не имеет отношения к тренировкам или
         здоровому образу жизни — игнорируй её
-        2) Если какое-то поле в "ДАННЫЕ ПОЛЬЗОВАТЕЛЯ" 
+        2) Если какое-то поле в "ДАННЫЕ О ПОЛЬЗОВАТЕЛЕ"
         имеет значение None (кроме username)- предложи пользователю
         указать его в профиле (только указанные поля, они поля в базе данных)
         3) Не приветствуй пользователя, не пиши дополнительные слова, делай то,
         что указано
-    """
+    """).strip()
 
-    @classmethod
-    def get_plan_prompt(cls, user: User, extra_request: str | None) -> str:
-        """
-        Get training plan prompt for user.
-        Generates prompt using base prompt and
-        additional request to make a training plan.
-        """
-        prompt = cls.get_base_prompt(user)
-        return prompt + f"""\n
+_PLAN_INSTRUCTIONS = dedent("""
     Вот что ты должен сделать:
 
     'Создать план тренировок для пользователя на неделю'
 
-    Вот что пользователь добавил к этому (используй как пожелание
-    при создании плана, если это имеет смысл):
-
-    "{extra_request}"
+    Пользователь может добавить пожелание к плану
+    (используй его при создании плана, если это имеет смысл).
+    Также может быть указан предыдущий план этого пользователя.
 
     ВАЖНО:
         1) Учитывай данные пользователя
         2) Распиши каждый день недели (от понедельника до воскресенья)
         3) Предоставь совет на каждый день
         4) Чтобы весь план получилось отправить, экономь (план должен весь поместиться)
-        5) В конце добавь: "Помни, что это примерный план, и ты можешь его модифицировать!"
 
+    Ответь в формате JSON по заданной схеме, для каждого дня:
+        weekday - номер дня недели (0 - понедельник, 6 - воскресенье)
+        title - тренировочный день (краткое описание) или отдых
+        description - описание тренировочного процесса,
+        упражнения и количество повторений, совет
+    """).strip()
 
-    Используй данный шаблон:
-    
-    ПОНЕДЕЛЬНИК:
-        Тренировочный день (краткое описание)
-        Описание тренировочного процесса
-        Упражнения и количество повторений
-        Совет
+_PLAN_DAYS_INSTRUCTIONS = dedent("""
+    Вот что ты должен сделать:
 
-    ВТОРНИК:
-        Отдых
-        Совет
-    ...
+    'Изменить несколько дней в плане тренировок пользователя'
 
-    Вот предыдущий план этого пользователя:
-    "{user.training_plan}"
-    """
+    Тебе дан текущий план: краткое описание дней, которые не меняются,
+    и полное содержание дней, которые нужно переписать.
+    Перепиши только эти дни с учетом пожелания пользователя,
+    остальной план должен остаться согласованным с ними.
 
-    @classmethod
-    def get_user_request_prompt(cls, user: User, user_request: str | None) -> str:
-        """
-        Get user request prompt for this user.
-        Generates prompt using base prompt and adds
-        user request to the model with instructions.
-        """
-        prompt = cls.get_base_prompt(user)
-        prompt += f"""\n
-    Вот что пользователь спрашивает у тебя:
+    ВАЖНО:
+        1) Учитывай данные пользователя
+        2) Предоставь совет на каждый день
+        3) Экономь, пиши кратко
+
+    Ответь в формате JSON по заданной схеме, для каждого переписанного дня:
+        weekday - номер дня недели (0 - понедельник, 6 - воскресенье)
+        title - тренировочный день (краткое описание) или отдых
+        description - описание тренировочного процесса,
+        упражнения и количество повторений, совет
+    """).strip()
+
+_PLAN_ADVICE_INSTRUCTIONS = dedent("""
+    Вот что ты должен сделать:
+
+    'Дать персональный совет к готовому плану тренировок'
 
-    '{user_request}'
+    Пользователю подобран готовый план, тебе дано
+    краткое описание его дней.
 
-    Дай ответ согласно установленной тебе роли.
+    ВАЖНО:
+        1) Учитывай данные пользователя
+        2) Напиши 2-3 предложения: на что обратить внимание
+        и как подстроить план под себя
+        3) Не пересказывай план
+    """).strip()
+
+# JSON schema of the plan, the model must answer with it,
+# strict mode doesn't support size and range keywords,
+# they are checked when the answer is parsed
+_PLAN_DAY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "weekday": {"type": "integer"},
+        "title": {"type": "string"},
+        "description": {"type": "string"}
+    },
+    "required": ["weekday", "title", "description"],
+    "additionalProperties": False
+}
+
+_PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "training_plan",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "days": {
+                    "type": "array",
+                    "items": _PLAN_DAY_SCHEMA
+                }
+            },
+            "required": ["days"],
+            "additionalProperties": False
+        }
+    }
+}
+
+_USER_REQUEST_INSTRUCTIONS = dedent("""
+    Дай ответ на вопрос пользователя согласно установленной тебе роли.
 
     ВАЖНО:
         1) Если запрос к тебе не имеет отношения к
@@ -108,10 +131,194 @@ class PromptManager:
         скажи пользователю общаться по теме
         2) Если пользователь сообщает информацию,
         которая отличается от той, что
-        показана в "ДАННЫЕ ПОЛЬЗОВАТЕЛЯ", предложи ему изменить
+        показана в "ДАННЫЕ О ПОЛЬЗОВАТЕЛЕ", предложи ему изменить
         это поле в настройках профиля, а в текущем запросе
         используй предоставленную информацию как приоритетную
         3) Если тебя попросили создать план, скажи воспользоваться
         меню для этого
+    """).strip()
+
+# limit for a day summary of the previous plan
+_DAY_SUMMARY_MAX_CHARS = 80
+
+# compact per-user data block
+# user's fields in the prompts, changes of other fields don't change the answers
+USER_DATA_FIELDS = frozenset(('username', 'gender', 'age', 'height_cm', 'weight_kg',
+                              'activity_level', 'goal'))
+_USER_DATA_TEMPLATE = ("ДАННЫЕ О ПОЛЬЗОВАТЕЛЕ:\n"
+                       "Имя: {username}\n"
+                       "Пол: {gender}\n"
+                       "Возраст: {age}\n"
+                       "Рост: {height_cm} см\n"
+                       "Вес: {weight_kg} кг\n"
+                       "Уровень активности: {activity_level} ({activity_level_description})\n"
+                       "Цель: {goal}")
+
+
+class PromptManager:
     """
-        return prompt
+    Manages and constructs different prompt types for AI API request usage.
+
+    Prompts are lists of chat messages: the static system message
+    goes first, the user's data and request go after it.
+    """
+    PLAN_SYSTEM_PROMPT = f"{_BASE_INSTRUCTIONS}\n\n{_PLAN_INSTRUCTIONS}"
+    USER_REQUEST_SYSTEM_PROMPT = f"{_BASE_INSTRUCTIONS}\n\n{_USER_REQUEST_INSTRUCTIONS}"
+    PLAN_DAYS_SYSTEM_PROMPT = f"{_BASE_INSTRUCTIONS}\n\n{_PLAN_DAYS_INSTRUCTIONS}"
+    PLAN_ADVICE_SYSTEM_PROMPT = f"{_BASE_INSTRUCTIONS}\n\n{_PLAN_ADVICE_INSTRUCTIONS}"
+    PLAN_RESPONSE_FORMAT = _PLAN_RESPONSE_FORMAT
+
+    @classmethod
+    def get_user_data(cls, user: User) -> str:
+        """
+        Get the block with user's data.
+        This data should be provided in every single
+        request to the model.
+        """
+        level_info = user.activity_level_info
+        return _USER_DATA_TEMPLATE.format(
+            username=user.username,
+            gender=user.gender,
+            age=user.age,
+            height_cm=user.height_cm,
+            weight_kg=user.weight_kg,
+            activity_level=user.activity_level,
+            activity_level_description=level_info.description if level_info else None,
+            goal=truncate_to_tokens(user.goal, config.AI_MAX_TEXT_FIELD_TOKENS)
+        )
+
+    @classmethod
+    def get_plan_summary(cls, plan: TrainingPlan | None) -> str | None:
+        """
+        Get a compact summary of the plan.
+        Keeps only the title of every day (or the first line
+        after every day header), it's enough for the model
+        to know the previous plan.
+        """
+        if plan is None:
+            return None
+        if plan.days:
+            return "\n".join(f"{WEEKDAYS[day.weekday].capitalize()}: "
+                             f"{day.title[:_DAY_SUMMARY_MAX_CHARS]}"
+                             for day in plan.days)
+        # plans without days are parsed from the text
+        days = split_plan_description(plan.plan_description)
+        summary = [f"{WEEKDAYS[weekday].capitalize()}: {lines[0][:_DAY_SUMMARY_MAX_CHARS]}"
+                   for weekday, lines in sorted(days.items()) if lines]
+        if summary:
+            return "\n".join(summary)
+        # unknown plan format, just keep it short
+        return truncate_to_tokens(plan.plan_description, config.AI_MAX_TEXT_FIELD_TOKENS)
+
+    @classmethod
+    def get_plan_prompt(cls, user: User, extra_request: str | None) -> list[dict]:
+        """
+        Get training plan prompt for user.
+        Uses the plan system prompt, user's data,
+        additional request and the previous plan.
+        """
+        extra_request = truncate_to_tokens(extra_request, config.AI_MAX_TEXT_FIELD_TOKENS)
+        user_message = (f"{cls.get_user_data(user)}\n\n"
+                        f"Пожелание к плану: {extra_request}\n\n"
+                        f"Предыдущий план:\n{cls.get_plan_summary(user.training_plan)}")
+        return [
+            {"role": "system", "content": cls.PLAN_SYSTEM_PROMPT},
+            {"role": "user", "content": user_message}
+        ]
+
+    @classmethod
+    def get_plan_advice_prompt(cls, user: User, days: list[TrainingPlanDayInput]) -> list[dict]:
+        """
+        Get prompt for an advice to the ready plan.
+        Uses the plan advice system prompt, user's data
+        and short plan days.
+        """
+        plan_summary = "\n".join(f"{WEEKDAYS[day.weekday].capitalize()}: "
+                                 f"{day.title[:_DAY_SUMMARY_MAX_CHARS]}"
+                                 for day in days)
+        user_message = (f"{cls.get_user_data(user)}\n\n"
+                        f"План:\n{plan_summary}")
+        return [
+            {"role": "system", "content": cls.PLAN_ADVICE_SYSTEM_PROMPT},
+            {"role": "user", "content": user_message}
+        ]
+
+    @classmethod
+    def get_plan_days_prompt(cls,
+                             user: User,
+                             extra_request: str | None,
+                             weekdays: list[int]) -> list[dict]:
+        """
+        Get prompt for rewriting some days of user's plan.
+        Uses the plan days system prompt, user's data,
+        additional request, short unchanged days and
+        full days to rewrite.
+        """
+        extra_request = truncate_to_tokens(extra_request, config.AI_MAX_TEXT_FIELD_TOKENS)
+        days = user.training_plan.days
+        kept_days = "\n".join(f"{WEEKDAYS[day.weekday].capitalize()}: "
+                              f"{day.title[:_DAY_SUMMARY_MAX_CHARS]}"
+                              for day in days if day.weekday not in weekdays)
+        changed_days = "\n\n".join(f"{WEEKDAYS[day.weekday].capitalize()} (weekday={day.weekday}):\n"
+                                    f"{day.title}\n{day.description}"
+                                    for day in days if day.weekday in weekdays)
+        user_message = (f"{cls.get_user_data(user)}\n\n"
+                        f"Пожелание к плану: {extra_request}\n\n"
+                        f"Дни, которые не меняются:\n{kept_days}\n\n"
+                        f"Дни, которые нужно переписать:\n{changed_days}")
+        return [
+            {"role": "system", "content": cls.PLAN_DAYS_SYSTEM_PROMPT},
+            {"role": "user", "content": user_message}
+        ]
+
+    @classmethod
+    def get_plan_days_response_format(cls, weekdays: list[int]) -> dict:
+        """
+        Get JSON schema for rewritten days of the plan.
+        The model can answer only with these days.
+        """
+        day_schema = {**_PLAN_DAY_SCHEMA,
+                      "properties": {**_PLAN_DAY_SCHEMA["properties"],
+                                     "weekday": {"type": "integer", "enum": sorted(weekdays)}}}
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "training_plan_days",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "days": {
+                            "type": "array",
+                            "items": day_schema
+                        }
+                    },
+                    "required": ["days"],
+                    "additionalProperties": False
+                }
+            }
+        }
+
+    @classmethod
+    def get_user_request_prompt(cls,
+                                user: User,
+                                user_request: str | None,
+                                reference_answer: str | None = None) -> list[dict]:
+        """
+        Get user request prompt for this user.
+        Uses the user request system prompt, user's data
+        and the request.
+
+        Reference answer is an answer to a similar question
+        that was asked before, the model can rely on it.
+        """
+        user_message = (f"{cls.get_user_data(user)}\n\n"
+                        f"Вопрос пользователя: {user_request}")
+        if reference_answer is not None:
+            user_message += ("\n\nПохожий вопрос уже задавали, вот ответ на него "
+                             "(используй как подсказку, но учитывай данные этого пользователя):\n"
+                             f"{reference_answer}")
+        return [
+            {"role": "system", "content": cls.USER_REQUEST_SYSTEM_PROMPT},
+            {"role": "user", "content": user_message}
+        ]
@@ -0,0 +1,234 @@
+"""Retries and circuit breaking for AI requests."""
+from collections import deque
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from typing import Awaitable, Callable, TypeVar
+import asyncio
+import logging
+import random
+import time
+import openai
+from api.exceptions import AIRequestError
+
+
+logger = logging.getLogger(__name__)
+
+ResultT = TypeVar("ResultT")
+
+# status codes that are worth another attempt
+_RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker states."""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a failing AI provider.
+
+    The circuit opens when the error rate in the rolling window
+    passes the threshold, then requests fail fast. After `open_seconds`
+    one probe request is let through (half-open): its success closes
+    the circuit, its failure opens it again. Results of other requests
+    that finish while the circuit is not closed (e.g. slow requests sent
+    before it opened) are ignored.
+    """
+
+    def __init__(self,
+                 failure_rate_threshold: float,
+                 min_requests: int,
+                 window_seconds: float,
+                 open_seconds: float):
+        self._failure_rate_threshold = failure_rate_threshold
+        self._min_requests = min_requests
+        self._window_seconds = window_seconds
+        self._open_seconds = open_seconds
+
+        self._results: deque[tuple[float, bool]] = deque()
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> CircuitState:
+        """Current circuit state."""
+        if (self._state == CircuitState.OPEN
+                and time.monotonic() - self._opened_at >= self._open_seconds):
+            return CircuitState.HALF_OPEN
+        return self._state
+
+    def before_request(self) -> bool:
+        """Check if a request can be sent, fail fast if not.
+
+        Returns True if the request is the half-open probe,
+        pass it to `record_success`, `record_failure` or `cancel_request`.
+        """
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return False
+        if state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+            self._state = CircuitState.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+        raise AIRequestError("AI service is unavailable now, try again later.")
+
+    def record_success(self, probe: bool = False):
+        """Add a successful request.
+
+        Args:
+            probe (`bool`): the request is the probe, as returned by `before_request`
+        """
+        if probe:
+            logger.info("AI circuit is closed")
+            self._state = CircuitState.CLOSED
+            self._probe_in_flight = False
+            self._results.clear()
+        elif self._state != CircuitState.CLOSED:
+            return
+        self._add_result(True)
+
+    def record_failure(self, probe: bool = False):
+        """Add a failed request, open the circuit if there are too many.
+
+        Args:
+            probe (`bool`): the request is the probe, as returned by `before_request`
+        """
+        if probe:
+            self._open()
+            return
+        if self._state != CircuitState.CLOSED:
+            return
+        self._add_result(False)
+        failures = sum(1 for _, success in self._results if not success)
+        if (len(self._results) >= self._min_requests
+                and failures / len(self._results) >= self._failure_rate_threshold):
+            self._open()
+
+    def cancel_request(self, probe: bool = False):
+        """Forget a request that finished without a result (e.g. cancelled).
+
+        Args:
+            probe (`bool`): the request is the probe, as returned by `before_request`
+        """
+        if probe:
+            # the next request will be the probe
+            self._probe_in_flight = False
+
+    def _open(self):
+        """Open the circuit."""
+        logger.warning("AI circuit is open")
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._results.clear()
+
+    def _add_result(self, success: bool):
+        """Add a request result, forget results out of the window."""
+        now = time.monotonic()
+        self._results.append((now, success))
+        while self._results and now - self._results[0][0] > self._window_seconds:
+            self._results.popleft()
+
+
+class RetryPolicy:
+    """
+    Retries failed AI requests within a total deadline.
+
+    Uses exponential backoff with full jitter and honors
+    `Retry-After` headers. A request is not retried if the next
+    attempt can't start before the deadline.
+    """
+
+    def __init__(self,
+                 max_retries: int,
+                 deadline_seconds: float,
+                 base_delay_seconds: float,
+                 max_delay_seconds: float):
+        self._max_retries = max_retries
+        self._deadline_seconds = deadline_seconds
+        self._base_delay = base_delay_seconds
+        self._max_delay = max_delay_seconds
+
+    async def run(self,
+                  func: Callable[[], Awaitable[ResultT]],
+                  breaker: CircuitBreaker) -> ResultT:
+        """Make the request with retries.
+
+        Args:
+            func (`Callable[[], Awaitable[ResultT]]`): makes the request
+            breaker (`CircuitBreaker`): circuit breaker of the provider
+        """
+        deadline = time.monotonic() + self._deadline_seconds
+        attempt = 0
+        while True:
+            probe = breaker.before_request()
+            attempt += 1
+            try:
+                result = await asyncio.wait_for(func(), deadline - time.monotonic())
+            except asyncio.TimeoutError as exc:
+                breaker.record_failure(probe)
+                raise AIRequestError(
+                    f"AI didn't answer in {self._deadline_seconds} seconds.") from exc
+            except openai.APIError as exc:
+                if not self._is_retryable(exc):
+                    # the provider works, the request is wrong
+                    breaker.record_success(probe)
+                    raise AIRequestError(f"AI request failed:\n{str(exc)}") from exc
+                breaker.record_failure(probe)
+                delay = self._get_delay(exc, attempt)
+                if attempt > self._max_retries or time.monotonic() + delay >= deadline:
+                    raise AIRequestError(f"AI request failed:\n{str(exc)}") from exc
+                logger.warning("AI request failed (attempt %i), retrying in %.2f s: %s",
+                               attempt, delay, exc)
+                await asyncio.sleep(delay)
+            except BaseException:
+                breaker.cancel_request(probe)
+                raise
+            else:
+                breaker.record_success(probe)
+                return result
+
+    @staticmethod
+    def _is_retryable(exc: openai.APIError) -> bool:
+        """Check if the request can succeed on the next attempt."""
+        if isinstance(exc, openai.APIConnectionError):
+            return True
+        if isinstance(exc, openai.APIStatusError):
+            return exc.status_code in _RETRYABLE_STATUS_CODES or exc.status_code >= 500
+        return False
+
+    def _get_delay(self, exc: openai.APIError, attempt: int) -> float:
+        """Get the delay before the next attempt."""
+        retry_after = self._get_retry_after(exc)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def _get_retry_after(exc: openai.APIError) -> float | None:
+        """Get the delay the provider asked for, if any."""
+        if not isinstance(exc, openai.APIStatusError):
+            return None
+        headers = exc.response.headers
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+        retry_after = headers.get('retry-after')
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        try:
+            # HTTP date format
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,139 @@
+"""Local retrieval of already answered questions."""
+from typing import NamedTuple
+import re
+import zlib
+import numpy as np
+
+
+class FAQMatch(NamedTuple):
+    """Stored question similar to the asked one."""
+    score: float
+    question: str
+    answer: str
+    owner: int
+
+
+class HashedNgramEmbedder:
+    """
+    Turns text into vectors of hashed character n-grams.
+
+    Works without a model or a vocabulary: every n-gram is hashed
+    into one of `dimensions` buckets. Vectors are L2-normalized,
+    so the dot product of two vectors is their cosine similarity.
+    """
+
+    def __init__(self, dimensions: int = 512, ngram_sizes: tuple[int, ...] = (3, 4, 5)):
+        self.dimensions = dimensions
+        self._ngram_sizes = ngram_sizes
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase the text and keep only words."""
+        words = re.findall(r"\w+", text.lower())
+        return f" {' '.join(words)} "
+
+    def embed(self, text: str) -> np.ndarray:
+        """Get the vector of the text.
+
+        Args:
+            text (`str`): text to embed
+        """
+        text = self.normalize(text)
+        hashes = np.fromiter((zlib.crc32(text[start:start + size].encode())
+                              for size in self._ngram_sizes
+                              for start in range(len(text) - size + 1)),
+                             dtype=np.uint32)
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        if hashes.size == 0:
+            return vector
+        # the highest bit chooses the sign to reduce collision bias
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, hashes % self.dimensions, signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class FAQIndex:
+    """
+    Store of answered questions with cosine similarity search.
+
+    Vectors are kept in one preallocated matrix, so a search is
+    a single matrix-vector product. When the store is full,
+    the oldest pairs are replaced.
+
+    Every pair has an owner (e.g. user's ID) and a version of the data
+    the answer was made for (e.g. of the user's profile). A search can
+    look through all pairs or only through the owner's ones of a version.
+    """
+
+    def __init__(self, embedder: HashedNgramEmbedder, capacity: int):
+        self._embedder = embedder
+        self._capacity = capacity
+        self._vectors = np.zeros((capacity, embedder.dimensions), dtype=np.float32)
+        self._owners = np.zeros(capacity, dtype=np.int64)
+        self._questions: list[str] = []
+        self._answers: list[str] = []
+        self._versions: list[str | None] = []
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def add(self, owner: int, question: str, answer: str, version: str | None = None):
+        """Store the answered question.
+
+        Args:
+            owner (`int`): who the answer was given to
+            question (`str`)
+            answer (`str`)
+            version (`str | None`): version of the data the answer was made for
+        """
+        self._vectors[self._next] = self._embedder.embed(question)
+        self._owners[self._next] = owner
+        if len(self._questions) < self._capacity:
+            self._questions.append(question)
+            self._answers.append(answer)
+            self._versions.append(version)
+        else:
+            self._questions[self._next] = question
+            self._answers[self._next] = answer
+            self._versions[self._next] = version
+        self._next = (self._next + 1) % self._capacity
+
+    def search(self,
+               question: str,
+               top_k: int = 1,
+               owner: int | None = None,
+               version: str | None = None) -> list[FAQMatch]:
+        """Find stored questions that are the most similar to this one.
+
+        Args:
+            question (`str`)
+            top_k (`int`): how many matches to return
+            owner (`int | None`): search only this owner's questions
+            version (`str | None`): search only the owner's questions of this version
+        """
+        count = len(self._questions)
+        if owner is None:
+            indices = np.arange(count)
+            # a view, the matrix is not copied
+            vectors = self._vectors[:count]
+        else:
+            indices = np.flatnonzero(self._owners[:count] == owner)
+            if version is not None:
+                # stale answers of the owner are skipped
+                indices = indices[np.array([self._versions[index] == version for index in indices],
+                                           dtype=bool)]
+            vectors = self._vectors[indices]
+        if indices.size == 0:
+            return []
+        scores = vectors @ self._embedder.embed(question)
+        top_k = min(top_k, indices.size)
+        # partial sort is enough for top-k
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [FAQMatch(float(scores[index]),
+                         self._questions[indices[index]],
+                         self._answers[indices[index]],
+                         int(self._owners[indices[index]]))
+                for index in best]
@@ -0,0 +1,193 @@
+"""Scheduler that limits outbound AI requests."""
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator
+from uuid import uuid4
+import asyncio
+import heapq
+import itertools
+import time
+from redis.asyncio import Redis
+from api.schemas.stats import AISchedulerStats
+
+
+# takes a slot if there are free ones
+# KEYS: slots key; ARGV: now, max slots, slot expiry, slot ID
+_ACQUIRE_SLOT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+# takes tokens from the current minute's budget
+# KEYS: minute key; ARGV: tokens, tokens per minute
+_TAKE_TOKENS_SCRIPT = """
+local used = redis.call('INCRBY', KEYS[1], ARGV[1])
+if used == tonumber(ARGV[1]) then
+    redis.call('EXPIRE', KEYS[1], 120)
+end
+if used > tonumber(ARGV[2]) then
+    redis.call('DECRBY', KEYS[1], ARGV[1])
+    return 0
+end
+return 1
+"""
+
+
+class Priority(IntEnum):
+    """AI request priorities, lower value goes first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    # work nobody waits for yet, e.g. plan drafts
+    SPECULATIVE = 2
+
+
+class LLMScheduler:
+    """
+    Limits concurrent AI requests and tokens per minute.
+
+    Waiting requests are served by priority, then in arrival order.
+    With Redis the limits are shared between API worker processes
+    (priority is respected only inside a process then).
+    """
+
+    def __init__(self,
+                 max_concurrency: int,
+                 tokens_per_minute: int | None = None,
+                 redis: Redis | None = None,
+                 slot_ttl_seconds: float = 300,
+                 poll_interval_seconds: float = 0.1):
+        self._max_concurrency = max_concurrency
+        self._tokens_per_minute = tokens_per_minute
+        self._redis = redis
+        self._slot_ttl = slot_ttl_seconds
+        self._poll_interval = poll_interval_seconds
+
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._order = itertools.count()
+
+        # local token bucket, refilled continuously
+        self._tokens = float(tokens_per_minute or 0)
+        self._tokens_updated = time.monotonic()
+
+        self._stats = AISchedulerStats()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, tokens: int) -> AsyncIterator[None]:
+        """Wait for a free slot and tokens, hold the slot inside the block.
+
+        Args:
+            priority (`Priority`): request priority
+            tokens (`int`): estimated tokens of the request (prompt and completion)
+        """
+        started = time.monotonic()
+        await self._acquire_local(priority)
+        slot_id = None
+        try:
+            if self._redis is not None:
+                slot_id = await self._acquire_shared()
+            if self._tokens_per_minute:
+                await self._take_tokens(tokens)
+            self._record_wait(time.monotonic() - started)
+            yield
+        finally:
+            if slot_id is not None:
+                await self._redis.zrem("llm_scheduler:slots", slot_id)
+            self._release_local()
+
+    def get_stats(self) -> AISchedulerStats:
+        """Get current queue and wait statistics."""
+        stats = self._stats.model_copy()
+        stats.active = self._active
+        stats.queued_interactive = self._count_waiting(Priority.INTERACTIVE)
+        stats.queued_background = self._count_waiting(Priority.BACKGROUND)
+        stats.queued_speculative = self._count_waiting(Priority.SPECULATIVE)
+        return stats
+
+    def _count_waiting(self, priority: Priority) -> int:
+        """Count requests that wait with this priority."""
+        return sum(1 for waiter_priority, _, _ in self._waiters
+                   if waiter_priority == priority)
+
+    def _record_wait(self, wait_seconds: float):
+        """Add request's waiting time to the statistics."""
+        self._stats.requests += 1
+        self._stats.total_wait_seconds += wait_seconds
+        self._stats.max_wait_seconds = max(self._stats.max_wait_seconds, wait_seconds)
+
+    async def _acquire_local(self, priority: Priority):
+        """Take a slot of this process, wait by priority if there are none."""
+        if self._active < self._max_concurrency and not self._waiters:
+            self._active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._order), future)
+        heapq.heappush(self._waiters, waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over already, pass it on
+                self._release_local()
+            elif waiter in self._waiters:
+                # a release could skip the cancelled waiter already
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release_local(self):
+        """Hand the slot over to the next waiter or free it."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            # cancelled waiters are removed later by their tasks
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    async def _acquire_shared(self) -> str:
+        """Take a slot shared between processes, wait until there is one."""
+        slot_id = uuid4().hex
+        while True:
+            now = time.time()
+            acquired = await self._redis.eval(_ACQUIRE_SLOT_SCRIPT, 1,
+                                              "llm_scheduler:slots",
+                                              now,
+                                              self._max_concurrency,
+                                              now + self._slot_ttl,
+                                              slot_id)
+            if acquired:
+                return slot_id
+            await asyncio.sleep(self._poll_interval)
+
+    async def _take_tokens(self, tokens: int):
+        """Wait until tokens per minute budget allows the request."""
+        # a request can't take more than the whole budget
+        tokens = min(tokens, self._tokens_per_minute)
+        if self._redis is not None:
+            while True:
+                minute = int(time.time() // 60)
+                taken = await self._redis.eval(_TAKE_TOKENS_SCRIPT, 1,
+                                               f"llm_scheduler:tokens:{minute}",
+                                               tokens,
+                                               self._tokens_per_minute)
+                if taken:
+                    return
+                # wait for the next minute
+                await asyncio.sleep(60 - time.time() % 60)
+
+        refill_rate = self._tokens_per_minute / 60
+        while True:
+            now = time.monotonic()
+            self._tokens = min(float(self._tokens_per_minute),
+                               self._tokens + (now - self._tokens_updated) * refill_rate)
+            self._tokens_updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self._tokens) / refill_rate)
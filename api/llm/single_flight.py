@@ -0,0 +1,101 @@
+"""Coalescing of identical concurrent AI requests."""
+from typing import Awaitable, Callable
+from uuid import uuid4
+import asyncio
+import hashlib
+from redis.asyncio import Redis
+
+
+# remembers the last flight and releases the lock if it's still ours
+# KEYS: lock key, last flight key; ARGV: flight ID, last flight expiry (ms)
+_RELEASE_LOCK_SCRIPT = """
+redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[2])
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Runs only one call for the same key at a time.
+
+    Concurrent callers with the same key share one call
+    and get the same result. With Redis the calls are also shared
+    between API worker processes: the first worker takes a lock,
+    the others wait for the result it publishes.
+    """
+
+    def __init__(self,
+                 redis: Redis | None = None,
+                 lock_ttl_seconds: float = 300,
+                 result_ttl_seconds: float = 30,
+                 poll_interval_seconds: float = 0.5):
+        self._redis = redis
+        self._lock_ttl = lock_ttl_seconds
+        self._result_ttl = result_ttl_seconds
+        self._poll_interval = poll_interval_seconds
+        self._calls: dict[str, asyncio.Task[str]] = {}
+
+    @staticmethod
+    def make_key(user_id: int, kind: str, content: str) -> str:
+        """Make a key for the call.
+
+        Args:
+            user_id (`int`): user who makes the request
+            kind (`str`): request kind (plan, chat, etc.)
+            content (`str`): request content, e.g. the prompt
+        """
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        return f"single_flight:{user_id}:{kind}:{digest}"
+
+    async def run(self, key: str, func: Callable[[], Awaitable[str]]) -> str:
+        """Run the call or join the one that is already running.
+
+        Args:
+            key (`str`): call key, see `make_key`
+            func (`Callable[[], Awaitable[str]]`): makes the call
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.create_task(self._run_shared(key, func))
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        # a cancelled caller must not cancel the call for others
+        return await asyncio.shield(call)
+
+    async def _run_shared(self, key: str, func: Callable[[], Awaitable[str]]) -> str:
+        """Run the call once across all workers using Redis."""
+        if self._redis is None:
+            return await func()
+
+        while True:
+            flight_id = uuid4().hex
+            if await self._redis.set(key, flight_id, nx=True, px=int(self._lock_ttl * 1000)):
+                try:
+                    result = await func()
+                    await self._redis.set(f"{key}:{flight_id}", result,
+                                          px=int(self._result_ttl * 1000))
+                    return result
+                finally:
+                    # the lock can belong to another worker after it expired
+                    await self._redis.eval(_RELEASE_LOCK_SCRIPT, 2, key, f"{key}:last",
+                                           flight_id, int(self._result_ttl * 1000))
+
+            # another worker makes the same call, wait for its result
+            running_id = await self._redis.get(key)
+            if running_id is None:
+                # the call has finished after the lock was checked
+                running_id = await self._redis.get(f"{key}:last")
+            while running_id is not None:
+                # the result is published before the lock is released,
+                # so check the lock first to not miss it
+                is_running = await self._redis.get(key) == running_id
+                result = await self._redis.get(f"{key}:{running_id.decode()}")
+                if result is not None:
+                    return result.decode()
+                if not is_running:
+                    # the call has failed, try to make it here
+                    break
+                await asyncio.sleep(self._poll_interval)
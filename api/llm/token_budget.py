@@ -0,0 +1,60 @@
+"""Local prompt token estimation and budgeting."""
+from api.config import config
+
+
+# average characters per token, cyrillic text is split into more tokens
+_CHARS_PER_TOKEN = 4.0
+_CYRILLIC_CHARS_PER_TOKEN = 2.5
+# service tokens added by the chat format for every message
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in the text.
+
+    It's a rough estimation that doesn't need a tokenizer,
+    it's good enough to keep prompts within the budget.
+
+    Args:
+        text (`str`): text to estimate
+    """
+    cyrillic = sum(1 for char in text if 'Ѐ' <= char <= 'ӿ')
+    other = len(text) - cyrillic
+    return int(cyrillic / _CYRILLIC_CHARS_PER_TOKEN + other / _CHARS_PER_TOKEN) + 1
+
+
+def estimate_messages_tokens(messages: list[dict]) -> int:
+    """Estimate the number of prompt tokens in chat messages.
+
+    Args:
+        messages (`list[dict]`): chat messages
+    """
+    return sum(estimate_tokens(message['content']) + _MESSAGE_OVERHEAD_TOKENS
+               for message in messages)
+
+
+def truncate_to_tokens(text: str | None, max_tokens: int) -> str | None:
+    """Cut the text so it takes no more than `max_tokens` tokens.
+
+    Args:
+        text (`str | None`): text to cut
+        max_tokens (`int`): token limit for the text
+    """
+    if text is None or estimate_tokens(text) <= max_tokens:
+        return text
+    # the lowest chars per token ratio guarantees the limit
+    max_chars = int(max_tokens * _CYRILLIC_CHARS_PER_TOKEN)
+    return text[:max_chars].rstrip() + '…'
+
+
+def get_max_tokens(messages: list[dict]) -> int:
+    """Get completion token limit for the prompt.
+
+    It's the rest of the context window, but not more than
+    the configured output limit.
+
+    Args:
+        messages (`list[dict]`): chat messages of the prompt
+    """
+    remaining = config.AI_CONTEXT_TOKENS - estimate_messages_tokens(messages)
+    return max(min(config.AI_MAX_OUTPUT_TOKENS, remaining), config.AI_MIN_OUTPUT_TOKENS)
@@ -1,11 +1,33 @@
 """Entry point to the API."""
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from .exceptions import BaseCustomException
-from .routes import user, activity_levels, training_plan
+from .routes import user, activity_levels, training_plan, stats
+from .config import config
+from .service.activity_level import activity_level_registry
+from .service.plan_job import plan_job_queue
+from .service.plan_template import plan_template_library
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start background workers on start up
+    and stop them on shutdown.
+    """
+    await activity_level_registry.start()
+    if config.PLAN_TEMPLATES_ENABLED:
+        await plan_template_library.start()
+    await plan_job_queue.start()
+    yield
+    await plan_job_queue.stop()
+    await plan_template_library.stop()
+    await activity_level_registry.stop()
+
+
+# orjson serializes responses faster than the standard json
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
 @app.exception_handler(BaseCustomException)
@@ -30,6 +52,7 @@ async def handle_custom_exceptions(request: Request,
 app.include_router(user.router)
 app.include_router(activity_levels.router)
 app.include_router(training_plan.router)
+app.include_router(stats.router)
 
 # for launching
 if __name__ == "__main__":
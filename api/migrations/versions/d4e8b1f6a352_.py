@@ -0,0 +1,37 @@
+"""delete users' plans and unset activity levels in the database
+
+Revision ID: d4e8b1f6a352
+Revises: c27f5a9e0d13
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8b1f6a352'
+down_revision: Union[str, Sequence[str], None] = 'c27f5a9e0d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('training_plans_user_id_fkey', 'training_plans', type_='foreignkey')
+    op.create_foreign_key('training_plans_user_id_fkey', 'training_plans',
+                          'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.drop_constraint('users_activity_level_fkey', 'users', type_='foreignkey')
+    op.create_foreign_key('users_activity_level_fkey', 'users',
+                          'activity_levels', ['activity_level'], ['level'], ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('users_activity_level_fkey', 'users', type_='foreignkey')
+    op.create_foreign_key('users_activity_level_fkey', 'users',
+                          'activity_levels', ['activity_level'], ['level'])
+    op.drop_constraint('training_plans_user_id_fkey', 'training_plans', type_='foreignkey')
+    op.create_foreign_key('training_plans_user_id_fkey', 'training_plans',
+                          'users', ['user_id'], ['id'])
@@ -0,0 +1,51 @@
+"""store timestamps with time zone
+
+Revision ID: e7c3a9d2f5b1
+Revises: d4e8b1f6a352
+Create Date: 2026-10-18 21:00:00.000000
+
+Timestamps were written by now() in the server's time zone.
+The cast reads them in the session time zone (the server's one
+by default), so run the migration with the time zone they were written in.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c3a9d2f5b1'
+down_revision: Union[str, Sequence[str], None] = 'd4e8b1f6a352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> its timestamp columns
+TIMESTAMP_COLUMNS = {
+    'activity_levels': ('created_at', 'updated_at'),
+    'users': ('created_at', 'updated_at'),
+    'training_plans': ('created_at', 'updated_at'),
+    'training_plan_days': ('created_at', 'updated_at'),
+    'plan_templates': ('created_at', 'updated_at'),
+    'training_plan_drafts': ('created_at', 'updated_at', 'profile_updated_at'),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        for column in columns:
+            op.alter_column(table, column,
+                            existing_type=sa.DateTime(),
+                            type_=sa.DateTime(timezone=True),
+                            existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        for column in columns:
+            op.alter_column(table, column,
+                            existing_type=sa.DateTime(timezone=True),
+                            type_=sa.DateTime(),
+                            existing_nullable=False)
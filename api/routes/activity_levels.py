@@ -1,10 +1,12 @@
 """Endpoints for ActivityLevel."""
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Body, Depends, Request, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from api.schemas.activity_level import ActivityLevel, ActivityLevelInput, ActivityLevelUpdate
+from api.config import config
 from api.database.database import get_db_session
 from api.service import activity_level as service
+from .utils import get_version_headers, make_not_modified_response
 
 
 router = APIRouter(prefix="/level")
@@ -23,9 +25,34 @@ async def create_activity_level(level_data: ActivityLevelInput,
     return activity_level
 
 
+@router.post('/bulk')
+async def create_activity_levels(levels_data: list[ActivityLevelInput] =
+                                     Body(max_length=config.DB_BULK_MAX_ITEMS),
+                                 session: AsyncSession = Depends(get_db_session)) -> JSONResponse:
+    """Create many activity levels at once, e.g. to seed the database.
+
+    All levels are created or none if some can't be.
+    At most `DB_BULK_MAX_ITEMS` levels in one request.
+    """
+    count = await service.create_many(levels_data, session=session)
+    return JSONResponse(status_code=201,
+                        content={"message": f"{count} activity levels were created"})
+
+
 @router.get('/all')
-async def get_all(session: AsyncSession = Depends(get_db_session)) -> list[ActivityLevel]:
-    """Get all activity levels."""
+async def get_all(request: Request,
+                  response: Response,
+                  session: AsyncSession = Depends(get_db_session)) -> list[ActivityLevel]:
+    """Get all activity levels.
+
+    Sends an ETag, if it's sent back in If-None-Match and the levels
+    haven't changed, the answer is 304.
+    """
+    version = await service.get_all_levels_version(session=session)
+    not_modified = make_not_modified_response(request, version)
+    if not_modified is not None:
+        return not_modified
+    response.headers.update(get_version_headers(version))
     levels = await service.get_all_levels(session=session)
     return levels
 
@@ -0,0 +1,36 @@
+"""Endpoints for API statistics."""
+from fastapi import APIRouter
+from api.schemas.stats import AIStats, DBPoolStats
+from api.database.database import engine
+from api.llm.ai_client import AIClient
+
+
+router = APIRouter(prefix="/stats")
+
+
+@router.get('/llm')
+async def get_llm_stats() -> AIStats:
+    """Get AI usage statistics of this API process.
+
+    Shows how many prompt tokens were cached by the provider,
+    how many requests wait for the scheduler and how long,
+    how often cached responses and answered questions are used
+    and if AI requests are blocked by the circuit breaker.
+    """
+    return AIStats(usage=AIClient.USAGE,
+                   scheduler=AIClient.SCHEDULER.get_stats(),
+                   cache=AIClient.CACHE.get_stats(),
+                   faq=AIClient.get_faq_stats(),
+                   circuit_states={model: breaker.state
+                                   for model, breaker in AIClient.BREAKERS.items()})
+
+
+@router.get('/db')
+async def get_db_stats() -> DBPoolStats:
+    """Get database connection pool statistics of this API process.
+
+    Shows how many connections are in use, how long requests
+    waited for a connection and how many couldn't get one in time.
+    Use it to choose the pool size.
+    """
+    return engine.pool.get_stats()
@@ -1,11 +1,17 @@
 """Endpoints for TrainingPlan."""
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Path, Request
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from api.schemas.ai_request import UserAIRequest
-from api.schemas.training_plan import TrainingPlan, TrainingPlanInput
+from api.schemas.training_plan import TrainingPlan, TrainingPlanDay, TrainingPlanInput
+from api.schemas.plan_job import PlanJob
+from api.schemas.plan_template import PlanTemplate, PlanTemplateInput
+from api.config import config
 from api.database.database import get_db_session
 from api.service import training_plan as service
+from api.service import plan_template as template_service
+from api.service.plan_job import plan_job_queue
+from .utils import get_version_headers, make_json_response, make_not_modified_response
 
 
 router = APIRouter(prefix="/plan")
@@ -20,22 +26,89 @@ async def create_user_plan(user_id: int,
     return training_plan
 
 
-@router.post('/generate')
-async def generate_user_plan(request: UserAIRequest,
-                             session: AsyncSession = Depends(get_db_session)):
+@router.put('/user/{user_id}')
+async def upsert_user_plan(user_id: int,
+                           plan_data: TrainingPlanInput,
+                           session: AsyncSession = Depends(get_db_session)) -> TrainingPlan:
+    """Create training plan for the user or replace the existing one.
+
+    Days that are not in the new plan are deleted.
+    """
+    return await service.upsert_user_plan(user_id, plan_data, session=session)
+
+
+@router.post('/generate', status_code=202)
+async def generate_user_plan(request: UserAIRequest) -> PlanJob:
     """Generate training plan for the user with provided ID.
 
     It will create/update user's training plan. AI would generate the
     plan using the data about that user.
+
+    Generation runs in the background: the job is returned at once,
+    use `/plan/job/{job_id}` to check its status and get the result.
+    If there is a plan draft or a template for the user,
+    the job is already done.
+    """
+    plan = await service.get_ready_plan(request)
+    if plan is not None:
+        return await plan_job_queue.add_done(request, plan)
+    return await plan_job_queue.submit(request)
+
+
+@router.post('/template/create')
+async def create_plan_template(template_data: PlanTemplateInput,
+                               session: AsyncSession = Depends(get_db_session)) -> PlanTemplate:
+    """Create a plan template.
+
+    Users with a similar profile get this plan
+    when they generate a plan without wishes.
+    """
+    return await template_service.create(template_data, session=session)
+
+
+@router.get('/job/{job_id}')
+async def get_plan_job(job_id: str, request: Request) -> PlanJob:
+    """Get plan generation job status and result by its id.
+
+    Big results are gzipped if the client accepts it.
     """
-    await service.generate_plan(request, session=session)
+    job = await plan_job_queue.get(job_id)
+    return make_json_response(request, job, config.PLAN_GZIP_MIN_BYTES)
 
 
 @router.get('/get/user/{user_id}')
 async def get_user_plan(user_id: int,
+                        request: Request,
                         session: AsyncSession = Depends(get_db_session)) -> TrainingPlan:
-    """Get user's training plan by their id."""
-    return await service.get_user_plan(user_id, session)
+    """Get user's training plan by their id.
+
+    Big plans are gzipped if the client accepts it.
+
+    Sends an ETag, if it's sent back in If-None-Match and the plan
+    hasn't changed, the answer is 304 without loading the plan.
+    """
+    headers = {}
+    version = await service.get_user_plan_version(user_id, session)
+    if version is not None:
+        not_modified = make_not_modified_response(request, version)
+        if not_modified is not None:
+            return not_modified
+        headers = get_version_headers(version)
+    plan = await service.get_user_plan(user_id, session)
+    return make_json_response(request, plan, config.PLAN_GZIP_MIN_BYTES, headers=headers)
+
+
+@router.get('/get/user/{user_id}/day/{weekday}')
+async def get_user_plan_day(user_id: int,
+                            weekday: int = Path(ge=0, le=6, description='Day of the week, 0 is Monday'),
+                            session: AsyncSession = Depends(get_db_session)) -> TrainingPlanDay:
+    """Get one day of user's training plan by their id.
+
+    Only this day is loaded, use it instead of the whole plan
+    when you need e.g. today's workout. Plans saved without days
+    are split into days by the weekday headers in their text.
+    """
+    return await service.get_user_plan_day(user_id, weekday, session)
 
 
 @router.delete('/delete/user/{user_id}')
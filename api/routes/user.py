@@ -1,11 +1,16 @@
 """Endpoints for User."""
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
+from typing import Literal
+from fastapi import APIRouter, Body, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from api.schemas.user import User, UserInput, UserUpdate
+from api.schemas.user import User, UserInput, UserUpdate, UserUpsert
 from api.schemas.ai_request import UserAIRequest
+from api.config import config
 from api.database.database import get_db_session
 from api.service import user as service
+from api.service.plan_job import plan_job_queue
+from .utils import get_version_headers, make_not_modified_response, \
+    stream_csv_with_errors, stream_models_as_ndjson, stream_text_as_ndjson
 
 
 router = APIRouter(prefix="/user")
@@ -14,42 +19,159 @@ router = APIRouter(prefix="/user")
 @router.post('/create')
 async def create_user(user_data: UserInput,
                       session: AsyncSession = Depends(get_db_session)) -> None:
-    """Create a new user."""
+    """Create a new user.
+
+    With plan pre-generation, a plan draft for the user
+    starts generating in the background.
+    """
     await service.create(user_data, session=session)
+    if config.PLAN_PREGENERATE:
+        plan_job_queue.submit_draft(user_data.id)
+
+
+@router.post('/bulk')
+async def create_users(users_data: list[UserInput] = Body(max_length=config.DB_BULK_MAX_ITEMS),
+                       session: AsyncSession = Depends(get_db_session)) -> JSONResponse:
+    """Create many users at once, e.g. to import them.
+
+    All users are created or none if some can't be.
+    Plan drafts are not pre-generated for them.
+    Bigger imports are split into requests of `DB_BULK_MAX_ITEMS` users.
+    """
+    count = await service.create_many(users_data, session=session)
+    return JSONResponse(status_code=201,
+                        content={"message": f"{count} users were created"})
+
+
+@router.put('/{user_id}')
+async def upsert_user(user_id: int,
+                      user_data: UserUpsert,
+                      session: AsyncSession = Depends(get_db_session)) -> User:
+    """Create the user or replace their data if they exist.
+
+    The training plan is not returned (`training_plan` is null).
+    With plan pre-generation, a plan draft for the user
+    starts generating in the background if they are new
+    or their data is changed.
+    """
+    user, changed = await service.upsert(user_id, user_data, session=session)
+    if config.PLAN_PREGENERATE and changed:
+        plan_job_queue.submit_draft(user_id)
+    return user
 
 
 @router.post('/chat')
-async def chat_with_ai(request: UserAIRequest,
-                       session: AsyncSession = Depends(get_db_session)) -> str:
+async def chat_with_ai(request: UserAIRequest) -> str:
     """Send message to AI.
 
     AI-coach will take user's request, analyze data about the user
     and send an answer (advise, help, etc.).
     """
-    return await service.get_ai_answer(request, session=session)
+    return await service.get_ai_answer(request)
+
+
+@router.post('/chat/stream')
+async def chat_with_ai_stream(request: UserAIRequest) -> StreamingResponse:
+    """Send message to AI and stream the answer.
+
+    Works like `/chat`, but the answer is sent as NDJSON lines
+    while AI generates it: `{"delta": "..."}` for every text piece
+    and `{"error": "..."}` if generation fails midway.
+    """
+    chunks = await service.stream_ai_answer(request)
+    return StreamingResponse(stream_text_as_ndjson(chunks),
+                             media_type="application/x-ndjson")
 
 
 @router.get('/get/{user_id}')
 async def get_by_id(user_id: int,
+                    request: Request,
+                    response: Response,
+                    exclude: list[Literal['training_plan']] = Query(
+                        default=[],
+                        description='Data not to load with the user'),
                     session: AsyncSession = Depends(get_db_session)) -> User:
-    """Get the user by ID."""
-    user = await service.get_by_id(user_id, session=session)
+    """Get the user by ID.
+
+    The training plan is loaded unless it's in `exclude`,
+    then `training_plan` is null. The user without the plan
+    has its own ETag.
+
+    Sends an ETag, if it's sent back in If-None-Match and the user
+    hasn't changed, the answer is 304 without loading the user.
+    """
+    profile = 'summary' if 'training_plan' in exclude else 'full'
+    version = await service.get_version(user_id, session=session, profile=profile)
+    if version is not None:
+        not_modified = make_not_modified_response(request, version)
+        if not_modified is not None:
+            return not_modified
+        response.headers.update(get_version_headers(version))
+    user = await service.get_by_id(user_id, session=session, profile=profile)
     return user
 
 
 @router.get('/all')
-async def get_all(session: AsyncSession = Depends(get_db_session)) -> list[User]:
-    """Get all users in the database."""
-    users = await service.get_all(session=session)
+async def get_all(after_id: int | None = Query(default=None,
+                                               description='Last user ID of the previous page'),
+                  limit: int = Query(default=100, ge=1, le=1000),
+                  session: AsyncSession = Depends(get_db_session)) -> list[User]:
+    """Get a page of users ordered by ID.
+
+    To get the next page, pass the last user ID
+    of this page as `after_id`.
+    """
+    users = await service.get_all(session=session, after_id=after_id, limit=limit)
     return users
 
 
+@router.get('/all/stream')
+async def stream_all(after_id: int | None = Query(default=None,
+                                                  description='Stream users after this ID')
+                     ) -> StreamingResponse:
+    """Stream all users ordered by ID as NDJSON lines.
+
+    Users are read with a server-side cursor, so it works
+    for tables of any size. If streaming fails midway,
+    the last line is `{"error": "..."}`.
+    """
+    return StreamingResponse(stream_models_as_ndjson(service.stream_all(after_id)),
+                             media_type="application/x-ndjson")
+
+
+@router.get('/export')
+async def export_users(file_format: Literal['csv', 'ndjson'] = Query(default='csv',
+                                                                   alias='format',
+                                                                   description='File format')
+                       ) -> StreamingResponse:
+    """Export all users ordered by ID as a file.
+
+    CSV is made by the database (COPY) and has a header,
+    NDJSON has the same lines as `/user/all/stream`.
+    """
+    if file_format == 'ndjson':
+        return StreamingResponse(stream_models_as_ndjson(service.stream_all()),
+                                 media_type="application/x-ndjson",
+                                 headers={"Content-Disposition":
+                                          'attachment; filename="users.ndjson"'})
+    return StreamingResponse(stream_csv_with_errors(service.export_csv()),
+                             media_type="text/csv",
+                             headers={"Content-Disposition": 'attachment; filename="users.csv"'})
+
+
 @router.patch('/update/{user_id}')
 async def update_user(user_id: int,
                       user_data: UserUpdate,
                       session: AsyncSession = Depends(get_db_session)) -> JSONResponse:
-    """Update the user by their ID."""
+    """Update the user by their ID.
+
+    With plan pre-generation, a plan draft for the updated
+    profile starts generating in the background
+    if the plan prompt's data is changed.
+    """
     await service.update(user_id, user_data, session)
+    if config.PLAN_PREGENERATE and service.changes_prompt_data(user_data):
+        plan_job_queue.submit_draft(user_id)
     return JSONResponse(status_code=200,
                         content={"message": f"User with ID={user_id} was updated"})
 
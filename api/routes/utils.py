@@ -0,0 +1,144 @@
+"""Extra functions for endpoints."""
+from datetime import timezone
+from email.utils import format_datetime
+from typing import AsyncIterator
+import csv
+import gzip
+import io
+import json
+import logging
+from fastapi import Request, Response
+from pydantic import BaseModel
+from api.exceptions import BaseCustomException
+from api.schemas.version import ResourceVersion
+
+
+logger = logging.getLogger(__name__)
+
+
+async def stream_text_as_ndjson(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Convert text chunks to NDJSON lines.
+
+    Every line is either `{"delta": "<text>"}` or, if the
+    stream was interrupted, `{"error": "<message>"}`.
+    Errors can't change the status code after the response
+    has started, so they are sent as the last line.
+
+    Args:
+        chunks (`AsyncIterator[str]`): text pieces to send
+    """
+    try:
+        async for chunk in chunks:
+            yield json.dumps({"delta": chunk}, ensure_ascii=False) + "\n"
+    except BaseCustomException as exc:
+        yield json.dumps({"error": exc.message}, ensure_ascii=False) + "\n"
+    except Exception:
+        logger.exception("Streaming was interrupted")
+        yield json.dumps({"error": "Unexpected error"}) + "\n"
+
+
+async def stream_models_as_ndjson(models: AsyncIterator[BaseModel]) -> AsyncIterator[str]:
+    """Convert pydantic models to NDJSON lines.
+
+    Every line is a JSON model or, if the stream
+    was interrupted, `{"error": "<message>"}`.
+
+    Args:
+        models (`AsyncIterator[BaseModel]`): models to send
+    """
+    try:
+        async for model in models:
+            yield model.model_dump_json() + "\n"
+    except BaseCustomException as exc:
+        yield json.dumps({"error": exc.message}, ensure_ascii=False) + "\n"
+    except Exception:
+        logger.exception("Streaming was interrupted")
+        yield json.dumps({"error": "Unexpected error"}) + "\n"
+
+
+async def stream_csv_with_errors(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Send CSV chunks, report an interruption as the last line.
+
+    If the stream was interrupted, the last line is
+    `error,<message>`, the same way NDJSON streams report it.
+
+    Args:
+        chunks (`AsyncIterator[bytes]`): CSV pieces to send
+    """
+    # chunks can end in the middle of a row
+    line_ended = True
+    try:
+        async for chunk in chunks:
+            line_ended = chunk.endswith(b"\n")
+            yield chunk
+    except BaseCustomException as exc:
+        yield _make_csv_error_line(exc.message, line_ended)
+    except Exception:
+        logger.exception("Streaming was interrupted")
+        yield _make_csv_error_line("Unexpected error", line_ended)
+
+
+def _make_csv_error_line(message: str, line_ended: bool) -> bytes:
+    """Make the CSV line that reports an error, it starts a new line."""
+    line = io.StringIO()
+    if not line_ended:
+        line.write("\n")
+    csv.writer(line, lineterminator="\n").writerow(("error", message))
+    return line.getvalue().encode()
+
+
+def make_json_response(request: Request,
+                       model: BaseModel,
+                       gzip_min_bytes: int,
+                       headers: dict[str, str] | None = None) -> Response:
+    """Make a JSON response, gzipped if it's big and the client accepts gzip.
+
+    Args:
+        request (`Request`): the request to answer
+        model (`BaseModel`): the model to send
+        gzip_min_bytes (`int`): compress responses of this size and bigger, 0 disables
+        headers (`dict[str, str] | None`): extra response headers
+    """
+    headers = dict(headers or {})
+    body = model.model_dump_json().encode()
+    if (not gzip_min_bytes or len(body) < gzip_min_bytes
+            or 'gzip' not in request.headers.get('accept-encoding', '')):
+        return Response(content=body, media_type="application/json", headers=headers)
+    headers.update({"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return Response(content=gzip.compress(body, compresslevel=6),
+                    media_type="application/json",
+                    headers=headers)
+
+
+def get_version_headers(version: ResourceVersion) -> dict[str, str]:
+    """Get ETag and Last-Modified headers of the resource version.
+
+    Args:
+        version (`ResourceVersion`): the resource version
+    """
+    # clients must check the version before using a cached copy
+    headers = {"ETag": version.etag, "Cache-Control": "no-cache"}
+    if version.last_modified is not None:
+        # the database returns times with the time zone
+        last_modified = version.last_modified.astimezone(timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def make_not_modified_response(request: Request, version: ResourceVersion) -> Response | None:
+    """Make a 304 response if the client has this version (If-None-Match).
+
+    Returns None if the full response must be sent.
+
+    Args:
+        request (`Request`): the request to answer
+        version (`ResourceVersion`): current resource version
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return None
+    # weak comparison, W/ prefix is ignored
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    if '*' not in tags and version.etag.removeprefix('W/') not in tags:
+        return None
+    return Response(status_code=304, headers=get_version_headers(version))
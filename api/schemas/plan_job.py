@@ -0,0 +1,31 @@
+"""Plan generation job Pydantic schemas."""
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+from pydantic import BaseModel, Field
+from .training_plan import TrainingPlan
+
+
+class PlanJobStatus(str, Enum):
+    """Plan generation job statuses."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class PlanJob(BaseModel):
+    """
+    Plan generation job model.
+    Describes the state of a training plan generation
+    that runs in the background.
+    """
+    id: str = Field(frozen=True)
+    user_id: int
+    status: PlanJobStatus = PlanJobStatus.QUEUED
+    created_at: datetime = Field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = Field(default=None,
+                                 description='Error message if the job failed')
+    plan: Optional[TrainingPlan] = Field(default=None,
+                                         description='Generated plan if the job is done')
@@ -0,0 +1,42 @@
+"""Plan template Pydantic schemas."""
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from .training_plan import TrainingPlanDayInput, check_weekdays
+from .user import UserValidationMixin
+
+
+class PlanTemplate(BaseModel):
+    """
+    Plan template model.
+    A ready training plan for users with a similar profile.
+    """
+    id: int = Field(frozen=True)
+    gender: str
+    age: int
+    weight_kg: float
+    height_cm: float
+    activity_level: Optional[int] = None
+    goal: Optional[str] = None
+    days: list[TrainingPlanDayInput]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PlanTemplateInput(BaseModel, UserValidationMixin):
+    """
+    Plan template model for database input.
+    Use to create database entries.
+    """
+    gender: str
+    age: int = Field(gt=0, lt=100)
+    weight_kg: float = Field(gt=0.0, lt=500.0)
+    height_cm: float = Field(gt=60.0, lt=250.0)
+    activity_level: Optional[int] = None
+    goal: Optional[str] = None
+    days: list[TrainingPlanDayInput]
+
+    @field_validator('days')
+    @classmethod
+    def check_days(cls, days: list[TrainingPlanDayInput]) -> list[TrainingPlanDayInput]:
+        """Check that every day of the week is in the template once."""
+        return check_weekdays(days)
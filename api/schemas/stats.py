@@ -0,0 +1,97 @@
+"""Statistics Pydantic schemas."""
+from pydantic import BaseModel
+from openai.types import CompletionUsage
+
+
+class AIUsageStats(BaseModel):
+    """
+    AI usage statistics model.
+    Counts requests, tokens and time spent on AI requests
+    since the API start.
+    """
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_latency_seconds: float = 0.0
+    hedged_requests: int = 0
+    hedge_wins: int = 0
+
+    def record(self, usage: CompletionUsage | None, latency_seconds: float):
+        """Add a finished request to the statistics.
+
+        Args:
+            usage (`CompletionUsage | None`): usage from the completion
+            latency_seconds (`float`): time spent on the request
+        """
+        self.requests += 1
+        self.total_latency_seconds += latency_seconds
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        details = usage.prompt_tokens_details
+        if details and details.cached_tokens:
+            self.cached_prompt_tokens += details.cached_tokens
+
+
+class AISchedulerStats(BaseModel):
+    """
+    AI scheduler statistics model.
+    Shows current queue depth and how long requests
+    waited for a slot since the API start.
+    """
+    active: int = 0
+    queued_interactive: int = 0
+    queued_background: int = 0
+    queued_speculative: int = 0
+    requests: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+class AICacheStats(BaseModel):
+    """
+    AI response cache statistics model.
+    """
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+
+
+class AIFAQStats(BaseModel):
+    """
+    Answered questions retrieval statistics model.
+    """
+    lookups: int = 0
+    hits: int = 0
+    entries: int = 0
+    total_lookup_seconds: float = 0.0
+
+
+class AIStats(BaseModel):
+    """
+    All AI statistics of the API process.
+    """
+    usage: AIUsageStats
+    scheduler: AISchedulerStats
+    cache: AICacheStats
+    faq: AIFAQStats
+    circuit_states: dict[str, str]
+
+
+class DBPoolStats(BaseModel):
+    """
+    Database connection pool statistics model.
+    Shows current pool usage and how long requests
+    waited for a connection since the API start.
+    """
+    size: int = 0
+    checked_out: int = 0
+    overflow: int = 0
+    checkouts: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    timeouts: int = 0
+    connects: int = 0
+    invalidations: int = 0
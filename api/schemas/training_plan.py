@@ -1,8 +1,55 @@
 """Training plan Pydantic schemas."""
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
+# days of the week as they are written in plans
+WEEKDAYS = (
+    'понедельник',
+    'вторник',
+    'среда',
+    'четверг',
+    'пятница',
+    'суббота',
+    'воскресенье'
+)
+
+# added to the end of every generated plan
+PLAN_ENDING = "Помни, что это примерный план, и ты можешь его модифицировать!"
+
+
+def check_weekdays(days: list['TrainingPlanDayInput']) -> list['TrainingPlanDayInput']:
+    """Check that every day of the week is in the days once.
+
+    Returns days sorted by weekday.
+    """
+    if sorted(day.weekday for day in days) != list(range(len(WEEKDAYS))):
+        raise ValueError("Every day of the week must be in the plan once")
+    return sorted(days, key=lambda day: day.weekday)
+
+
+def split_plan_description(text: str) -> dict[int, list[str]]:
+    """Split the plan text into days by weekday headers (e.g. `ПОНЕДЕЛЬНИК:`).
+
+    Returns not empty lines of every found day by weekday,
+    text in other formats has no days. The plan ending is dropped.
+    """
+    days: dict[int, list[str]] = {}
+    weekday = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line == PLAN_ENDING:
+            continue
+        header = line.lower().strip('*#: ')
+        if header in WEEKDAYS:
+            weekday = WEEKDAYS.index(header)
+            days[weekday] = []
+        elif weekday is not None:
+            days[weekday].append(line)
+    return days
+
+
 class TrainingPlanValidationMixin:
     """Mixin for field validation in schemas."""
     @field_validator('plan_description')
@@ -16,22 +63,79 @@ class TrainingPlanValidationMixin:
         Returns:
             str: plan description checked
         """
-        days = [
-            'понедельник',
-            'вторник',
-            'среда',
-            'четверг',
-            'пятница',
-            'суббота',
-            'воскресенье'
-        ]
-
-        missing = [day for day in days if day not in text.lower()]
+        missing = [day for day in WEEKDAYS if day not in text.lower()]
         if missing:
             raise ValueError(
                 f"Some days are not in the plan: {', '.join(missing)}")
         return text
 
+    @field_validator('days')
+    @classmethod
+    def check_days(cls, days: list['TrainingPlanDayInput'] | None):
+        """Check that every day of the week is in the plan once.
+
+        Args:
+            days (list[TrainingPlanDayInput] | None): plan days
+
+        Returns:
+            list[TrainingPlanDayInput] | None: plan days sorted by weekday
+        """
+        if days is None:
+            return days
+        return check_weekdays(days)
+
+
+class TrainingPlanDayInput(BaseModel):
+    """
+    Training plan day model for database input.
+    Contains the plan for one day of the week.
+    """
+    weekday: int = Field(ge=0, le=6, description='Day of the week, 0 is Monday')
+    title: str = Field(description='Short description of the day: workout or rest')
+    description: str = Field(description='Exercises, repetitions and advice for the day')
+
+
+class TrainingPlanDay(TrainingPlanDayInput):
+    """
+    Training plan day model.
+    Use to get one day of the plan without the whole plan.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+
+class GeneratedTrainingPlanDays(BaseModel):
+    """
+    Some days of a training plan generated by AI.
+    AI answers with JSON of this structure when
+    only a part of the plan is changed.
+    """
+    days: list[TrainingPlanDayInput]
+
+
+class GeneratedTrainingPlan(GeneratedTrainingPlanDays):
+    """
+    Training plan generated by AI.
+    AI answers with JSON of this structure.
+    """
+
+    @field_validator('days')
+    @classmethod
+    def check_days(cls, days: list[TrainingPlanDayInput]) -> list[TrainingPlanDayInput]:
+        """Check that every day of the week is in the plan once."""
+        return check_weekdays(days)
+
+    def get_description(self, advice: str | None = None) -> str:
+        """Get the whole plan as text, day by day.
+
+        Args:
+            advice (str | None): advice to the whole plan, added after the days
+        """
+        text = "\n\n".join(f"{WEEKDAYS[day.weekday].upper()}:\n{day.title}\n{day.description}"
+                            for day in self.days)
+        if advice:
+            text = f"{text}\n\n{advice}"
+        return f"{text}\n\n{PLAN_ENDING}"
+
 
 class TrainingPlan(BaseModel):
     """
@@ -42,6 +146,7 @@ class TrainingPlan(BaseModel):
     id: int = Field(frozen=True)
     user_id: int
     plan_description: str
+    days: list[TrainingPlanDay] = []
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -52,6 +157,7 @@ class TrainingPlanInput(BaseModel, TrainingPlanValidationMixin):
     Use to create database entries.
     """
     plan_description: str
+    days: Optional[list[TrainingPlanDayInput]] = None
 
 
 class TrainingPlanUpdate(BaseModel, TrainingPlanValidationMixin):
@@ -60,3 +166,26 @@ class TrainingPlanUpdate(BaseModel, TrainingPlanValidationMixin):
     Use to update database entries.
     """
     plan_description: Optional[str] = None
+    days: Optional[list[TrainingPlanDayInput]] = None
+
+
+class TrainingPlanDraft(BaseModel):
+    """
+    Training plan draft model.
+    A plan generated in advance for the user's profile
+    at `profile_updated_at`.
+    """
+    user_id: int
+    profile_updated_at: datetime
+    days: list[TrainingPlanDayInput]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TrainingPlanDraftInput(BaseModel):
+    """
+    Training plan draft model for database input.
+    Use to create database entries.
+    """
+    profile_updated_at: datetime
+    days: list[TrainingPlanDayInput]
@@ -1,6 +1,7 @@
 """User Pydantic schemas."""
+from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, ConfigDict, \
+from pydantic import AliasChoices, BaseModel, ConfigDict, \
     field_validator, Field
 from .activity_level import ActivityLevel
 from .training_plan import TrainingPlan
@@ -35,18 +36,22 @@ class User(BaseModel):
     gender: str
     goal: Optional[str] = None
     activity_level: Optional[int] = None
-    activity_level_info: Optional[ActivityLevel] = None
+    # taken from the relationship that is loaded with the user
+    activity_level_info: Optional[ActivityLevel] = Field(
+        default=None,
+        validation_alias=AliasChoices('activity_level_info', 'activity_level_relation'))
     training_plan: Optional[TrainingPlan] = None
+    updated_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
-class UserInput(BaseModel, UserValidationMixin):
+class UserUpsert(BaseModel, UserValidationMixin):
     """
-    User model for database input.
-    Use to create database entries.
+    User model for database upsert.
+    Use to create an entry or replace the existing one,
+    the ID is taken from the path.
     """
-    id: int = Field(frozen=True)
     username: Optional[str] = None
     age: int = Field(gt=0, lt=100)
     weight_kg: float = Field(default=70, gt=0.0, lt=500.0)
@@ -56,6 +61,15 @@ class UserInput(BaseModel, UserValidationMixin):
     activity_level: Optional[int] = None
 
 
+class UserInput(UserUpsert):
+    """
+    User model for database input.
+    Use to create database entries.
+    Same as `UserUpsert`, but with the ID.
+    """
+    id: int = Field(frozen=True)
+
+
 class UserUpdate(BaseModel, UserValidationMixin):
     """
     User model for database update.
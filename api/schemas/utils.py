@@ -1,6 +1,7 @@
 """Extra functions for schemas."""
+from functools import lru_cache
 from typing import TypeVar, Iterable
-from pydantic import BaseModel as PydanticModel
+from pydantic import BaseModel as PydanticModel, TypeAdapter
 from api.database.base_model import BaseDatabaseModel
 
 
@@ -10,10 +11,18 @@ SchemaT = TypeVar("SchemaT", bound=PydanticModel)
 DatabaseModelT = TypeVar("DatabaseModelT", bound=BaseDatabaseModel)
 
 
+@lru_cache
+def _get_list_adapter(model: type[SchemaT]) -> TypeAdapter[list[SchemaT]]:
+    """Get the adapter for a list of models, it's built once per model."""
+    return TypeAdapter(list[model])
+
+
 def models_validate(model: type[SchemaT],
                     db_models: Iterable[DatabaseModelT]) -> list[SchemaT]:
     """Convert database models to pydantic models.
 
+    The whole list is validated in one call.
+
     Args:
         model (type[SchemaT]): pydantic model
         db_models (Iterable[DatabaseModelT]): database models
@@ -21,4 +30,4 @@ def models_validate(model: type[SchemaT],
     Returns:
         list[SchemaT]: converted database models
     """
-    return [model.model_validate(db_model) for db_model in db_models]
+    return _get_list_adapter(model).validate_python(list(db_models), from_attributes=True)
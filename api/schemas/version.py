@@ -0,0 +1,29 @@
+"""Resource version Pydantic schemas."""
+from datetime import datetime
+from typing import Any, Optional
+import hashlib
+from pydantic import BaseModel
+
+
+class ResourceVersion(BaseModel):
+    """
+    Resource version model.
+    Used for conditional requests: `etag` changes with
+    every change of the resource, `last_modified` is the time
+    of the last change.
+    """
+    etag: str
+    last_modified: Optional[datetime] = None
+
+    @classmethod
+    def from_parts(cls, *parts: Any) -> 'ResourceVersion':
+        """Make the version from values that change with the resource.
+
+        Args:
+            parts (`Any`): e.g. IDs and update times of the entries
+        """
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+        last_modified = max((part for part in parts if isinstance(part, datetime)),
+                            default=None)
+        # weak: the body can be gzipped or not
+        return cls(etag=f'W/"{digest}"', last_modified=last_modified)
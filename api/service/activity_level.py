@@ -1,11 +1,139 @@
 """Service layer logic for ActivityLevel."""
+from uuid import uuid4
+import asyncio
+import logging
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from pydantic import ValidationError as PydanticValidationError
 from api.exceptions import AlreadyExistError, NotFoundError, UnexpectedError, ValidationError
+from api.config import config
 from api.database.crud import ActivityLevelCRUD
+from api.database.database import session_maker
+from api.database.redis import redis
 from api.schemas.activity_level import ActivityLevel, ActivityLevelInput, ActivityLevelUpdate
 from api.schemas.utils import models_validate
+from api.schemas.version import ResourceVersion
+
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLevelRegistry:
+    """
+    In-memory copy of all activity levels.
+
+    Levels are loaded on start up and reloaded after every change.
+    With Redis, a change in one API worker makes other
+    workers reload their copies too.
+    """
+    _CHANNEL = "activity_levels:changed"
+
+    def __init__(self, redis: Redis | None = None, retry_delay_seconds: float = 5):
+        self._redis = redis
+        self._retry_delay = retry_delay_seconds
+        self._levels: dict[int, ActivityLevel] | None = None
+        self._version: ResourceVersion | None = None
+        # messages of this worker are skipped
+        self._worker_id = uuid4().hex
+        self._listener: asyncio.Task | None = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """Check if levels can be served from memory."""
+        return self._levels is not None
+
+    async def start(self):
+        """Load levels and listen for changes in other workers.
+
+        Use on API **start up**.
+        """
+        await self.load()
+        if self._redis is not None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Stop listening for changes.
+
+        Use on API **shutdown**.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def load(self):
+        """Load all levels from the database.
+
+        The copy is replaced at once, readers never see
+        a partly loaded copy.
+        """
+        async with session_maker() as session:
+            levels = await ActivityLevelCRUD.get_all(session=session)
+        # the same parts as in `get_all_levels_version`
+        self._version = ResourceVersion.from_parts(
+            len(levels), max((level.updated_at for level in levels), default=None))
+        self._levels = {level.level: level
+                        for level in models_validate(ActivityLevel, levels)}
+
+    async def reload(self):
+        """
+        Reload levels after a change and tell other workers about it.
+
+        The change is saved already, so errors are only logged.
+        If levels can't be loaded, they are read from the database
+        until the next load.
+        """
+        try:
+            await self.load()
+        except Exception:
+            logger.exception("Couldn't reload activity levels, reading them from the database")
+            self._levels = None
+            self._version = None
+        if self._redis is not None:
+            try:
+                await self._redis.publish(self._CHANNEL, self._worker_id)
+            except Exception:
+                logger.exception("Couldn't tell other workers about activity level changes")
+
+    def get(self, level: int) -> ActivityLevel | None:
+        """Get the level by its number.
+
+        Args:
+            level (`int`): ActivityLevel number / **level** field
+        """
+        return self._levels.get(level)
+
+    def get_all(self) -> list[ActivityLevel]:
+        """Get all levels."""
+        return list(self._levels.values())
+
+    def get_version(self) -> ResourceVersion:
+        """Get the version of all levels."""
+        return self._version
+
+    async def _listen(self):
+        """Reload levels when other workers change them."""
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._CHANNEL)
+                    # changes could be missed while not subscribed
+                    await self.load()
+                    async for message in pubsub.listen():
+                        if (message['type'] == 'message'
+                                and message['data'].decode() != self._worker_id):
+                            await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Activity level changes listener failed, restarting")
+                await asyncio.sleep(self._retry_delay)
+
+
+# import this to use the levels
+activity_level_registry = ActivityLevelRegistry(
+    redis=redis if config.ACTIVITY_LEVELS_SYNC_USE_REDIS else None)
 
 
 async def create(level_data: ActivityLevelInput, session: AsyncSession):
@@ -32,17 +160,51 @@ async def create(level_data: ActivityLevelInput, session: AsyncSession):
     except Exception as exc:
         await session.rollback()
         raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+    await activity_level_registry.reload()
+
+
+async def create_many(levels_data: list[ActivityLevelInput], session: AsyncSession) -> int:
+    """Create many activity levels in the database at once.
+
+    It's one executemany in one transaction: if a level can't
+    be created, none are. Returns the number of created levels.
+
+    Args:
+        levels_data (`list[ActivityLevelInput]`): data for new activity levels
+        session (`AsyncSession`): an asynchronous database session
+    """
+    try:
+        count = await ActivityLevelCRUD.create_many(levels_data, session=session)
+        await session.commit()
+    except IntegrityError as exc:
+        await session.rollback()
+        error_message = str(exc).lower()
+        if 'unique' in error_message:
+            raise AlreadyExistError(
+                'Some of the activity levels already exist or are repeated.') from exc
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+    except Exception as exc:
+        await session.rollback()
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+    await activity_level_registry.reload()
+    return count
 
 
 async def get_by_level(level: int, session: AsyncSession) -> ActivityLevel:
     """Get info about the level in the database by its level number.
 
     In case of ActivityLevel, **level** field is the ID (primary key).
+    Served from memory when the registry is loaded.
 
     Args:
         level (`int`): ActivityLevel number / **level** field
         session (`AsyncSession`): an asynchronous database session
     """
+    if activity_level_registry.is_loaded:
+        activity_level = activity_level_registry.get(level)
+        if activity_level is None:
+            raise NotFoundError(f"There is no activity level with level={level}.")
+        return activity_level
     level_model = await ActivityLevelCRUD.get_by_id(level, session=session)
     if level_model is None:
         raise NotFoundError(f"There is no activity level with level={level}.")
@@ -52,15 +214,33 @@ async def get_by_level(level: int, session: AsyncSession) -> ActivityLevel:
 async def get_all_levels(session: AsyncSession) -> list[ActivityLevel]:
     """Get all activity levels in the database.
 
+    Served from memory when the registry is loaded.
+
     Args:
         session (`AsyncSession`): an asynchronous database session
     """
+    if activity_level_registry.is_loaded:
+        return activity_level_registry.get_all()
     levels = await ActivityLevelCRUD.get_all(session=session)
     if levels is None:
         raise NotFoundError("There are no levels yet.")
     return models_validate(ActivityLevel, levels)
 
 
+async def get_all_levels_version(session: AsyncSession) -> ResourceVersion:
+    """Get the version of all activity levels, the levels are not loaded.
+
+    Served from memory when the registry is loaded.
+
+    Args:
+        session (`AsyncSession`): an asynchronous database session
+    """
+    if activity_level_registry.is_loaded:
+        return activity_level_registry.get_version()
+    count, last_updated_at = await ActivityLevelCRUD.get_version(session=session)
+    return ResourceVersion.from_parts(count, last_updated_at)
+
+
 async def update(level: int,
                  level_data: ActivityLevelUpdate,
                  session: AsyncSession):
@@ -83,6 +263,7 @@ async def update(level: int,
     except Exception as exc:
         await session.rollback()
         raise UnexpectedError(f"An error occurred:\n{str(exc)}") from exc
+    await activity_level_registry.reload()
 
 
 async def delete(level: int,
@@ -102,3 +283,4 @@ async def delete(level: int,
     except Exception as exc:
         await session.rollback()
         raise UnexpectedError(f"An error occurred:\n{str(exc)}") from exc
+    await activity_level_registry.reload()
@@ -0,0 +1,243 @@
+"""Service layer logic for plan generation jobs."""
+from datetime import datetime, timedelta
+from uuid import uuid4
+import asyncio
+import itertools
+import logging
+from redis.asyncio import Redis
+from api.config import config
+from api.database.redis import redis
+from api.exceptions import BaseCustomException, NotFoundError, QueueFullError
+from api.schemas.ai_request import UserAIRequest
+from api.schemas.plan_job import PlanJob, PlanJobStatus
+from api.schemas.training_plan import TrainingPlan
+from api.llm.scheduler import Priority
+from .training_plan import generate_plan, generate_plan_draft
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlanJobQueue:
+    """
+    Bounded queue of plan generation jobs with a pool of async workers.
+
+    Job states are kept in Redis, so any API worker can answer
+    about a job queued in another one. Without Redis they are kept
+    in memory, then the API must run in a single worker.
+    Finished jobs are dropped after `result_ttl_seconds`.
+
+    Plan drafts are queued with the lowest priority and
+    are not tracked as jobs, users' jobs always go first.
+    A draft is queued `draft_delay_seconds` after the last
+    request for it, so a series of profile changes makes one draft.
+    """
+
+    def __init__(self,
+                 workers: int,
+                 max_size: int,
+                 result_ttl_seconds: float,
+                 redis: Redis | None = None,
+                 draft_delay_seconds: float = 0):
+        self._workers_count = workers
+        self._redis = redis
+        # (priority, arrival order, job, request), drafts have no job
+        self._queue: asyncio.PriorityQueue[tuple[int, int, PlanJob | None, UserAIRequest]] = \
+            asyncio.PriorityQueue(maxsize=max_size)
+        self._order = itertools.count()
+        self._result_ttl = timedelta(seconds=result_ttl_seconds)
+        self._jobs: dict[str, PlanJob] = {}
+        self._workers: list[asyncio.Task] = []
+        # users with a draft in the queue
+        self._queued_drafts: set[int] = set()
+        self._draft_delay = draft_delay_seconds
+        # users with a draft waiting for the delay
+        self._draft_timers: dict[int, asyncio.TimerHandle] = {}
+
+    async def start(self):
+        """Start the workers.
+
+        Use on API **start up**.
+        """
+        self._workers = [asyncio.create_task(self._work())
+                         for _ in range(self._workers_count)]
+
+    async def stop(self):
+        """Stop the workers, unfinished jobs are lost.
+
+        Use on API **shutdown**.
+        """
+        for timer in self._draft_timers.values():
+            timer.cancel()
+        self._draft_timers.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, request: UserAIRequest) -> PlanJob:
+        """Put a new plan generation job in the queue.
+
+        Args:
+            request (`UserAIRequest`): data for making request
+        """
+        if self._queue.full():
+            raise QueueFullError(
+                "Too many plans are being generated, try again later.")
+        job = PlanJob(id=uuid4().hex, user_id=request.user_id)
+        # saved first, so the job can be polled as soon as it runs
+        await self._save(job)
+        try:
+            self._queue.put_nowait((Priority.BACKGROUND, next(self._order), job, request))
+        except asyncio.QueueFull:
+            # other jobs were submitted while saving
+            await self._delete(job.id)
+            raise QueueFullError(
+                "Too many plans are being generated, try again later.") from None
+        return job
+
+    def submit_draft(self, user_id: int):
+        """Queue a plan draft generation for the user after the delay.
+
+        A new request for the draft restarts the delay.
+
+        Args:
+            user_id (`int`)
+        """
+        timer = self._draft_timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._draft_timers[user_id] = asyncio.get_running_loop().call_later(
+            self._draft_delay, self._queue_draft, user_id)
+
+    def _queue_draft(self, user_id: int):
+        """Queue a plan draft generation for the user.
+
+        Drafts are skipped if the user's draft is queued
+        already or a bounded queue is half full.
+        """
+        self._draft_timers.pop(user_id, None)
+        if user_id in self._queued_drafts:
+            return
+        # maxsize 0 is an unbounded queue
+        if self._queue.maxsize and self._queue.qsize() >= self._queue.maxsize // 2:
+            return
+        self._queue.put_nowait((Priority.SPECULATIVE, next(self._order), None,
+                                UserAIRequest(user_id=user_id)))
+        self._queued_drafts.add(user_id)
+
+    async def add_done(self, request: UserAIRequest, plan: TrainingPlan) -> PlanJob:
+        """Add a job that is already done, e.g. the plan was ready.
+
+        Args:
+            request (`UserAIRequest`): data for making request
+            plan (`TrainingPlan`): the plan for the user
+        """
+        job = PlanJob(id=uuid4().hex,
+                      user_id=request.user_id,
+                      status=PlanJobStatus.DONE,
+                      finished_at=datetime.now(),
+                      plan=plan)
+        await self._save(job)
+        return job
+
+    async def get(self, job_id: str) -> PlanJob:
+        """Get the job by its ID.
+
+        Args:
+            job_id (`str`)
+        """
+        if self._redis is None:
+            self._drop_expired()
+            job = self._jobs.get(job_id)
+        else:
+            job_data = await self._redis.get(self._get_key(job_id))
+            job = PlanJob.model_validate_json(job_data) if job_data else None
+        if job is None:
+            raise NotFoundError(f"There is no plan job with such ID: {job_id}.")
+        return job
+
+    @staticmethod
+    def _get_key(job_id: str) -> str:
+        """Get Redis key of the job."""
+        return f"plan_job:{job_id}"
+
+    async def _save(self, job: PlanJob):
+        """Save the job state.
+
+        In Redis every state expires after result TTL, so jobs
+        of a stopped worker don't stay unfinished forever.
+        """
+        if self._redis is None:
+            self._drop_expired()
+            self._jobs[job.id] = job
+            return
+        await self._redis.set(self._get_key(job.id), job.model_dump_json(),
+                              px=max(1, int(self._result_ttl.total_seconds() * 1000)))
+
+    async def _delete(self, job_id: str):
+        """Forget the job."""
+        if self._redis is None:
+            self._jobs.pop(job_id, None)
+            return
+        await self._redis.delete(self._get_key(job_id))
+
+    def _drop_expired(self):
+        """Forget finished jobs that are older than result TTL."""
+        expire_before = datetime.now() - self._result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at and job.finished_at < expire_before]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _work(self):
+        """Process jobs from the queue one by one."""
+        while True:
+            _, _, job, request = await self._queue.get()
+            try:
+                if job is None:
+                    await self._make_draft(request.user_id)
+                else:
+                    await self._run_job(job, request)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: PlanJob, request: UserAIRequest):
+        """Generate the plan of the job."""
+        try:
+            job.status = PlanJobStatus.RUNNING
+            await self._save(job)
+            job.plan = await generate_plan(request)
+            job.status = PlanJobStatus.DONE
+        except BaseCustomException as exc:
+            job.error = exc.message
+            job.status = PlanJobStatus.FAILED
+        except Exception as exc:
+            logger.exception("Plan job %s failed", job.id)
+            job.error = f"An error occurred:\n{str(exc)}"
+            job.status = PlanJobStatus.FAILED
+        job.finished_at = datetime.now()
+        try:
+            await self._save(job)
+        except Exception:
+            # the job expires unfinished, pollers get 404
+            logger.exception("Couldn't save plan job %s", job.id)
+
+    async def _make_draft(self, user_id: int):
+        """Generate the plan draft, nobody waits for it, so errors are only logged."""
+        # a newer profile change can queue another draft from now on
+        self._queued_drafts.discard(user_id)
+        try:
+            await generate_plan_draft(user_id)
+        except BaseCustomException as exc:
+            logger.warning("Plan draft for user %i failed: %s", user_id, exc.message)
+        except Exception:
+            logger.exception("Plan draft for user %i failed", user_id)
+
+
+# import this to use the queue
+plan_job_queue = PlanJobQueue(workers=config.PLAN_JOB_WORKERS,
+                              max_size=config.PLAN_JOB_QUEUE_SIZE,
+                              result_ttl_seconds=config.PLAN_JOB_RESULT_TTL_SECONDS,
+                              redis=redis if config.PLAN_JOBS_USE_REDIS else None,
+                              draft_delay_seconds=config.PLAN_DRAFT_DELAY_SECONDS)
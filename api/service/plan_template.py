@@ -0,0 +1,234 @@
+"""Service layer logic for PlanTemplate."""
+from typing import Protocol
+from uuid import uuid4
+import asyncio
+import logging
+import re
+import numpy as np
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError as PydanticValidationError
+from api.config import config
+from api.exceptions import UnexpectedError, ValidationError
+from api.database.crud import PlanTemplateCRUD
+from api.database.database import session_maker
+from api.database.redis import redis
+from api.schemas.plan_template import PlanTemplate, PlanTemplateInput
+from api.schemas.utils import models_validate
+
+
+logger = logging.getLogger(__name__)
+
+# profile features: gender, age, BMI, activity level
+_PROFILE_FEATURES = 4
+# word beginnings of the goals, paraphrased goals get the same categories
+GOAL_CATEGORIES = {
+    'weight_loss': ('похуд', 'сброс', 'лишн', 'жир', 'стройн', 'сушк'),
+    'muscle_gain': ('масс', 'мышц', 'накач', 'рельеф', 'поправ'),
+    'endurance': ('вынослив', 'марафон', 'бег', 'пробеж', 'кардио', 'дистанц'),
+    'strength': ('сил', 'жим', 'тяг'),
+    'health': ('здоров', 'форм', 'тонус', 'спин', 'осанк', 'гибк', 'самочувств'),
+}
+_WORD = re.compile(r'\w+')
+
+
+def get_goal_categories(goal: str | None) -> frozenset[str] | None:
+    """Get the categories of the goal.
+
+    Returns an empty set for no goal and None for a goal
+    of no known category, such a profile has no templates.
+
+    Args:
+        goal (`str | None`): goal of the user or template
+    """
+    if not goal:
+        return frozenset()
+    words = _WORD.findall(goal.lower())
+    categories = frozenset(category for category, stems in GOAL_CATEGORIES.items()
+                           if any(word.startswith(stems) for word in words))
+    return categories or None
+
+
+class Profile(Protocol):
+    """Anything with the profile fields: a user or a template."""
+    gender: str
+    age: int
+    weight_kg: float
+    height_cm: float
+    activity_level: int | None
+    goal: str | None
+
+
+class PlanTemplateLibrary:
+    """
+    Ready plans matched to users by profile similarity.
+
+    Every profile is a normalized feature vector (gender, age,
+    BMI, activity level and goal categories), the nearest
+    template is found with one vectorized distance computation.
+    Profiles with other goal categories are never close.
+
+    With Redis, a template created in one API worker makes
+    other workers reload their libraries.
+    """
+    _CHANNEL = "plan_templates:changed"
+
+    def __init__(self,
+                 max_distance: float,
+                 redis: Redis | None = None,
+                 retry_delay_seconds: float = 5):
+        self._max_distance = max_distance
+        self._features = np.zeros((0, _PROFILE_FEATURES + len(GOAL_CATEGORIES)),
+                                  dtype=np.float32)
+        self._templates: list[PlanTemplate] = []
+        self._redis = redis
+        self._retry_delay = retry_delay_seconds
+        # messages of this worker are skipped
+        self._worker_id = uuid4().hex
+        self._listener: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def get_features(self, profile: Profile) -> np.ndarray:
+        """Get the normalized feature vector of the profile.
+
+        Args:
+            profile (`Profile`): user or template
+        """
+        bmi = profile.weight_kg / (profile.height_cm / 100) ** 2
+        features = np.array([
+            1.0 if profile.gender == 'male' else 0.0,
+            (profile.age - 16) / 60,
+            (bmi - 16) / 24,
+            (profile.activity_level if profile.activity_level is not None else 2.5) / 5
+        ], dtype=np.float32)
+        categories = get_goal_categories(profile.goal) or frozenset()
+        goal = np.array([category in categories for category in GOAL_CATEGORIES],
+                        dtype=np.float32)
+        return np.concatenate((features, goal))
+
+    def add(self, templates: list[PlanTemplate]):
+        """Add templates to the library.
+
+        Args:
+            templates (`list[PlanTemplate]`)
+        """
+        if not templates:
+            return
+        features = np.stack([self.get_features(template) for template in templates])
+        self._features = np.concatenate((self._features, features))
+        self._templates.extend(templates)
+
+    def match(self, profile: Profile) -> tuple[PlanTemplate, float] | None:
+        """Find the nearest template and the distance to it.
+
+        Args:
+            profile (`Profile`): user or template
+        """
+        if not self._templates:
+            return None
+        distances = np.linalg.norm(self._features - self.get_features(profile), axis=1)
+        index = int(np.argmin(distances))
+        return self._templates[index], float(distances[index])
+
+    def find(self, profile: Profile) -> PlanTemplate | None:
+        """Find a template that is close enough to the profile.
+
+        Args:
+            profile (`Profile`): user or template
+        """
+        if get_goal_categories(profile.goal) is None:
+            return None
+        match = self.match(profile)
+        if match is None or match[1] > self._max_distance:
+            return None
+        return match[0]
+
+    async def start(self):
+        """Load templates and listen for new ones in other workers.
+
+        Use on API **start up**.
+        """
+        await self.load()
+        if self._redis is not None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Stop listening for new templates.
+
+        Use on API **shutdown**.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def load(self):
+        """Load templates from the database.
+
+        The library is replaced at once, searches never see
+        a partly loaded library.
+        """
+        async with session_maker() as session:
+            templates = await PlanTemplateCRUD.get_all(session=session)
+        templates = models_validate(PlanTemplate, templates)
+        features = np.stack([self.get_features(template) for template in templates]) \
+            if templates else self._features[:0]
+        self._features, self._templates = features, templates
+        logger.info("%i plan templates are loaded", len(self._templates))
+
+    async def publish(self):
+        """Tell other workers that templates were changed."""
+        if self._redis is not None:
+            await self._redis.publish(self._CHANNEL, self._worker_id)
+
+    async def _listen(self):
+        """Reload templates when other workers change them."""
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._CHANNEL)
+                    # changes could be missed while not subscribed
+                    await self.load()
+                    async for message in pubsub.listen():
+                        if (message['type'] == 'message'
+                                and message['data'].decode() != self._worker_id):
+                            await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Plan template changes listener failed, restarting")
+                await asyncio.sleep(self._retry_delay)
+
+
+async def create(template_data: PlanTemplateInput, session: AsyncSession) -> PlanTemplate:
+    """Create a new plan template in the database and the libraries of all workers.
+
+    Args:
+        template_data (`PlanTemplateInput`): data for a new template
+        session (`AsyncSession`): an asynchronous database session
+    """
+    try:
+        template = await PlanTemplateCRUD.create(template_data, session=session)
+        await session.commit()
+        template = PlanTemplate.model_validate(template)
+    except PydanticValidationError as exc:
+        await session.rollback()
+        raise ValidationError(f"Validation error:\n{str(exc)}") from exc
+    except Exception as exc:
+        await session.rollback()
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+    plan_template_library.add([template])
+    try:
+        await plan_template_library.publish()
+    except Exception:
+        # the template is created, other workers load it on restart
+        logger.exception("Couldn't tell other workers about the new template")
+    return template
+
+
+# import this to use the templates
+plan_template_library = PlanTemplateLibrary(
+    max_distance=config.PLAN_TEMPLATE_MAX_DISTANCE,
+    redis=redis if config.PLAN_TEMPLATES_SYNC_USE_REDIS else None)
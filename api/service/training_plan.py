@@ -1,18 +1,65 @@
 """Service layer logic for TrainingPlan."""
+import logging
+import re
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from pydantic import ValidationError as PydanticValidationError
-from api.exceptions import NotFoundError, UnexpectedError, ValidationError, AIRequestError
-from api.database.crud import TrainingPlanCRUD
-from api.schemas.training_plan import TrainingPlan, TrainingPlanInput, TrainingPlanUpdate
+from api.exceptions import BaseCustomException, NotFoundError, UnexpectedError, \
+    ValidationError, AIRequestError
+from api.database.crud import TrainingPlanCRUD, TrainingPlanDayCRUD, TrainingPlanDraftCRUD
+from api.database.database import session_maker
+from api.schemas.training_plan import GeneratedTrainingPlan, TrainingPlan, TrainingPlanDay, \
+    TrainingPlanDraft, TrainingPlanDraftInput, TrainingPlanInput, TrainingPlanUpdate, WEEKDAYS, \
+    split_plan_description
 from api.schemas.ai_request import UserAIRequest
+from api.schemas.user import User
+from api.schemas.plan_template import PlanTemplate, PlanTemplateInput
+from api.schemas.version import ResourceVersion
 from api.llm.ai_client import AIClient
+from api.llm.scheduler import Priority
+from api.config import config
 from .user import get_by_id as get_user_by_id
+from .plan_template import create as create_template, get_goal_categories, \
+    plan_template_library
+
+
+logger = logging.getLogger(__name__)
+
+
+# every form of the day names ("в пятницу"), stems match other words ("среднее")
+_MASCULINE_ENDINGS = ('', 'а', 'у', 'ом', 'е', 'и', 'ов', 'ам', 'ами', 'ах')
+_FEMININE_ENDINGS = ('а', 'ы', 'е', 'у', 'ой', 'ою', '', 'ам', 'ами', 'ах')
+_WEEKDAY_FORMS = tuple(frozenset(stem + ending for ending in endings) for stem, endings in (
+    ('понедельник', _MASCULINE_ENDINGS),
+    ('вторник', _MASCULINE_ENDINGS),
+    ('сред', _FEMININE_ENDINGS),
+    ('четверг', _MASCULINE_ENDINGS),
+    ('пятниц', ('а', 'ы', 'е', 'у', 'ей', 'ею', '', 'ам', 'ами', 'ах')),
+    ('суббот', _FEMININE_ENDINGS),
+    ('воскресен', ('ье', 'ья', 'ью', 'ьем', 'ьи', 'ий', 'ьям', 'ьями', 'ьях')),
+))
+# words that mean the whole plan must be rewritten
+_WHOLE_PLAN_WORDS = frozenset((
+    'вся', 'всю', 'весь', 'все', 'всё', 'всей', 'всем', 'всеми', 'всех',
+    'каждый', 'каждая', 'каждое', 'каждую', 'каждого', 'каждой', 'каждом', 'каждому',
+    'каждые', 'каждых',
+    'неделя', 'недели', 'неделе', 'неделю', 'неделей', 'недель', 'неделям', 'неделями',
+    'неделях',
+    # "все, кроме пятницы"
+    'кроме', 'остальные', 'остальных', 'остальным', 'остальными',
+))
+# endings of russian words, the longest are cut first
+_ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'иями',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ую', 'юю', 'ов', 'ев', 'ью', 'ия', 'ию', 'ии',
+    'а', 'я', 'ы', 'и', 'е', 'о', 'у', 'ю', 'й', 'ь',
+), key=len, reverse=True)
 
 
 async def create(user_id: int,
                  plan_data: TrainingPlanInput,
-                 session: AsyncSession):
+                 session: AsyncSession) -> TrainingPlan:
     """Create a new training plan for the user in the database.
 
     Args:
@@ -21,10 +68,11 @@ async def create(user_id: int,
         session (`AsyncSession`): an asynchronous database session
     """
     try:
-        await TrainingPlanCRUD.create_for_user(user_id,
-                                               plan_data,
-                                               session=session)
+        plan = await TrainingPlanCRUD.create_for_user(user_id,
+                                                      plan_data,
+                                                      session=session)
         await session.commit()
+        return TrainingPlan.model_validate(plan)
     except IntegrityError as exc:
         await session.rollback()
         error_message = str(exc).lower()
@@ -46,6 +94,7 @@ async def update_user_plan(user_id: int,
     """Update the training plan for the user in the database.
 
     Yoy can change plan's content, but not the user who owns the plan.
+    The plan is not loaded, use `get_user_plan` to get it.
 
     Args:
         user_id (`int`)
@@ -66,34 +115,279 @@ async def update_user_plan(user_id: int,
         raise UnexpectedError(f"An error occurred:\n{str(exc)}") from exc
 
 
-async def generate_plan(request: UserAIRequest, session: AsyncSession):
+async def upsert_user_plan(user_id: int,
+                           plan_data: TrainingPlanInput,
+                           session: AsyncSession) -> TrainingPlan:
+    """Create the training plan for the user or replace the existing one.
+
+    The plan and its days are written with one statement,
+    days that are not in the new plan are deleted.
+
+    Args:
+        user_id (`int`)
+        plan_data (`TrainingPlanInput`): data for the training plan
+        session (`AsyncSession`): an asynchronous database session
+    """
+    try:
+        plan_row = await TrainingPlanCRUD.upsert_for_user(user_id, plan_data, session=session)
+        await session.commit()
+    except IntegrityError as exc:
+        await session.rollback()
+        error_message = str(exc).lower()
+        if 'foreign key' in error_message:
+            raise NotFoundError(
+                f"There is no user with such ID: {user_id}") from exc
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+    except Exception as exc:
+        await session.rollback()
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+
+    # the statement returns only the plan, days are the ones written
+    days = [day.model_dump() for day in plan_data.days or []]
+    return TrainingPlan.model_validate({**plan_row, 'days': days})
+
+
+def _get_stem(word: str) -> str:
+    """
+    Get a rough stem of a russian word: cut the ending,
+    keep at least 3 letters. Forms of a word get one stem
+    ("ноги", "ногам", "ногами" - "ног").
+    """
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def _find_changed_days(user_request: str | None, plan: TrainingPlan | None) -> list[int]:
+    """Find the days of the plan that the request is about.
+
+    A day is changed when the request mentions it (e.g. "в пятницу")
+    or a word of its title that other days don't have (e.g. "ноги").
+    Returns an empty list when the whole plan must be regenerated,
+    also when it's not clear which days the request is about.
+
+    Args:
+        user_request (`str | None`): user's wishes for the plan
+        plan (`TrainingPlan | None`): current user's plan
+    """
+    if (not config.PLAN_INCREMENTAL_MAX_DAYS or not user_request
+            or plan is None or len(plan.days) != len(WEEKDAYS)):
+        return []
+    words = set(re.findall(r"\w+", user_request.lower()))
+    if words & _WHOLE_PLAN_WORDS:
+        return []
+
+    changed = {weekday for weekday, forms in enumerate(_WEEKDAY_FORMS) if words & forms}
+    named_days = bool(changed)
+
+    request_stems = {_get_stem(word) for word in words if len(word) >= 3}
+    title_stems = {day.weekday: {_get_stem(word)
+                                 for word in re.findall(r"\w+", day.title.lower())
+                                 if len(word) >= 3}
+                   for day in plan.days}
+    for weekday, stems in title_stems.items():
+        for stem in stems & request_stems:
+            # common words (e.g. "тренировка") don't point to a day
+            if sum(stem in other for other in title_stems.values()) <= 2:
+                changed.add(weekday)
+            elif not named_days:
+                # the request can be about any of these days
+                return []
+
+    if len(changed) > config.PLAN_INCREMENTAL_MAX_DAYS:
+        return []
+    return sorted(changed)
+
+
+async def _generate_plan_days(user: User,
+                              request: UserAIRequest,
+                              weekdays: list[int]) -> GeneratedTrainingPlan:
+    """Rewrite only some days of the plan and merge them into the rest."""
+    new_days = await AIClient.generate_user_plan_days(user, request.content, weekdays)
+    days = {day.weekday: day for day in user.training_plan.days}
+    days.update((day.weekday, day) for day in new_days)
+    return GeneratedTrainingPlan(days=list(days.values()))
+
+
+async def _save_plan(user: User,
+                     generated_plan: GeneratedTrainingPlan,
+                     advice: str | None = None) -> TrainingPlan:
+    """Create or update user's plan with the generated one.
+
+    The draft is dropped, it's not needed after the plan is made.
+    """
+    plan = TrainingPlanInput(plan_description=generated_plan.get_description(advice),
+                             days=generated_plan.days)
+    async with session_maker() as session:
+        # committed together with the plan
+        await TrainingPlanDraftCRUD.delete_by_user_id(user.id, session=session)
+        return await upsert_user_plan(user.id, plan, session=session)
+
+
+def _find_template(user: User, request: UserAIRequest) -> PlanTemplate | None:
+    """Find a ready plan for the user, only plans without wishes can use it."""
+    if not config.PLAN_TEMPLATES_ENABLED or request.content:
+        return None
+    return plan_template_library.find(user)
+
+
+def _is_personal(user: User, generated_plan: GeneratedTrainingPlan) -> bool:
+    """
+    Check if the plan can have user's personal data.
+    The prompt has user's goal, previous plan and name. Plans for
+    a goal of known categories are shared with the same goals,
+    other goals and previous plans are personal.
+    """
+    if user.training_plan is not None or get_goal_categories(user.goal) is None:
+        return True
+    name = (user.username or '').lower()
+    return bool(name) and any(name in f"{day.title} {day.description}".lower()
+                              for day in generated_plan.days)
+
+
+async def _add_template(user: User, generated_plan: GeneratedTrainingPlan):
+    """
+    Keep the plan as a template for similar users.
+
+    Personal plans are not kept, and the number of templates is limited.
+    A profile that has a close template already doesn't add another one.
+    """
+    if (_is_personal(user, generated_plan)
+            or len(plan_template_library) >= config.PLAN_TEMPLATES_MAX_COUNT
+            or plan_template_library.find(user) is not None):
+        return
+    try:
+        template = PlanTemplateInput(gender=user.gender,
+                                     age=user.age,
+                                     weight_kg=user.weight_kg,
+                                     height_cm=user.height_cm,
+                                     activity_level=user.activity_level,
+                                     goal=user.goal,
+                                     days=generated_plan.days)
+        async with session_maker() as session:
+            await create_template(template, session=session)
+    except (BaseCustomException, PydanticValidationError):
+        # the plan is saved anyway
+        logger.exception("Couldn't save the plan template")
+
+
+async def _get_draft(user: User,
+                     request: UserAIRequest,
+                     session: AsyncSession) -> GeneratedTrainingPlan | None:
+    """Get the plan generated in advance for the current user's profile.
+
+    Only plans without wishes can use it.
+    """
+    if not config.PLAN_PREGENERATE or request.content:
+        return None
+    draft = await TrainingPlanDraftCRUD.get_by_user_id(user.id, session=session)
+    if draft is None or draft.profile_updated_at != user.updated_at:
+        return None
+    return GeneratedTrainingPlan(days=TrainingPlanDraft.model_validate(draft).days)
+
+
+async def get_ready_plan(request: UserAIRequest) -> TrainingPlan | None:
+    """Give the user a plan without waiting for AI.
+
+    The plan is a draft generated in advance or a template.
+    Returns None if there is none for the user or the template
+    must be personalized with AI.
+
+    Args:
+        request (`UserAIRequest`): data for making request
+    """
+    if request.content or not (config.PLAN_PREGENERATE or config.PLAN_TEMPLATES_ENABLED):
+        return None
+    async with session_maker() as session:
+        user = await get_user_by_id(request.user_id, session)
+        generated_plan = await _get_draft(user, request, session)
+    if generated_plan is None and not config.PLAN_TEMPLATE_PERSONALIZE:
+        template = _find_template(user, request)
+        if template is not None:
+            generated_plan = GeneratedTrainingPlan(days=template.days)
+    if generated_plan is None:
+        return None
+    return await _save_plan(user, generated_plan)
+
+
+async def generate_plan_draft(user_id: int):
+    """Generate a plan for the user in advance.
+
+    The draft is generated with the lowest priority and is
+    used when the user asks for a plan without wishes.
+    Users with a template don't need a draft.
+
+    Args:
+        user_id (`int`)
+    """
+    request = UserAIRequest(user_id=user_id)
+    async with session_maker() as session:
+        user = await get_user_by_id(user_id, session)
+        if await _get_draft(user, request, session) is not None:
+            return
+    if _find_template(user, request) is not None:
+        return
+    generated_plan = await AIClient.generate_user_plan(user, None, priority=Priority.SPECULATIVE)
+    draft = TrainingPlanDraftInput(profile_updated_at=user.updated_at,
+                                   days=generated_plan.days)
+    async with session_maker() as session:
+        try:
+            await TrainingPlanDraftCRUD.save_for_user(user_id, draft, session=session)
+            await session.commit()
+        except IntegrityError:
+            # the user was deleted or another draft was saved
+            await session.rollback()
+
+
+async def generate_plan(request: UserAIRequest) -> TrainingPlan:
     """Generate TrainingPlan using AI.
 
     You can generate a new plan or update an existing one.
 
+    Reading the user and writing the plan use separate short-lived
+    sessions, so no database connection is held while AI generates.
+
+    The plan is stored day by day and as the whole text.
+    If the request is about a few days of the existing plan,
+    only these days are regenerated. A plan without wishes
+    is taken from the draft generated in advance or the templates
+    for similar users if there is one, otherwise the generated plan
+    becomes a new template.
+
     Args:
         request (`UserAIRequest`): data for making request
-        session (`AsyncSession`): an asynchronous database session
     """
+    advice = None
+    new_template = False
     try:
-        user = await get_user_by_id(request.user_id, session)
-        plan_description = await AIClient.generate_user_plan(user, request.content)
+        async with session_maker() as session:
+            user = await get_user_by_id(request.user_id, session)
+            draft = await _get_draft(user, request, session)
+        template = _find_template(user, request)
+        weekdays = _find_changed_days(request.content, user.training_plan)
+        if draft is not None:
+            generated_plan = draft
+        elif template is not None:
+            generated_plan = GeneratedTrainingPlan(days=template.days)
+            if config.PLAN_TEMPLATE_PERSONALIZE:
+                advice = await AIClient.generate_plan_advice(user, template.days)
+        elif weekdays:
+            generated_plan = await _generate_plan_days(user, request, weekdays)
+        else:
+            generated_plan = await AIClient.generate_user_plan(user, request.content)
+            new_template = config.PLAN_TEMPLATES_ENABLED and not request.content
     except NotFoundError:
-        await session.rollback()
         raise
     except AIRequestError:
-        await session.rollback()
         raise
     except Exception as exc:
-        await session.rollback()
         raise UnexpectedError(f"An error occurred:\n{str(exc)}") from exc
-    else:
-        if user.training_plan:
-            plan = TrainingPlanUpdate(plan_description=plan_description)
-            await update_user_plan(user.id, plan, session=session)
-        else:
-            plan = TrainingPlanInput(plan_description=plan_description)
-            await create(request.user_id, plan, session=session)
+
+    plan = await _save_plan(user, generated_plan, advice)
+    if new_template:
+        await _add_template(user, generated_plan)
+    return plan
 
 
 async def get_user_plan(user_id: int, session: AsyncSession) -> TrainingPlan:
@@ -111,6 +405,47 @@ async def get_user_plan(user_id: int, session: AsyncSession) -> TrainingPlan:
     return plan
 
 
+async def get_user_plan_version(user_id: int,
+                                session: AsyncSession) -> ResourceVersion | None:
+    """Get the version of the user's training plan, None if there is no plan.
+
+    The plan is not loaded, use it to answer conditional requests.
+
+    Args:
+        user_id (`int`)
+        session (`AsyncSession`): an asynchronous database session
+    """
+    parts = await TrainingPlanCRUD.get_version_by_user_id(user_id, session=session)
+    if parts is None:
+        return None
+    return ResourceVersion.from_parts(*parts)
+
+
+async def get_user_plan_day(user_id: int,
+                            weekday: int,
+                            session: AsyncSession) -> TrainingPlanDay:
+    """Get one day of the training plan for the user in the database.
+
+    Args:
+        user_id (`int`)
+        weekday (`int`): day of the week, 0 is Monday
+        session (`AsyncSession`): an asynchronous database session
+    """
+    day = await TrainingPlanDayCRUD.get_by_user_id(user_id, weekday, session=session)
+    if day is not None:
+        return TrainingPlanDay.model_validate(day)
+
+    # plans saved before days were stored or without days
+    # have the day only in the text
+    plan = await TrainingPlanCRUD.get_by_user_id(user_id, session=session)
+    lines = split_plan_description(plan.plan_description).get(weekday) if plan else None
+    if not lines:
+        raise NotFoundError(
+            f'There is no {WEEKDAYS[weekday]} in the training plan '
+            f'for user with this ID: {user_id}')
+    return TrainingPlanDay(weekday=weekday, title=lines[0], description="\n".join(lines[1:]))
+
+
 async def delete(user_id: int, session: AsyncSession) -> None:
     """Delete the training plan for the user in the database.
 
@@ -1,15 +1,19 @@
 """Service layer logic for User."""
+from typing import AsyncIterator
 from pydantic import ValidationError as PydanticValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from api.database.crud import ActivityLevelCRUD, UserCRUD
-from api.schemas.user import User, UserInput, UserUpdate
+from api.database.crud import UserCRUD
+from api.database.database import session_maker
+from api.schemas.user import User, UserInput, UserUpdate, UserUpsert
 from api.schemas.utils import models_validate
+from api.schemas.version import ResourceVersion
 from api.schemas.ai_request import UserAIRequest
-from api.schemas.activity_level import ActivityLevel
 from api.exceptions import AlreadyExistError, NotFoundError, ValidationError, \
     UnexpectedError
 from api.llm.ai_client import AIClient
+from api.llm.prompt import USER_DATA_FIELDS
+from .activity_level import activity_level_registry
 
 
 async def create(user_data: UserInput, session: AsyncSession):
@@ -40,50 +44,159 @@ async def create(user_data: UserInput, session: AsyncSession):
         raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
 
 
-async def set_activity_level(user: User, session: AsyncSession):
-    """Set activity level for user."""
-    if user.activity_level:
-        activity_level = await ActivityLevelCRUD.get_by_id(user.activity_level, session)
-        if activity_level:
-            user.activity_level_info = ActivityLevel.model_validate(
-                activity_level)
+async def create_many(users_data: list[UserInput], session: AsyncSession) -> int:
+    """Create many users in the database at once.
 
+    It's one executemany in one transaction: if a user can't
+    be created, none are. Returns the number of created users.
 
-async def get_all(session: AsyncSession) -> list[User]:
-    """Get all users in the database.
+    Args:
+        users_data (`list[UserInput]`): data for new users
+        session (`AsyncSession`): an asynchronous database session
+    """
+    try:
+        count = await UserCRUD.create_many(users_data, session=session)
+        await session.commit()
+        return count
+    except IntegrityError as exc:
+        await session.rollback()
+        error_message = str(exc).lower()
+        if 'foreign key' in error_message:
+            raise NotFoundError("No such activity level for some of the users") from exc
+        if 'unique' in error_message:
+            raise AlreadyExistError(
+                "Some of the users already exist or are repeated") from exc
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+    except Exception as exc:
+        await session.rollback()
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+
+
+async def upsert(user_id: int,
+                 user_data: UserUpsert,
+                 session: AsyncSession) -> tuple[User, bool]:
+    """Create the user or replace their data in the database.
+
+    One statement, the user is not read before writing.
+    The training plan is not loaded (`training_plan` is None).
+    Returns the user and if they are new or their data is changed.
+
+    Args:
+        user_id (`int`)
+        user_data (`UserUpsert`): data for the user
+        session (`AsyncSession`): an asynchronous database session
+    """
+    try:
+        user_row = await UserCRUD.upsert(user_id, user_data, session=session)
+        await session.commit()
+    except IntegrityError as exc:
+        await session.rollback()
+        error_message = str(exc).lower()
+        if 'foreign key' in error_message:
+            raise NotFoundError(
+                f"No such activity level: {user_data.activity_level}") from exc
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+    except Exception as exc:
+        await session.rollback()
+        raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
+
+    user = User.model_validate(dict(user_row))
+    if user.activity_level is not None and activity_level_registry.is_loaded:
+        user.activity_level_info = activity_level_registry.get(user.activity_level)
+    return user, user_row['changed']
+
+
+async def get_all(session: AsyncSession,
+                  after_id: int | None = None,
+                  limit: int | None = None) -> list[User]:
+    """Get a page of users in the database ordered by ID.
 
     Args:
         session (`AsyncSession`): an asynchronous database session
+        after_id (`int | None`): get users with greater ID only
+        limit (`int | None`): maximum number of users, all if not set
     """
-    users = await UserCRUD.get_all(session=session)
+    users = await UserCRUD.get_all(session=session, after_id=after_id, limit=limit)
 
     if users is None:
         raise NotFoundError('There are no users.')
 
-    users = models_validate(User, users)
+    # activity levels and plans are loaded with users,
+    # so validation makes no more queries
+    return models_validate(User, users)
 
-    for user in users:
-        await set_activity_level(user, session=session)
 
-    return users
+async def stream_all(after_id: int | None = None) -> AsyncIterator[User]:
+    """Yield all users in the database ordered by ID.
 
+    Memory usage doesn't depend on the number of users.
+    The session is open while users are streamed, so it's
+    created here and not taken from the endpoint.
 
-async def get_by_id(user_id: int, session: AsyncSession) -> User:
+    Args:
+        after_id (`int | None`): get users with greater ID only
+    """
+    async with session_maker() as session:
+        async for user in UserCRUD.stream_all(session=session, after_id=after_id):
+            yield User.model_validate(user)
+
+
+async def export_csv() -> AsyncIterator[bytes]:
+    """Yield all users in the database as CSV ordered by ID.
+
+    Rows are copied by the database (COPY), the session
+    is open while they're streamed, so it's created here.
+    """
+    async with session_maker() as session:
+        async for chunk in UserCRUD.copy_to_csv(session=session):
+            yield chunk
+
+
+async def get_version(user_id: int,
+                      session: AsyncSession,
+                      profile: str = 'full') -> ResourceVersion | None:
+    """Get the version of the user, None if there is no such user.
+
+    The user is not loaded, use it to answer conditional requests.
+
+    Args:
+        user_id (`int`)
+        session (`AsyncSession`): an asynchronous database session
+        profile (`str`): 'summary' or 'full', as in `get_by_id`
+    """
+    parts = await UserCRUD.get_version(user_id, session=session,
+                                       with_plan=profile == 'full')
+    if parts is None:
+        return None
+    return ResourceVersion.from_parts(user_id, profile, *parts)
+
+
+async def get_by_id(user_id: int,
+                    session: AsyncSession,
+                    profile: str = 'full') -> User:
     """Get the user by their ID in the database.
 
     Args:
         user_id (`int`)
         session (`AsyncSession`): an asynchronous database session
+        profile (`str`): 'full' - with the training plan,
+        'summary' - without it (`training_plan` is None)
     """
-    user = await UserCRUD.get_by_id(user_id, session=session)
+    user = await UserCRUD.get_by_id(user_id, session=session, profile=profile)
 
     if user is None:
         raise NotFoundError(f"There is no user with such ID: {user_id}.")
 
-    user = User.model_validate(user)
-    await set_activity_level(user, session=session)
+    return User.model_validate(user)
+
+
+def changes_prompt_data(user_data: UserUpdate) -> bool:
+    """Check if the update changes user's data that AI prompts use.
 
-    return user
+    Args:
+        user_data (`UserUpdate`): new data for the user
+    """
+    return bool(user_data.model_fields_set & USER_DATA_FIELDS)
 
 
 async def update(user_id: int,
@@ -129,15 +242,33 @@ async def delete(user_id: int,
         raise UnexpectedError(f"An error occurred:\n{str(exc)}.") from exc
 
 
-async def get_ai_answer(request: UserAIRequest,
-                        session: AsyncSession) -> str:
+async def get_ai_answer(request: UserAIRequest) -> str:
     """Answer user's request/answer with AI.
 
+    The session is closed before AI is called, so no database
+    connection is held while AI generates.
+
     Args:
-        user_id (`int`)
-        user_request (`str`): user's message to AI
-        session (`AsyncSession`): an asynchronous database session
+        request (`UserAIRequest`): data for making request
     """
-    user = await get_by_id(request.user_id, session)
+    async with session_maker() as session:
+        # chat prompts don't use the plan
+        user = await get_by_id(request.user_id, session, profile='summary')
     response = await AIClient.generate_user_response(user, request.content)
     return response
+
+
+async def stream_ai_answer(request: UserAIRequest) -> AsyncIterator[str]:
+    """Answer user's request/answer with AI, streaming the answer.
+
+    The user is loaded before streaming starts, so
+    a missing user is reported as a regular error.
+    The session is closed before AI is called.
+
+    Args:
+        request (`UserAIRequest`): data for making request
+    """
+    async with session_maker() as session:
+        # chat prompts don't use the plan
+        user = await get_by_id(request.user_id, session, profile='summary')
+    return AIClient.stream_user_response(user, request.content)
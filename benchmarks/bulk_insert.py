@@ -0,0 +1,87 @@
+"""
+Benchmark of user inserts: rows per second of BaseCRUD.create and create_many.
+
+Uses the test database like the tests do: TEST_DB_NAME
+(default `ai_coach_test`), it's migrated and the users table is emptied.
+
+Run from the repository root:
+    python -m benchmarks.bulk_insert
+"""
+import os
+
+os.environ['DB_NAME'] = os.environ.get('TEST_DB_NAME', 'ai_coach_test')
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import text
+from api.database.crud import UserCRUD
+from api.database.database import engine, session_maker
+from api.schemas.user import UserInput
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / 'api' / 'alembic.ini'
+
+
+def make_users(count: int) -> list[UserInput]:
+    return [UserInput(id=user_id, username=f'user{user_id}', age=30, weight_kg=80,
+                      height_cm=180, gender='male', goal='Похудеть')
+            for user_id in range(1, count + 1)]
+
+
+async def empty_users():
+    async with session_maker() as session:
+        await session.execute(text('TRUNCATE users CASCADE'))
+        await session.commit()
+
+
+async def create_one_per_transaction(users: list[UserInput]):
+    """Like `/user/create` called for every user."""
+    for user in users:
+        async with session_maker() as session:
+            await UserCRUD.create(user, session=session)
+            await session.commit()
+
+
+async def create_in_one_transaction(users: list[UserInput]):
+    """BaseCRUD.create for every user, one commit."""
+    async with session_maker() as session:
+        for user in users:
+            await UserCRUD.create(user, session=session)
+        await session.commit()
+
+
+async def create_many(users: list[UserInput]):
+    """Like `/user/bulk`: one executemany, one commit."""
+    async with session_maker() as session:
+        await UserCRUD.create_many(users, session=session)
+        await session.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    await asyncio.to_thread(command.upgrade, AlembicConfig(str(ALEMBIC_INI)), 'head')
+    users = make_users(args.rows)
+    try:
+        for name, create in (("BaseCRUD.create, a transaction per row", create_one_per_transaction),
+                             ("BaseCRUD.create, one transaction", create_in_one_transaction),
+                             ("create_many", create_many)):
+            await empty_users()
+            started = time.perf_counter()
+            await create(users)
+            seconds = time.perf_counter() - started
+            print(f"{name}: {args.rows} rows in {seconds:.2f} s, "
+                  f"{args.rows / seconds:,.0f} rows/s")
+    finally:
+        await empty_users()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
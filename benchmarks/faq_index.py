@@ -0,0 +1,138 @@
+"""
+Offline benchmark of the FAQ index: hit rate and search latency.
+
+Fills the index with 100k synthetic question-answer pairs
+of 1000 users and asks paraphrased stored questions and new ones.
+Personal search looks only through the user's own pairs (answers
+sent as they are), shared search through all pairs (hints for the model).
+
+Run from the repository root:
+    python -m benchmarks.faq_index
+"""
+import argparse
+import itertools
+import random
+import time
+import numpy as np
+from api.llm.retrieval import FAQIndex, HashedNgramEmbedder
+
+
+EXERCISES = [
+    "приседания", "становая тяга", "жим лежа", "подтягивания", "отжимания", "выпады",
+    "планка", "бег", "скакалка", "жим гантелей", "тяга штанги в наклоне", "махи гирей",
+    "берпи", "скручивания", "гиперэкстензия", "жим ногами", "разгибания ног",
+    "сгибания ног", "подъем на носки", "армейский жим", "отжимания на брусьях",
+    "подъем штанги на бицепс", "французский жим", "тяга верхнего блока",
+    "тяга нижнего блока", "ягодичный мост", "болгарские сплит-приседания",
+    "велотренажер", "гребной тренажер", "плавание", "ходьба в гору", "растяжка",
+    "йога", "пилатес", "кроссфит", "фронтальные приседания", "румынская тяга",
+    "шраги", "разводка гантелей", "пуловер",
+]
+TEMPLATES = [
+    "Как правильно делать {}?",
+    "Сколько подходов нужно на {}?",
+    "Можно ли делать {} каждый день?",
+    "Какие мышцы работают, когда делаешь {}?",
+    "Чем заменить {} дома?",
+    "Болит спина после того как делаю {}, что делать?",
+    "Нужна ли разминка перед тем как делать {}?",
+    "Как увеличить рабочий вес, если делаю {}?",
+    "Помогает ли {} похудеть?",
+    "Сколько отдыхать между подходами, когда делаешь {}?",
+    "Как дышать, когда делаешь {}?",
+    "Можно ли делать {} при болях в коленях?",
+    "Сколько раз в неделю делать {}?",
+    "Какую обувь лучше надеть, если делаю {}?",
+    "Что лучше делать утром: {} или кардио?",
+    "С какого веса начинать, если раньше не делал {}?",
+    "Почему не растут результаты, хотя делаю {}?",
+    "Как часто менять программу, в которой есть {}?",
+    "Можно ли делать {} после еды?",
+    "Что есть перед тем как делать {}?",
+]
+FILLERS = ["подскажи", "скажи пожалуйста", "вопрос", "слушай", "привет"]
+
+
+def paraphrase(question: str, rng: random.Random) -> str:
+    """Change the question the way a user would ask it again."""
+    words = question.rstrip("?").split()
+    if rng.random() < 0.5:
+        words.insert(0, rng.choice(FILLERS) + ",")
+    if rng.random() < 0.5:
+        # a typo: two neighbouring letters are swapped
+        index = rng.randrange(len(words))
+        word = words[index]
+        if len(word) > 3:
+            position = rng.randrange(len(word) - 1)
+            words[index] = (word[:position] + word[position + 1]
+                            + word[position] + word[position + 2:])
+    text = " ".join(words)
+    return text.lower() if rng.random() < 0.5 else text + "?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pairs", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    questions = [template.format(exercise)
+                 for template, exercise in itertools.product(TEMPLATES, EXERCISES)]
+    per_user = args.pairs // args.users
+    index = FAQIndex(HashedNgramEmbedder(args.dimensions), capacity=args.pairs)
+    asked: dict[int, list[int]] = {}
+    started = time.perf_counter()
+    for user in range(args.users):
+        asked[user] = rng.sample(range(len(questions)), per_user)
+        for question_id in asked[user]:
+            index.add(user, questions[question_id], f"ответ {question_id}")
+    fill_seconds = time.perf_counter() - started
+
+    def run(queries: list[tuple[int, str, int]],
+            personal: bool) -> tuple[float, float, list[float]]:
+        """Returns hit rate, rate of hits with the right answer and latencies."""
+        hits = right = 0
+        latencies = []
+        for user, text, question_id in queries:
+            started = time.perf_counter()
+            matches = index.search(text, owner=user if personal else None)
+            latencies.append(time.perf_counter() - started)
+            if matches and matches[0].score >= args.threshold:
+                hits += 1
+                right += matches[0].answer == f"ответ {question_id}"
+        return hits / len(queries), right / len(queries), latencies
+
+    repeated = []
+    new = []
+    for _ in range(args.queries):
+        user = rng.randrange(args.users)
+        question_id = rng.choice(asked[user])
+        repeated.append((user, paraphrase(questions[question_id], rng), question_id))
+        not_asked = rng.choice([question for question in range(len(questions))
+                                if question not in asked[user]])
+        new.append((user, paraphrase(questions[not_asked], rng), not_asked))
+
+    hit_rate, right_rate, latencies = run(repeated, personal=True)
+    false_hit_rate, _, new_latencies = run(new, personal=True)
+    shared_hit_rate, shared_right_rate, shared_latencies = run(new, personal=False)
+    latencies_ms = np.array(latencies + new_latencies) * 1000
+    shared_latencies_ms = np.array(shared_latencies) * 1000
+
+    print(f"pairs: {len(index)}, users: {args.users}, "
+          f"filled in {fill_seconds:.1f} s")
+    print(f"personal, asked again: hit rate {hit_rate:.1%}, right answer {right_rate:.1%}")
+    print(f"personal, new questions: false hit rate {false_hit_rate:.1%}")
+    print(f"personal search latency: p50 {np.percentile(latencies_ms, 50):.3f} ms, "
+          f"p95 {np.percentile(latencies_ms, 95):.3f} ms")
+    print(f"shared, new questions of the user: hit rate {shared_hit_rate:.1%}, "
+          f"right answer {shared_right_rate:.1%}")
+    print(f"shared search latency: p50 {np.percentile(shared_latencies_ms, 50):.3f} ms, "
+          f"p95 {np.percentile(shared_latencies_ms, 95):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
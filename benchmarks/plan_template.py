@@ -0,0 +1,65 @@
+"""
+Benchmark of plan template matching latency.
+
+Fills the library with synthetic templates (10k by default)
+and matches random profiles against it.
+
+Run from the repository root:
+    python -m benchmarks.plan_template
+"""
+import argparse
+import random
+import time
+import numpy as np
+from api.schemas.plan_template import PlanTemplate
+from api.schemas.training_plan import TrainingPlanDayInput
+from api.service.plan_template import PlanTemplateLibrary
+
+
+GOALS = [None, "похудеть", "набрать массу", "стать выносливее", "подготовиться к марафону",
+         "укрепить спину", "поддерживать форму"]
+DAYS = [TrainingPlanDayInput(weekday=weekday, title="Тренировка", description="Приседания")
+        for weekday in range(7)]
+
+
+def make_profile(rng: random.Random, profile_id: int) -> PlanTemplate:
+    """Make a random profile, templates and users are matched by the same fields."""
+    return PlanTemplate.model_construct(id=profile_id,
+                                        gender=rng.choice(["male", "female"]),
+                                        age=rng.randint(16, 70),
+                                        weight_kg=rng.uniform(45, 130),
+                                        height_cm=rng.uniform(150, 200),
+                                        activity_level=rng.choice([None, 1, 2, 3, 4, 5]),
+                                        goal=rng.choice(GOALS),
+                                        days=DAYS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--templates", type=int, nargs="+", default=[1000, 10_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    profiles = [make_profile(rng, -1) for _ in range(args.queries)]
+    for count in args.templates:
+        library = PlanTemplateLibrary(max_distance=0.15)
+        started = time.perf_counter()
+        library.add([make_profile(rng, template_id) for template_id in range(count)])
+        fill_seconds = time.perf_counter() - started
+
+        found = 0
+        latencies = []
+        for profile in profiles:
+            started = time.perf_counter()
+            found += library.find(profile) is not None
+            latencies.append(time.perf_counter() - started)
+        latencies_ms = np.array(latencies) * 1000
+        print(f"templates: {len(library)}, filled in {fill_seconds:.2f} s, "
+              f"found for {found / len(profiles):.1%} of profiles, "
+              f"match latency: p50 {np.percentile(latencies_ms, 50):.3f} ms, "
+              f"p95 {np.percentile(latencies_ms, 95):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
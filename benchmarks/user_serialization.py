@@ -0,0 +1,87 @@
+"""
+Benchmark of user list responses: validation and serialization time.
+
+Compares the old path (`model_validate` for every row, JSON
+rendered by JSONResponse) with the current one (one TypeAdapter
+call for the list, JSON rendered by orjson) for 10k users
+with activity levels and 7-day plans.
+
+Run from the repository root:
+    python -m benchmarks.user_serialization
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime
+from typing import Callable
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from api.database.models import ActivityLevelModel, TrainingPlanDayModel, TrainingPlanModel, \
+    UserModel
+from api.schemas.user import User
+from api.schemas.utils import models_validate
+
+
+def make_users(count: int) -> list[UserModel]:
+    """Make database models like the ones loaded for `/user/all`."""
+    now = datetime.now()
+    level = ActivityLevelModel(level=3, name='Средний', description='Тренировки 3 раза в неделю',
+                               created_at=now, updated_at=now)
+    users = []
+    for user_id in range(1, count + 1):
+        plan = TrainingPlanModel(
+            id=user_id, user_id=user_id, plan_description='План на неделю',
+            days=[TrainingPlanDayModel(weekday=weekday, title='Ноги',
+                                       description='Приседания 4x10, выпады 3x12, планка 3x60 с')
+                  for weekday in range(7)])
+        users.append(UserModel(id=user_id, username=f'user{user_id}', age=30, weight_kg=80,
+                               height_cm=180, gender='male', goal='Похудеть', activity_level=3,
+                               activity_level_relation=level, training_plan=plan,
+                               created_at=now, updated_at=now))
+    return users
+
+
+def measure(func: Callable[[], object], repeats: int) -> float:
+    """Get the median time of the call in milliseconds."""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_users(args.users)
+    # FastAPI turns the returned models into JSON-compatible data with the response model
+    response_adapter = TypeAdapter(list[User])
+
+    def old_validate() -> list[User]:
+        return [User.model_validate(row) for row in rows]
+
+    def new_validate() -> list[User]:
+        return models_validate(User, rows)
+
+    content = response_adapter.dump_python(new_validate(), mode='json')
+    timings = {
+        "validate: model_validate per row": measure(old_validate, args.repeats),
+        "validate: TypeAdapter for the list": measure(new_validate, args.repeats),
+        "render: JSONResponse": measure(lambda: JSONResponse(content), args.repeats),
+        "render: ORJSONResponse": measure(lambda: ORJSONResponse(content), args.repeats),
+        "whole: old path": measure(lambda: JSONResponse(
+            response_adapter.dump_python(old_validate(), mode='json')), args.repeats),
+        "whole: current path": measure(lambda: ORJSONResponse(
+            response_adapter.dump_python(new_validate(), mode='json')), args.repeats),
+    }
+    print(f"users: {args.users}, median of {args.repeats} runs")
+    for name, milliseconds in timings.items():
+        print(f"{name}: {milliseconds:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
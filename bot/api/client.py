@@ -1,7 +1,11 @@
 """Client for the API."""
-from typing import Any
+from collections import OrderedDict
+from typing import Any, AsyncIterator
+import asyncio
+import json
 import logging
-from aiohttp import ClientResponse, ClientSession
+import time
+from aiohttp import ClientError, ClientResponse, ClientSession
 from bot.models.activity_level import ActivityLevel
 from bot.models.user import User
 from bot.config import config
@@ -20,7 +24,7 @@ async def check_response_status(response: ClientResponse):
     """
     status = response.status
     text = await response.text()
-    if status != 200:
+    if not response.ok:
         logger.error("API request error [STATUS %i]: %s", status, text)
         response.raise_for_status()
     else:
@@ -37,6 +41,8 @@ class APIClient:
         Use only once on bot's **start up**.
         """
         self.session = ClientSession(config.API_BASE_URL)
+        # path -> (ETag, JSON data), the least recently used goes first
+        self._cache: OrderedDict[str, tuple[str, Any]] = OrderedDict()
 
     async def close_session(self):
         """Close API aiohttp session.
@@ -45,6 +51,33 @@ class APIClient:
         """
         await self.session.close()
 
+    async def _get_json(self, path: str) -> Any:
+        """Make a GET request and get JSON data, use the cache if it's not changed.
+
+        The cached answer's ETag is sent in If-None-Match,
+        the API answers 304 without the body if the data is the same.
+
+        Args:
+            path (`str`): API path
+        """
+        cached = self._cache.get(path)
+        headers = {"If-None-Match": cached[0]} if cached is not None else {}
+        async with self.session.get(path, headers=headers) as response:
+            if response.status == 304 and cached is not None:
+                logger.info("API request [STATUS 304]: %s", path)
+                self._cache.move_to_end(path)
+                return cached[1]
+            await check_response_status(response)
+            data = await response.json()
+
+        etag = response.headers.get("ETag")
+        if etag is not None:
+            self._cache[path] = (etag, data)
+            self._cache.move_to_end(path)
+            if len(self._cache) > config.API_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return data
+
     async def get_user_request_response(self, user_id: int, request: str):
         """Get AI response on user's request using the API.
 
@@ -60,6 +93,34 @@ class APIClient:
             await check_response_status(response)
             return await response.text()
 
+    async def stream_user_request_response(self,
+                                           user_id: int,
+                                           request: str) -> AsyncIterator[str]:
+        """Stream AI response on user's request using the API.
+
+        Yields pieces of the answer as soon as the API sends them.
+
+        Args:
+            user_id (`int`): user Telegram ID
+            request (`str`): text message from user to AI
+        """
+        request_body = {
+            "user_id": user_id,
+            "content": request
+        }
+        async with self.session.post("/user/chat/stream", json=request_body) as response:
+            if response.status != 200:
+                # reads the whole body, use only on errors
+                await check_response_status(response)
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    logger.error("API stream error: %s", data["error"])
+                    raise ClientError(data["error"])
+                yield data["delta"]
+
     async def create_user(self, user: User):
         """Create user entry in API's database.
 
@@ -72,17 +133,25 @@ class APIClient:
                                      json=user.model_dump()) as response:
             await check_response_status(response)
 
+    async def put_user(self, user: User):
+        """Create user entry in API's database or replace their data.
+
+        Args:
+            user (`User`): user data
+        """
+        async with self.session.put(f"/user/{user.id}",
+                                    json=user.model_dump(exclude={'id'})) as response:
+            await check_response_status(response)
+
     async def get_user(self, user_id: int) -> User:
         """Get user entry from API by their ID.
 
         Args:
             user_id (`int`): user Telegram ID
         """
-        async with self.session.get(f"/user/get/{user_id}") as response:
-            await check_response_status(response)
-            user_data = await response.json()
-            user = User(**user_data)
-            return user
+        user_data = await self._get_json(f"/user/get/{user_id}")
+        user = User(**user_data)
+        return user
 
     async def update_user_field(self,
                                 user_id: int,
@@ -130,18 +199,18 @@ class APIClient:
 
     async def get_activity_levels(self) -> list[ActivityLevel]:
         """Get all possible activity levels from API."""
-        async with self.session.get("/level/all") as response:
-            await check_response_status(response)
-            data = await response.json()
-            # return all levels sorted by 'level' field
-            levels = sorted([ActivityLevel(**level) for level in data],
-                            key=lambda x: x.level)
-            return levels
+        data = await self._get_json("/level/all")
+        # return all levels sorted by 'level' field
+        levels = sorted([ActivityLevel(**level) for level in data],
+                        key=lambda x: x.level)
+        return levels
 
     async def create_user_training_plan(self, user_id: int, user_request: str):
         """Create a training plan for user using API.
 
-        The API creates training plans with AI.
+        The API creates training plans with AI in the background,
+        so the job status is polled until the plan is ready,
+        but not longer than `PLAN_JOB_TIMEOUT_SECONDS`.
         """
         request_body = {
             'user_id': user_id,
@@ -150,6 +219,21 @@ class APIClient:
         async with self.session.post("/plan/generate",
                                      json=request_body) as response:
             await check_response_status(response)
+            job = await response.json()
+
+        deadline = time.monotonic() + config.PLAN_JOB_TIMEOUT_SECONDS
+        while job['status'] in ('queued', 'running'):
+            if time.monotonic() >= deadline:
+                logger.error("Plan job %s didn't finish in time", job['id'])
+                raise ClientError("Plan generation took too long")
+            await asyncio.sleep(config.PLAN_JOB_POLL_INTERVAL_SECONDS)
+            async with self.session.get(f"/plan/job/{job['id']}") as response:
+                await check_response_status(response)
+                job = await response.json()
+
+        if job['status'] == 'failed':
+            logger.error("Plan generation failed: %s", job['error'])
+            raise ClientError(job['error'])
 
     async def get_user_training_plan(self, user_id: int) -> str:
         """Get user's training plan from API's database.
@@ -157,8 +241,23 @@ class APIClient:
         Args:
             user_id (`int`): user Telegram ID
         """
-        async with self.session.get(f"/plan/get/user/{user_id}") as response:
+        data = await self._get_json(f"/plan/get/user/{user_id}")
+        plan = data['plan_description']
+        return plan
+
+    async def get_user_training_plan_day(self, user_id: int, weekday: int) -> str | None:
+        """Get one day of user's training plan from API's database.
+
+        Returns None if the plan has no such day
+        (there is no plan or it was created without days).
+
+        Args:
+            user_id (`int`): user Telegram ID
+            weekday (`int`): day of the week, 0 is Monday
+        """
+        async with self.session.get(f"/plan/get/user/{user_id}/day/{weekday}") as response:
+            if response.status == 404:
+                return None
             await check_response_status(response)
             data = await response.json()
-            plan = data['plan_description']
-            return plan
+            return f"{data['title']}\n\n{data['description']}"
@@ -16,6 +16,16 @@ class Config(BaseSettings):
     BOT_TOKEN: str
     BOT_STORAGE_PORT: int
     API_BASE_URL: str = "http://localhost:8000"
+    # how often a streamed answer message is edited
+    STREAM_EDIT_INTERVAL_SECONDS: float = 1.5
+    # how often plan generation status is checked
+    PLAN_JOB_POLL_INTERVAL_SECONDS: float = 2
+    # stop waiting for the plan after this time
+    PLAN_JOB_TIMEOUT_SECONDS: float = 600
+    # API answers kept to send conditional requests (If-None-Match)
+    API_CACHE_SIZE: int = 256
+    # Telegram doesn't send user's time zone, e.g. today's plan uses this one
+    USERS_TIMEZONE: str = "Europe/Moscow"
 
 
 # import this to use config
@@ -6,9 +6,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.utils.chat_action import ChatActionSender
 from bot.keyboards.profile import get_profile_kb
 from bot.api.client import APIClient
+from bot.config import config
 from bot.states.use_ai import UseAI
 from bot.states.main import Main
-from bot.utils import get_command_descriptions
+from bot.utils import get_command_descriptions, get_message_weekday, answer_with_stream
 
 
 router = Router()
@@ -80,6 +81,24 @@ async def handle_my_plan_command(message: Message, bot: Bot, api_client: APIClie
         await message.answer(training_plan)
 
 
+@router.message(Command('today'), Main.main)
+async def handle_today_command(message: Message, bot: Bot, api_client: APIClient):
+    """Handle /today command.
+
+    Send only today's part of user's training plan.
+    If there is none, tell about it to the user.
+    """
+    async with ChatActionSender.typing(bot=bot, chat_id=message.chat.id):
+        training_day = await api_client.get_user_training_plan_day(message.from_user.id,
+                                                                   get_message_weekday(message))
+
+    if training_day is None:
+        await message.answer('Плана на сегодня нет 🤔\n\nИспользуйте команду /generate_plan')
+    else:
+        await message.answer('Вот ваш план на сегодня 💪')
+        await message.answer(training_day)
+
+
 @router.message(Command('generate_plan'), Main.main)
 async def handle_generate_plan_command(message: Message, state: FSMContext):
     """Handle /generate_plan command.
@@ -121,15 +140,20 @@ async def handle_user_request(message: Message,
     When user sends some message to bot (not a command/button),
     it means, they want to chat with AI.
 
-    Get user's message and send it to the API with their ID.    
+    Get user's message and send it to the API with their ID.
+    The answer is streamed: the first message appears after
+    the first generated text and then is edited while AI writes.
     """
-    async with ChatActionSender.typing(bot=bot, chat_id=message.chat.id):
-        user_id = message.from_user.id
-        request = message.text
-        await state.set_state(UseAI.generating_answer)
-        ai_response = await api_client.get_user_request_response(user_id, request)
-    await message.answer(ai_response)
-    await state.set_state(Main.main)
+    user_id = message.from_user.id
+    request = message.text
+    await state.set_state(UseAI.generating_answer)
+    try:
+        async with ChatActionSender.typing(bot=bot, chat_id=message.chat.id):
+            chunks = api_client.stream_user_request_response(user_id, request)
+            await answer_with_stream(message, chunks,
+                                     edit_interval=config.STREAM_EDIT_INTERVAL_SECONDS)
+    finally:
+        await state.set_state(Main.main)
 
 
 @router.message(~F.text)
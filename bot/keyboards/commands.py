@@ -15,6 +15,8 @@ async def set_menu(bot: Bot, chat_id: int | None = None):
     menu_commands = [
         BotCommand(command='/my_plan',
                    description='Просмотреть план тренировок'),
+        BotCommand(command='/today',
+                   description='План тренировок на сегодня'),
         BotCommand(command='/generate_plan',
                    description='Сгенерировать план тренировок'),
         BotCommand(command='/profile',
@@ -7,16 +7,13 @@ async def create_user(user: User, api_client: APIClient):
     """Create a user entry in API.
 
     If the user already exists, update data.
+    It's one request, the API makes an upsert.
 
     Args:
         user (`User`): user data for creation
         api_client (`APIClient`): an API client to make requests
     """
-    try:
-        await api_client.create_user(user)
-    except ClientResponseError:
-        # there is a user with this ID, update data
-        await api_client.update_user(user)
+    await api_client.put_user(user)
 
 
 async def get_activity_levels_description(api_client: APIClient) -> str:
@@ -1,4 +1,17 @@
+import logging
+import time
+from typing import AsyncIterator
+from zoneinfo import ZoneInfo
 from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import Message
+from bot.config import config
+
+
+logger = logging.getLogger(__name__)
+
+# Telegram won't accept longer messages
+MESSAGE_LENGTH_LIMIT = 4096
 
 
 async def get_command_descriptions(bot: Bot):
@@ -8,3 +21,72 @@ async def get_command_descriptions(bot: Bot):
     for command in commands:
         command_descriptions += f"<b>/{command.command}</b>: {command.description}\n"
     return command_descriptions
+
+
+def get_message_weekday(message: Message) -> int:
+    """Get the day of the week when the message was sent in users' time zone.
+
+    The bot's host can be in another time zone, so its date is not used.
+    """
+    return message.date.astimezone(ZoneInfo(config.USERS_TIMEZONE)).weekday()
+
+
+async def _show_text(message: Message,
+                     answer: Message | None,
+                     text: str,
+                     shown_text: str) -> tuple[Message | None, str]:
+    """Send the text as the answer or edit the answer with it.
+
+    The text is sent as is, without parse mode: unfinished text
+    can have unclosed tags. Edits that don't change the text are skipped.
+    Returns the answer and the text it shows, if Telegram
+    refuses the text, the answer keeps the old one.
+    """
+    if answer is not None and text == shown_text:
+        return answer, shown_text
+    try:
+        if answer is None:
+            return await message.answer(text, parse_mode=None), text
+        await answer.edit_text(text, parse_mode=None)
+        return answer, text
+    except TelegramAPIError as exc:
+        logger.warning("Couldn't show streamed text: %s", exc)
+        return answer, shown_text
+
+
+async def answer_with_stream(message: Message,
+                             chunks: AsyncIterator[str],
+                             edit_interval: float):
+    """Answer the message with streamed text.
+
+    Sends a message as soon as the first text arrives and
+    edits it not more often than once per `edit_interval` seconds.
+    Too long text is continued in a new message.
+    The text is sent without parse mode.
+
+    Args:
+        message (`Message`): message to answer
+        chunks (`AsyncIterator[str]`): pieces of the answer text
+        edit_interval (`float`): minimal time between edits in seconds
+    """
+    text = ''
+    shown_text = ''
+    answer: Message | None = None
+    last_edit = 0.0
+
+    async for chunk in chunks:
+        text += chunk
+        while len(text) > MESSAGE_LENGTH_LIMIT:
+            # finish the current message, continue in a new one
+            head, text = text[:MESSAGE_LENGTH_LIMIT], text[MESSAGE_LENGTH_LIMIT:]
+            await _show_text(message, answer, head, shown_text)
+            answer, shown_text = None, ''
+        if not text.strip():
+            continue
+
+        if answer is None or time.monotonic() - last_edit >= edit_interval:
+            answer, shown_text = await _show_text(message, answer, text, shown_text)
+            last_edit = time.monotonic()
+
+    if text.strip():
+        await _show_text(message, answer, text, shown_text)
@@ -0,0 +1,85 @@
+"""
+Shared fixtures for the tests.
+
+Tests that need PostgreSQL or Redis use the servers from
+the config (`.env` or environment variables), but always
+a separate database: TEST_DB_NAME (default `ai_coach_test`)
+and TEST_REDIS_DB (default 15). The test database is migrated
+and its tables are emptied before every test. Tests are skipped
+if the servers are not available.
+"""
+import os
+from pathlib import Path
+from dotenv import dotenv_values
+
+ENV_PATH = Path(__file__).resolve().parent.parent / '.env'
+# settings required by the config, used if they are not set
+DEFAULT_SETTINGS = {
+    'HOST': 'localhost',
+    'DB_USER': 'postgres',
+    'DB_PASSWORD': 'postgres',
+    'DB_PORT': '5432',
+    # AI is never called for real in the tests
+    'AI_API_KEY': 'test',
+    'AI_MODEL_NAME': 'test-model',
+    # the bot's settings, Telegram is not called either
+    'BOT_TOKEN': 'test',
+    'BOT_STORAGE_PORT': '6379',
+}
+env_file = dotenv_values(ENV_PATH) if ENV_PATH.exists() else {}
+for name, value in DEFAULT_SETTINGS.items():
+    if name not in os.environ and name not in env_file:
+        os.environ[name] = value
+os.environ['DB_NAME'] = os.environ.get('TEST_DB_NAME', 'ai_coach_test')
+os.environ['REDIS_DB'] = os.environ.get('TEST_REDIS_DB', '15')
+
+import pytest
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import text
+from api.database.database import engine, session_maker
+from api.database.redis import redis as api_redis
+
+
+ALEMBIC_INI = ENV_PATH.parent / 'api' / 'alembic.ini'
+
+
+@pytest.fixture
+def anyio_backend():
+    """Run async tests with asyncio only."""
+    return 'asyncio'
+
+
+@pytest.fixture(scope='session')
+def migrated_database():
+    """Migrate the test database to the last revision once."""
+    try:
+        command.upgrade(AlembicConfig(str(ALEMBIC_INI)), 'head')
+    except Exception as exc:
+        pytest.skip(f"PostgreSQL is not available: {exc}")
+
+
+@pytest.fixture
+async def database(migrated_database):
+    """Empty test database, yields the session maker of the API."""
+    async with engine.begin() as connection:
+        await connection.execute(text(
+            "TRUNCATE users, activity_levels, training_plans, training_plan_days, "
+            "training_plan_drafts, plan_templates RESTART IDENTITY CASCADE"))
+    yield session_maker
+    # connections belong to the test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+async def redis():
+    """Empty test Redis database."""
+    try:
+        await api_redis.ping()
+    except Exception as exc:
+        pytest.skip(f"Redis is not available: {exc}")
+    await api_redis.flushdb()
+    yield api_redis
+    await api_redis.flushdb()
+    # connections belong to the test's event loop
+    await api_redis.connection_pool.disconnect()
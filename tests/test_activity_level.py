@@ -0,0 +1,26 @@
+"""A saved activity level change is not an error if reloading fails."""
+import pytest
+from api.schemas.activity_level import ActivityLevelInput
+from api.service import activity_level as service
+from api.service.activity_level import ActivityLevelRegistry
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_failed_reload_falls_back_to_database(database, monkeypatch):
+    registry = ActivityLevelRegistry()
+    monkeypatch.setattr(service, 'activity_level_registry', registry)
+    await registry.load()
+    assert registry.is_loaded
+
+    async def load():
+        raise ConnectionError("Database is not available")
+
+    monkeypatch.setattr(registry, 'load', load)
+    async with database() as session:
+        await service.create(ActivityLevelInput(level=1, name='Низкий', description='Мало'),
+                             session=session)
+        assert not registry.is_loaded
+        level = await service.get_by_level(1, session=session)
+    assert level.name == 'Низкий'
@@ -0,0 +1,55 @@
+"""No database connection is held while AI generates."""
+import pytest
+from api.database.crud import UserCRUD
+from api.database.database import engine
+from api.llm.ai_client import AIClient
+from api.schemas.ai_request import UserAIRequest
+from api.schemas.training_plan import GeneratedTrainingPlan
+from api.schemas.user import UserInput
+from api.service import training_plan as plan_service
+from api.service import user as user_service
+
+
+pytestmark = pytest.mark.anyio
+
+PLAN_DAYS = [{'weekday': weekday, 'title': 'Отдых', 'description': 'Прогулка'}
+             for weekday in range(7)]
+
+
+async def create_user(session_maker, user_id: int = 1):
+    """Add a user to the test database."""
+    async with session_maker() as session:
+        await UserCRUD.create(UserInput(id=user_id, age=30, weight_kg=80, height_cm=180,
+                                        gender='male', goal='Похудеть'),
+                              session=session)
+        await session.commit()
+
+
+async def test_plan_generation_holds_no_connection(database, monkeypatch):
+    await create_user(database)
+    checked_out = []
+
+    async def generate_user_plan(user, extra, priority=None):
+        checked_out.append(engine.pool.checkedout())
+        return GeneratedTrainingPlan(days=PLAN_DAYS)
+
+    monkeypatch.setattr(AIClient, 'generate_user_plan', generate_user_plan)
+    plan = await plan_service.generate_plan(UserAIRequest(user_id=1))
+
+    assert checked_out == [0]
+    assert len(plan.days) == 7
+
+
+async def test_chat_answer_holds_no_connection(database, monkeypatch):
+    await create_user(database)
+    checked_out = []
+
+    async def generate_user_response(user, user_request):
+        checked_out.append(engine.pool.checkedout())
+        return 'Ответ'
+
+    monkeypatch.setattr(AIClient, 'generate_user_response', generate_user_response)
+    answer = await user_service.get_ai_answer(UserAIRequest(user_id=1, content='Вопрос'))
+
+    assert checked_out == [0]
+    assert answer == 'Ответ'
@@ -0,0 +1,88 @@
+"""Bulk creation is limited and exports report their errors."""
+import csv
+import io
+import httpx
+import pytest
+from sqlalchemy import text
+from api.config import config
+from api.database.crud import UserCRUD
+from api.main import app
+from api.routes.utils import stream_csv_with_errors
+from api.service import user as user_service
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_bulk_request_size_is_limited():
+    users = [{'id': user_id, 'age': 30, 'gender': 'male'}
+             for user_id in range(config.DB_BULK_MAX_ITEMS + 1)]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        response = await client.post('/user/bulk', json=users)
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize('chunks, expected', [
+    ([b'id,name\n1,a\n'], b'id,name\n1,a\nerror,Unexpected error\n'),
+    # the error starts a new line
+    ([b'id,name\n1,'], b'id,name\n1,\nerror,Unexpected error\n'),
+])
+async def test_csv_export_error_is_the_last_line(chunks, expected):
+    async def copy():
+        for chunk in chunks:
+            yield chunk
+        raise ConnectionError("COPY failed")
+
+    output = b''.join([chunk async for chunk in stream_csv_with_errors(copy())])
+    assert output == expected
+
+
+async def add_users(session_maker, count: int):
+    """Add users with IDs from 1 to `count` with one statement."""
+    async with session_maker() as session:
+        await session.execute(text(
+            "INSERT INTO users (id, username, age, weight_kg, height_cm, gender) "
+            "SELECT id, 'user' || id, 30, 80, 180, 'male' FROM generate_series(1, :count) id"),
+            {'count': count})
+        await session.commit()
+
+
+async def test_csv_export_has_a_header_and_rows(database):
+    await add_users(database, 3)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        response = await client.get('/user/export')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row['id'] for row in rows] == ['1', '2', '3']
+    assert rows[0]['username'] == 'user1'
+    assert rows[0]['gender'] == 'male'
+
+
+async def test_interrupted_csv_export_ends_with_an_error(database, monkeypatch):
+    # enough rows for COPY to wait for the slow reader
+    await add_users(database, 50_000)
+
+    async def export_csv():
+        async with database() as session:
+            backend_pid = await session.scalar(text("SELECT pg_backend_pid()"))
+            chunks = UserCRUD.copy_to_csv(session=session, queue_size=1)
+            yield await anext(chunks)
+            # the connection is lost while the export is streamed
+            async with database() as other_session:
+                await other_session.execute(text("SELECT pg_terminate_backend(:pid)"),
+                                            {'pid': backend_pid})
+            async for chunk in chunks:
+                yield chunk
+
+    monkeypatch.setattr(user_service, 'export_csv', export_csv)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        response = await client.get('/user/export')
+    lines = response.text.splitlines()
+    assert lines[0].startswith('id,')
+    assert lines[-1].startswith('error,')
+    # the export didn't get to the last user
+    assert not any(line.startswith('50000,') for line in lines)
@@ -0,0 +1,39 @@
+"""Days of the plan that a request is about."""
+import pytest
+from api.schemas.training_plan import TrainingPlan
+from api.service.training_plan import _find_changed_days, _get_stem
+
+
+TITLES = ['Ноги', 'Отдых', 'Спина и плечи', 'Отдых', 'Грудь', 'Кардио', 'Отдых']
+PLAN = TrainingPlan(id=1, user_id=1, plan_description='план',
+                    days=[{'weekday': weekday, 'title': title, 'description': 'упражнения'}
+                          for weekday, title in enumerate(TITLES)])
+
+
+@pytest.mark.parametrize('request_text, weekdays', [
+    ('Перенеси тренировку со среды на пятницу', [2, 4]),
+    ('В воскресенье хочу отдыхать', [6]),
+    ('По субботам бегаю', [5]),
+    ('Больше упражнений на ноги', [0]),
+    ('Добавь упражнений ногам и спине', [0, 2]),
+    # not day names
+    ('Сделай средней интенсивности', []),
+    ('Сделай тренировки полегче', []),
+    # the whole plan
+    ('Всегда в пятницу занят', [4]),
+    ('Поменяй все, кроме пятницы', []),
+    ('Всё в пятницу', []),
+    # "отдых" is in 3 titles, the request may be about any of them
+    ('Больше отдыха и ноги', []),
+])
+def test_find_changed_days(request_text, weekdays):
+    assert _find_changed_days(request_text, PLAN) == weekdays
+
+
+@pytest.mark.parametrize('words', [
+    ('ноги', 'ногам', 'ногами', 'ног'),
+    ('спина', 'спину', 'спиной', 'спине'),
+    ('грудь', 'грудью', 'груди'),
+])
+def test_word_forms_have_one_stem(words):
+    assert len({_get_stem(word) for word in words}) == 1
@@ -0,0 +1,132 @@
+"""Chat answers are streamed as NDJSON and shown by the bot while they arrive."""
+import asyncio
+import json
+from types import SimpleNamespace
+import httpx
+import pytest
+from api.exceptions import AIRequestError
+from api.llm.ai_client import AIClient
+from api.llm.scheduler import LLMScheduler, Priority
+from api.main import app
+from api.service import user as user_service
+from bot import utils as bot_utils
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def post_chat_stream(monkeypatch, chunks) -> list[dict]:
+    """Stream the chat answer made of the chunks, get its NDJSON lines."""
+    async def stream_ai_answer(request):
+        return chunks()
+
+    monkeypatch.setattr(user_service, 'stream_ai_answer', stream_ai_answer)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        response = await client.post('/user/chat/stream',
+                                     json={'user_id': 1, 'content': 'Как бегать?'})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_answer_is_streamed_as_deltas(monkeypatch):
+    async def chunks():
+        yield 'Бегайте '
+        yield 'медленно.'
+
+    lines = await post_chat_stream(monkeypatch, chunks)
+    assert lines == [{'delta': 'Бегайте '}, {'delta': 'медленно.'}]
+
+
+@pytest.mark.parametrize('error, message', [
+    (AIRequestError("AI is not available"), "AI is not available"),
+    (ConnectionError("connection lost"), "Unexpected error"),
+])
+async def test_failure_midway_is_the_last_line(monkeypatch, error, message):
+    async def chunks():
+        yield 'Бегайте '
+        raise error
+
+    lines = await post_chat_stream(monkeypatch, chunks)
+    assert lines == [{'delta': 'Бегайте '}, {'error': message}]
+
+
+async def test_slot_is_released_before_the_answer_is_read(monkeypatch):
+    scheduler = LLMScheduler(max_concurrency=1)
+    monkeypatch.setattr(AIClient, 'SCHEDULER', scheduler)
+
+    def make_chunk(text):
+        return SimpleNamespace(usage=None,
+                               choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    class Stream:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            raise StopAsyncIteration
+
+    async def open_stream(model, messages, max_tokens):
+        return Stream(), [make_chunk('Бегайте '), make_chunk('медленно.')]
+
+    monkeypatch.setattr(AIClient, '_open_stream', open_stream)
+    messages = [{'role': 'user', 'content': 'Как бегать?'}]
+    pieces = AIClient._stream_text_response(messages, Priority.INTERACTIVE, 'model')
+    assert await anext(pieces) == 'Бегайте '
+    # the reader is slow, but the model has finished
+    await asyncio.sleep(0.01)
+    assert scheduler.get_stats().active == 0
+    assert [piece async for piece in pieces] == ['медленно.']
+
+
+class FakeMessage:
+    """Records what the bot sends and edits."""
+
+    def __init__(self, sent: list['FakeMessage']):
+        self.sent = sent
+        self.edits: list[str] = []
+        self.text = ''
+
+    async def answer(self, text, parse_mode=None):
+        message = FakeMessage(self.sent)
+        message.text = text
+        self.sent.append(message)
+        return message
+
+    async def edit_text(self, text, parse_mode=None):
+        self.edits.append(text)
+        self.text = text
+
+
+async def test_bot_edits_are_throttled():
+    sent = []
+
+    async def chunks():
+        for word in ('Бегайте ', 'медленно ', 'и ', 'часто.'):
+            yield word
+
+    await bot_utils.answer_with_stream(FakeMessage(sent), chunks(), edit_interval=60)
+    # sent at the first text, then only the final text
+    assert len(sent) == 1
+    assert sent[0].edits == ['Бегайте медленно и часто.']
+
+
+async def test_bot_splits_long_answers():
+    sent = []
+    limit = bot_utils.MESSAGE_LENGTH_LIMIT
+
+    async def chunks():
+        yield 'a' * (limit - 1)
+        yield 'bb'
+        yield 'c' * 10
+
+    await bot_utils.answer_with_stream(FakeMessage(sent), chunks(), edit_interval=0)
+    assert [message.text for message in sent] == ['a' * (limit - 1) + 'b', 'b' + 'c' * 10]
+    assert all(len(message.text) <= limit for message in sent)
@@ -0,0 +1,69 @@
+"""Hedged requests take their own slot and release what they cancel."""
+import asyncio
+from types import SimpleNamespace
+import pytest
+from api.config import config
+from api.llm.ai_client import AIClient
+from api.llm.scheduler import LLMScheduler, Priority
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def scheduler(monkeypatch) -> LLMScheduler:
+    scheduler = LLMScheduler(max_concurrency=2)
+    monkeypatch.setattr(AIClient, 'SCHEDULER', scheduler)
+    monkeypatch.setattr(config, 'AI_HEDGE_MODEL_NAME', 'hedge-model')
+    monkeypatch.setattr(config, 'AI_HEDGE_AFTER_SECONDS', 0.01)
+    return scheduler
+
+
+async def test_hedge_takes_a_slot_and_waits_for_the_cancelled_call(scheduler):
+    primary_closed = []
+    hedge_active = []
+
+    async def call(model: str) -> str:
+        if model == 'hedge-model':
+            hedge_active.append(scheduler.get_stats().active)
+            return 'hedge answer'
+        try:
+            await asyncio.sleep(60)
+        finally:
+            await asyncio.sleep(0)
+            primary_closed.append(model)
+        return 'primary answer'
+
+    async with scheduler.slot(Priority.INTERACTIVE, tokens=0):
+        answer = await AIClient._hedge(call, 'primary-model', Priority.INTERACTIVE, 0)
+        assert answer == ('hedge-model', 'hedge answer')
+        # the primary call is done when the hedge returns
+        assert primary_closed == ['primary-model']
+        assert scheduler.get_stats().active == 1
+    assert hedge_active == [2]
+    assert scheduler.get_stats().active == 0
+
+
+async def test_open_stream_is_closed_on_cancellation(monkeypatch):
+    closed = []
+
+    class Stream:
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            await asyncio.sleep(60)
+
+        async def close(self):
+            closed.append(True)
+
+    async def run(func, breaker):
+        return Stream()
+
+    monkeypatch.setattr(AIClient, 'RETRY_POLICY', SimpleNamespace(run=run))
+    task = asyncio.create_task(AIClient._open_stream('model', [], 100))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert closed == [True]
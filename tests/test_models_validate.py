@@ -0,0 +1,49 @@
+"""Validating a list of users at once gives the same users as one by one."""
+from datetime import datetime, timezone
+import pytest
+from api.database.crud import UserCRUD
+from api.database.models import ActivityLevelModel, TrainingPlanDayModel, TrainingPlanModel, \
+    UserModel
+from api.schemas.user import User
+from api.schemas.utils import models_validate
+
+
+LEVEL = dict(level=1, name='Низкий', description='Мало двигается')
+
+
+def make_users() -> list[UserModel]:
+    """Users with a level, with a plan and with neither."""
+    updated_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        UserModel(id=1, age=30, weight_kg=80, height_cm=180, gender='male', activity_level=1,
+                  activity_level_relation=ActivityLevelModel(**LEVEL), updated_at=updated_at),
+        UserModel(id=2, age=25, weight_kg=60, height_cm=165, gender='female', goal='Похудеть',
+                  training_plan=TrainingPlanModel(
+                      id=1, user_id=2, plan_description='План',
+                      days=[TrainingPlanDayModel(weekday=0, title='Бег', description='5 км')])),
+        UserModel(id=3, username=None, age=40, weight_kg=90, height_cm=175, gender='male'),
+    ]
+
+
+def test_list_is_validated_as_every_user():
+    users = make_users()
+    validated = models_validate(User, users)
+    assert validated == [User.model_validate(user) for user in users]
+    # the level is taken by its alias
+    assert validated[0].activity_level_info.name == 'Низкий'
+    assert validated[1].training_plan.days[0].title == 'Бег'
+    assert models_validate(User, []) == []
+
+
+@pytest.mark.anyio
+async def test_summary_users_have_no_plan(database):
+    async with database() as session:
+        session.add_all(make_users())
+        await session.commit()
+    async with database() as session:
+        users = [await UserCRUD.get_by_id(user_id, session=session, profile='summary')
+                 for user_id in (1, 2, 3)]
+        validated = models_validate(User, users)
+        assert validated == [User.model_validate(user) for user in users]
+    assert [user.training_plan for user in validated] == [None] * 3
+    assert validated[0].activity_level_info.name == 'Низкий'
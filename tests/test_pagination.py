@@ -0,0 +1,63 @@
+"""Users are paged by ID and streamed without loading all of them."""
+import json
+import httpx
+import pytest
+from api.database.crud import UserCRUD
+from api.database.models import UserModel
+from api.main import app
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_users(session_maker, user_ids: list[int]):
+    """Add users with the IDs to the test database."""
+    async with session_maker() as session:
+        session.add_all(UserModel(id=user_id, age=30, weight_kg=80, height_cm=180, gender='male')
+                        for user_id in user_ids)
+        await session.commit()
+
+
+async def test_pages_follow_each_other(database):
+    # gaps in IDs don't break the pages
+    await add_users(database, [1, 2, 5, 6, 8, 9, 12])
+    pages = []
+    after_id = None
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        while True:
+            params = {'limit': 3} if after_id is None else {'limit': 3, 'after_id': after_id}
+            response = await client.get('/user/all', params=params)
+            assert response.status_code == 200
+            page = [user['id'] for user in response.json()]
+            if not page:
+                break
+            pages.append(page)
+            after_id = page[-1]
+    assert pages == [[1, 2, 5], [6, 8, 9], [12]]
+
+
+async def test_page_limit_is_checked():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        assert (await client.get('/user/all', params={'limit': 0})).status_code == 422
+        assert (await client.get('/user/all', params={'limit': 1001})).status_code == 422
+
+
+async def test_stream_yields_every_user_in_batches(database):
+    await add_users(database, list(range(1, 12)))
+    async with database() as session:
+        users = [user.id async for user in UserCRUD.stream_all(session=session,
+                                                               after_id=3,
+                                                               batch_size=2)]
+    assert users == list(range(4, 12))
+
+
+async def test_stream_endpoint_sends_ndjson(database):
+    await add_users(database, [1, 2, 3])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        response = await client.get('/user/all/stream', params={'after_id': 1})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line)['id'] for line in response.text.splitlines()] == [2, 3]
@@ -0,0 +1,106 @@
+"""One day of the plan is served to the bot, also for plans saved without days."""
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import httpx
+import pytest
+from api.database.models import TrainingPlanDayModel, TrainingPlanModel, UserModel
+from api.main import app
+from bot.api.client import APIClient
+from bot.config import config as bot_config
+from bot.utils import get_message_weekday
+
+
+pytestmark = pytest.mark.anyio
+
+# a plan generated before days were stored
+OLD_PLAN = ("ПОНЕДЕЛЬНИК:\nБег 5 км\nРазминка 10 минут\nЗаминка\n\n"
+            "ВТОРНИК:\nОтдых\n\n"
+            "Помни, что это примерный план, и ты можешь его модифицировать!")
+
+
+async def add_user(session_maker, user_id: int, plan: TrainingPlanModel | None):
+    async with session_maker() as session:
+        session.add(UserModel(id=user_id, age=30, weight_kg=80, height_cm=180, gender='male'))
+        if plan is not None:
+            plan.user_id = user_id
+            session.add(plan)
+        await session.commit()
+
+
+async def get_day(user_id: int, weekday: int) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        return await client.get(f'/plan/get/user/{user_id}/day/{weekday}')
+
+
+async def test_stored_day_is_served(database):
+    await add_user(database, 1, TrainingPlanModel(
+        plan_description='План',
+        days=[TrainingPlanDayModel(weekday=weekday, title=f'День {weekday}',
+                                   description='Упражнения')
+              for weekday in range(7)]))
+    response = await get_day(1, 3)
+    assert response.status_code == 200
+    assert response.json() == {'weekday': 3, 'title': 'День 3', 'description': 'Упражнения'}
+
+
+async def test_day_of_an_old_plan_is_taken_from_the_text(database):
+    await add_user(database, 1, TrainingPlanModel(plan_description=OLD_PLAN))
+    monday = await get_day(1, 0)
+    assert monday.status_code == 200
+    assert monday.json() == {'weekday': 0, 'title': 'Бег 5 км',
+                             'description': 'Разминка 10 минут\nЗаминка'}
+    # the plan ending is not a part of the last day
+    assert (await get_day(1, 1)).json()['description'] == ''
+    assert (await get_day(1, 2)).status_code == 404
+
+
+async def test_missing_plan_and_wrong_weekday(database):
+    await add_user(database, 1, None)
+    assert (await get_day(1, 0)).status_code == 404
+    assert (await get_day(1, 7)).status_code == 422
+
+
+class FakeResponse:
+    def __init__(self, status: int, data: dict | None = None):
+        self.status = status
+        self.ok = status < 400
+        self._data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def text(self):
+        return str(self._data)
+
+    async def json(self):
+        return self._data
+
+
+async def test_bot_gets_the_day_text():
+    client = APIClient.__new__(APIClient)
+    paths = []
+
+    def get(path):
+        paths.append(path)
+        if path.endswith('/day/0'):
+            return FakeResponse(200, {'weekday': 0, 'title': 'Бег', 'description': '5 км'})
+        return FakeResponse(404, {'detail': 'no day'})
+
+    client.session = SimpleNamespace(get=get)
+    assert await client.get_user_training_plan_day(1, 0) == 'Бег\n\n5 км'
+    assert await client.get_user_training_plan_day(1, 1) is None
+    assert paths == ['/plan/get/user/1/day/0', '/plan/get/user/1/day/1']
+
+
+@pytest.mark.parametrize('sent_at, weekday', [
+    # Sunday night in UTC is already Monday in Moscow
+    (datetime(2026, 10, 18, 22, 30, tzinfo=timezone.utc), 0),
+    (datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc), 6),
+])
+def test_today_is_the_users_day(sent_at, weekday, monkeypatch):
+    monkeypatch.setattr(bot_config, 'USERS_TIMEZONE', 'Europe/Moscow')
+    assert get_message_weekday(SimpleNamespace(date=sent_at)) == weekday
@@ -0,0 +1,108 @@
+"""Plan jobs are visible from every API worker."""
+import asyncio
+import pytest
+from api.exceptions import NotFoundError, QueueFullError
+from api.schemas.ai_request import UserAIRequest
+from api.schemas.plan_job import PlanJobStatus
+from api.schemas.training_plan import TrainingPlan
+from api.service import plan_job
+from api.service.plan_job import PlanJobQueue
+
+
+pytestmark = pytest.mark.anyio
+
+PLAN = TrainingPlan(id=1, user_id=1, plan_description='План')
+
+
+async def wait_for_status(queue: PlanJobQueue, job_id: str, status: PlanJobStatus):
+    """Poll the job like a client does."""
+    for _ in range(100):
+        job = await queue.get(job_id)
+        if job.status == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job is still {job.status}")
+
+
+async def test_job_is_polled_from_another_worker(redis, monkeypatch):
+    finish = asyncio.Event()
+
+    async def generate_plan(request):
+        await finish.wait()
+        return PLAN
+
+    monkeypatch.setattr(plan_job, 'generate_plan', generate_plan)
+    worker = PlanJobQueue(workers=1, max_size=10, result_ttl_seconds=60, redis=redis)
+    other_worker = PlanJobQueue(workers=1, max_size=10, result_ttl_seconds=60, redis=redis)
+    await worker.start()
+    try:
+        job = await worker.submit(UserAIRequest(user_id=1))
+        await wait_for_status(other_worker, job.id, PlanJobStatus.RUNNING)
+        finish.set()
+        job = await wait_for_status(other_worker, job.id, PlanJobStatus.DONE)
+        assert job.plan == PLAN
+    finally:
+        await worker.stop()
+
+
+async def test_finished_job_expires(redis):
+    queue = PlanJobQueue(workers=1, max_size=10, result_ttl_seconds=0.05, redis=redis)
+    job = await queue.add_done(UserAIRequest(user_id=1), PLAN)
+    assert (await queue.get(job.id)).status == PlanJobStatus.DONE
+    await asyncio.sleep(0.1)
+    with pytest.raises(NotFoundError):
+        await queue.get(job.id)
+
+
+async def test_profile_changes_make_one_draft(monkeypatch):
+    drafts = []
+
+    async def generate_plan_draft(user_id):
+        drafts.append(user_id)
+
+    monkeypatch.setattr(plan_job, 'generate_plan_draft', generate_plan_draft)
+    queue = PlanJobQueue(workers=1, max_size=10, result_ttl_seconds=60,
+                         draft_delay_seconds=0.05)
+    await queue.start()
+    try:
+        for _ in range(3):
+            queue.submit_draft(1)
+            await asyncio.sleep(0.02)
+        assert drafts == []
+        await asyncio.sleep(0.1)
+        assert drafts == [1]
+    finally:
+        await queue.stop()
+
+
+async def test_concurrent_submits_dont_overfill_queue(redis):
+    # not started, so the queue only fills up
+    queue = PlanJobQueue(workers=1, max_size=2, result_ttl_seconds=60, redis=redis)
+    results = await asyncio.gather(
+        *(queue.submit(UserAIRequest(user_id=user_id)) for user_id in range(5)),
+        return_exceptions=True)
+    jobs = [result for result in results if not isinstance(result, Exception)]
+    errors = [result for result in results if isinstance(result, Exception)]
+    assert len(jobs) == 2
+    assert len(errors) == 3
+    assert all(isinstance(error, QueueFullError) for error in errors)
+    # rejected jobs are not left queued
+    assert sorted(await redis.keys('plan_job:*')) == \
+        sorted(PlanJobQueue._get_key(job.id).encode() for job in jobs)
+
+
+async def test_drafts_are_queued_in_unbounded_queue(monkeypatch):
+    drafts = []
+
+    async def generate_plan_draft(user_id):
+        drafts.append(user_id)
+
+    monkeypatch.setattr(plan_job, 'generate_plan_draft', generate_plan_draft)
+    queue = PlanJobQueue(workers=1, max_size=0, result_ttl_seconds=60)
+    await queue.start()
+    try:
+        queue.submit_draft(1)
+        await asyncio.sleep(0.05)
+        assert drafts == [1]
+    finally:
+        await queue.stop()
@@ -0,0 +1,74 @@
+"""Plan templates reach every API worker and keep no personal plans."""
+import asyncio
+import pytest
+from api.config import config
+from api.schemas.plan_template import PlanTemplate, PlanTemplateInput
+from api.schemas.training_plan import GeneratedTrainingPlan, TrainingPlan
+from api.schemas.user import User
+from api.service import plan_template, training_plan
+from api.service.plan_template import PlanTemplateLibrary
+
+
+pytestmark = pytest.mark.anyio
+
+DAYS = [{'weekday': weekday, 'title': 'Тренировка', 'description': 'Приседания'}
+        for weekday in range(7)]
+TEMPLATE = PlanTemplateInput(gender='male', age=30, weight_kg=80, height_cm=180, days=DAYS)
+
+
+async def test_created_template_is_loaded_by_another_worker(database, redis, monkeypatch):
+    worker = PlanTemplateLibrary(max_distance=0.15, redis=redis)
+    other_worker = PlanTemplateLibrary(max_distance=0.15, redis=redis)
+    monkeypatch.setattr(plan_template, 'plan_template_library', worker)
+    await other_worker.start()
+    try:
+        async with database() as session:
+            await plan_template.create(TEMPLATE, session=session)
+        for _ in range(100):
+            if len(other_worker):
+                break
+            await asyncio.sleep(0.01)
+        assert len(worker) == len(other_worker) == 1
+        assert other_worker.find(User(id=1, gender='male', age=30,
+                                      weight_kg=80, height_cm=180)) is not None
+    finally:
+        await other_worker.stop()
+
+
+@pytest.mark.parametrize('user, personal', [
+    (User(id=1, gender='male', username='Иван'), False),
+    (User(id=1, gender='male', goal='Пробежать марафон'), False),
+    (User(id=1, gender='male', goal='Выступить на конкурсе танцев'), True),
+    (User(id=1, gender='male', training_plan=TrainingPlan(id=1, user_id=1,
+                                                          plan_description='План')), True),
+    (User(id=1, gender='male', username='Приседания'), True),
+])
+def test_personal_plans_are_found(user, personal):
+    plan = GeneratedTrainingPlan(days=DAYS)
+    assert training_plan._is_personal(user, plan) is personal
+
+
+def test_paraphrased_goals_share_a_template():
+    library = PlanTemplateLibrary(max_distance=0.15)
+    library.add([PlanTemplate(id=1, **TEMPLATE.model_dump(exclude={'goal'}), goal='Похудеть')])
+    profile = dict(id=1, gender='male', age=30, weight_kg=80, height_cm=180)
+
+    assert library.find(User(**profile, goal='Хочу сбросить лишний вес')) is not None
+    assert library.find(User(**profile, goal='Набрать мышечную массу')) is None
+    assert library.find(User(**profile)) is None
+    assert library.find(User(**profile, goal='Похудеть к конкурсу танцев')) is not None
+    # a goal of no known category gets no template
+    assert library.find(User(**profile, goal='Выступить на конкурсе танцев')) is None
+
+
+async def test_template_count_is_limited(monkeypatch):
+    library = PlanTemplateLibrary(max_distance=0.15)
+    monkeypatch.setattr(training_plan, 'plan_template_library', library)
+    monkeypatch.setattr(config, 'PLAN_TEMPLATES_MAX_COUNT', 0)
+
+    async def create_template(template, session):
+        raise AssertionError("The template must not be created")
+
+    monkeypatch.setattr(training_plan, 'create_template', create_template)
+    await training_plan._add_template(User(id=1, gender='male'),
+                                      GeneratedTrainingPlan(days=DAYS))
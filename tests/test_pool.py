@@ -0,0 +1,65 @@
+"""Database pool statistics count checkouts, waits and timeouts."""
+import asyncio
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from api.config import config
+from api.database.database import engine
+from api.database.pool import InstrumentedQueuePool
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def one_connection_engine(database):
+    """Engine with a pool of one connection and no overflow."""
+    small_engine = create_async_engine(url=config.api_db_url,
+                                       poolclass=InstrumentedQueuePool,
+                                       pool_size=1,
+                                       max_overflow=0,
+                                       pool_timeout=0.2)
+    yield small_engine
+    await small_engine.dispose()
+
+
+async def test_checkouts_are_counted(database):
+    before = engine.pool.get_stats()
+    for _ in range(3):
+        async with database() as session:
+            await session.execute(text('SELECT 1'))
+    stats = engine.pool.get_stats()
+    assert stats.checkouts - before.checkouts == 3
+    assert stats.checked_out == 0
+
+
+async def test_waiting_for_a_connection_is_measured(one_connection_engine):
+    async def hold_connection():
+        async with one_connection_engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+            held.set()
+            await asyncio.sleep(0.1)
+
+    held = asyncio.Event()
+    holder = asyncio.create_task(hold_connection())
+    await held.wait()
+    async with one_connection_engine.connect() as connection:
+        await connection.execute(text('SELECT 1'))
+    await holder
+
+    stats = one_connection_engine.pool.get_stats()
+    assert stats.checkouts == 2
+    assert stats.connects == 1
+    assert 0.05 < stats.max_wait_seconds < 0.2
+    assert stats.total_wait_seconds >= stats.max_wait_seconds
+    assert stats.timeouts == 0
+
+
+async def test_timeouts_are_counted(one_connection_engine):
+    async with one_connection_engine.connect() as connection:
+        await connection.execute(text('SELECT 1'))
+        with pytest.raises(PoolTimeoutError):
+            async with one_connection_engine.connect():
+                pass
+    assert one_connection_engine.pool.get_stats().timeouts == 1
@@ -0,0 +1,43 @@
+"""Prompts start with the same system message, so the provider caches it."""
+from openai.types import CompletionUsage
+from openai.types.completion_usage import PromptTokensDetails
+from api.llm.prompt import PromptManager
+from api.schemas.stats import AIUsageStats
+from api.schemas.user import User
+
+
+RUNNER = User(id=1, username='Анна', age=25, gender='female', goal='Пробежать марафон')
+LIFTER = User(id=2, username='Иван', age=40, gender='male', goal='Набрать мышечную массу')
+
+
+def test_system_message_is_the_same_for_every_user():
+    prompts = [PromptManager.get_user_request_prompt(RUNNER, 'Как бегать?'),
+               PromptManager.get_user_request_prompt(LIFTER, 'Сколько отдыхать?')]
+    assert prompts[0][0] == prompts[1][0] == {
+        'role': 'system', 'content': PromptManager.USER_REQUEST_SYSTEM_PROMPT}
+    # the user's data and request come after the cached prefix
+    assert 'Анна' not in prompts[0][0]['content']
+    assert 'Анна' in prompts[0][1]['content']
+    assert 'Как бегать?' in prompts[0][1]['content']
+
+
+def test_plan_prompts_share_the_plan_prefix():
+    prompts = [PromptManager.get_plan_prompt(RUNNER, None),
+               PromptManager.get_plan_prompt(LIFTER, 'Без штанги')]
+    assert prompts[0][0]['content'] == prompts[1][0]['content'] == \
+        PromptManager.PLAN_SYSTEM_PROMPT
+    assert 'Набрать мышечную массу' in prompts[1][1]['content']
+
+
+def test_usage_counts_cached_prompt_tokens():
+    stats = AIUsageStats()
+    stats.record(CompletionUsage(prompt_tokens=1000, completion_tokens=200, total_tokens=1200,
+                                 prompt_tokens_details=PromptTokensDetails(cached_tokens=800)),
+                 latency_seconds=1.5)
+    # streams can end without usage
+    stats.record(None, latency_seconds=0.5)
+    assert stats.requests == 2
+    assert stats.prompt_tokens == 1000
+    assert stats.cached_prompt_tokens == 800
+    assert stats.completion_tokens == 200
+    assert stats.total_latency_seconds == 2.0
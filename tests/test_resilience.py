@@ -0,0 +1,180 @@
+"""AI requests are retried within the deadline and fail fast when the provider is down."""
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import asyncio
+import httpx
+import openai
+import pytest
+from api.exceptions import AIRequestError
+from api.llm.resilience import CircuitBreaker, CircuitState, RetryPolicy
+
+
+def make_status_error(status_code: int, headers: dict[str, str] | None = None
+                      ) -> openai.APIStatusError:
+    """Make an error of the provider's answer with the status code."""
+    response = httpx.Response(status_code, headers=headers,
+                              request=httpx.Request('POST', 'https://ai.test/chat'))
+    return openai.APIStatusError('error', response=response, body=None)
+
+
+def make_breaker(open_seconds: float = 0) -> CircuitBreaker:
+    return CircuitBreaker(failure_rate_threshold=0.5, min_requests=4,
+                          window_seconds=60, open_seconds=open_seconds)
+
+
+def open_circuit(breaker: CircuitBreaker):
+    for _ in range(4):
+        breaker.record_failure(breaker.before_request())
+
+
+def test_opens_when_too_many_requests_fail():
+    breaker = make_breaker(open_seconds=60)
+    for success in (True, False, True):
+        probe = breaker.before_request()
+        (breaker.record_success if success else breaker.record_failure)(probe)
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure(breaker.before_request())
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(AIRequestError):
+        breaker.before_request()
+
+
+def test_lets_one_probe_through_when_half_open():
+    breaker = make_breaker()
+    open_circuit(breaker)
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.before_request() is True
+    with pytest.raises(AIRequestError):
+        breaker.before_request()
+
+
+@pytest.mark.parametrize('success, state', [(True, CircuitState.CLOSED),
+                                            (False, CircuitState.OPEN)])
+def test_probe_decides_the_circuit(success, state):
+    breaker = make_breaker(open_seconds=0.05)
+    open_circuit(breaker)
+    # the circuit is half-open after open_seconds
+    breaker._opened_at -= 0.05
+    probe = breaker.before_request()
+    (breaker.record_success if success else breaker.record_failure)(probe)
+    assert breaker.state == state
+
+
+@pytest.mark.parametrize('success', [True, False])
+def test_late_requests_dont_decide_the_circuit(success):
+    breaker = make_breaker()
+    # sent while the circuit was closed
+    late = breaker.before_request()
+    open_circuit(breaker)
+    probe = breaker.before_request()
+    (breaker.record_success if success else breaker.record_failure)(late)
+    assert breaker.state == CircuitState.HALF_OPEN
+    # the probe is still the only request let through
+    with pytest.raises(AIRequestError):
+        breaker.before_request()
+    breaker.record_success(probe)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_only_cancelled_probe_lets_another_one_through():
+    breaker = make_breaker()
+    late = breaker.before_request()
+    open_circuit(breaker)
+    probe = breaker.before_request()
+    breaker.cancel_request(late)
+    with pytest.raises(AIRequestError):
+        breaker.before_request()
+    breaker.cancel_request(probe)
+    assert breaker.before_request() is True
+
+
+@pytest.mark.anyio
+async def test_retries_until_success():
+    errors = [make_status_error(503), openai.APIConnectionError(
+        request=httpx.Request('POST', 'https://ai.test/chat'))]
+
+    async def request():
+        if errors:
+            raise errors.pop(0)
+        return 'answer'
+
+    policy = RetryPolicy(max_retries=2, deadline_seconds=5,
+                         base_delay_seconds=0.001, max_delay_seconds=0.001)
+    assert await policy.run(request, make_breaker()) == 'answer'
+    assert errors == []
+
+
+@pytest.mark.anyio
+async def test_wrong_requests_are_not_retried():
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        raise make_status_error(400)
+
+    breaker = make_breaker()
+    policy = RetryPolicy(max_retries=3, deadline_seconds=5,
+                         base_delay_seconds=0.001, max_delay_seconds=0.001)
+    with pytest.raises(AIRequestError):
+        await policy.run(request, breaker)
+    assert len(attempts) == 1
+    # the provider works, the circuit stays closed
+    assert breaker._results[-1][1] is True
+
+
+@pytest.mark.anyio
+async def test_request_is_cut_at_the_deadline():
+    async def request():
+        await asyncio.sleep(60)
+
+    policy = RetryPolicy(max_retries=3, deadline_seconds=0.05,
+                         base_delay_seconds=0.001, max_delay_seconds=0.001)
+    with pytest.raises(AIRequestError, match="didn't answer"):
+        await asyncio.wait_for(policy.run(request, make_breaker()), 1)
+
+
+@pytest.mark.anyio
+async def test_no_retry_that_cant_start_before_the_deadline():
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        raise make_status_error(429, {'retry-after': '10'})
+
+    policy = RetryPolicy(max_retries=3, deadline_seconds=1,
+                         base_delay_seconds=0.001, max_delay_seconds=0.001)
+    with pytest.raises(AIRequestError):
+        await asyncio.wait_for(policy.run(request, make_breaker()), 1)
+    assert len(attempts) == 1
+
+
+@pytest.mark.parametrize('attempt, max_delay', [(1, 0.1), (3, 0.4), (10, 1.0)])
+def test_backoff_has_full_jitter(attempt, max_delay):
+    policy = RetryPolicy(max_retries=10, deadline_seconds=60,
+                         base_delay_seconds=0.1, max_delay_seconds=1.0)
+    delays = [policy._get_delay(make_status_error(503), attempt) for _ in range(200)]
+    assert all(0 <= delay <= max_delay for delay in delays)
+    # the delays are spread, not fixed
+    assert max(delays) - min(delays) > max_delay / 2
+
+
+@pytest.mark.parametrize('headers, delay', [
+    ({'retry-after': '3'}, 3),
+    ({'retry-after': '1.5'}, 1.5),
+    # milliseconds are more precise and go first
+    ({'retry-after-ms': '250', 'retry-after': '3'}, 0.25),
+    ({'retry-after-ms': 'soon', 'retry-after': '3'}, 3),
+    ({'retry-after': 'soon'}, None),
+    ({}, None),
+])
+def test_retry_after_is_read(headers, delay):
+    assert RetryPolicy._get_retry_after(make_status_error(429, headers)) == delay
+
+
+def test_retry_after_date_is_read():
+    date = datetime.now(timezone.utc) + timedelta(seconds=30)
+    headers = {'retry-after': format_datetime(date, usegmt=True)}
+    delay = RetryPolicy._get_retry_after(make_status_error(429, headers))
+    assert 28 <= delay <= 30
+    past = {'retry-after': format_datetime(date - timedelta(hours=1), usegmt=True)}
+    assert RetryPolicy._get_retry_after(make_status_error(429, past)) == 0
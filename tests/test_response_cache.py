@@ -0,0 +1,100 @@
+"""AI responses are cached for the requested model and calls are shared."""
+import asyncio
+import pytest
+from api.llm.ai_client import AIClient
+from api.llm.cache import ResponseCache
+from api.llm.scheduler import Priority
+from api.llm.single_flight import SingleFlight
+from api.schemas.activity_level import ActivityLevel
+from api.schemas.user import User
+
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = [{'role': 'user', 'content': 'Как правильно приседать?'}]
+
+
+@pytest.fixture
+def cache(monkeypatch) -> ResponseCache:
+    cache = ResponseCache(max_entries=10)
+    monkeypatch.setattr(AIClient, 'CACHE', cache)
+    monkeypatch.setattr(AIClient, 'SINGLE_FLIGHT', SingleFlight())
+    return cache
+
+
+async def test_cache_is_not_used_with_zero_ttl(cache):
+    user = User(id=1, gender='male')
+
+    async def call() -> str:
+        return 'answer'
+
+    response = await AIClient._get_response(user, 'chat', MESSAGES, 'model', 0, call)
+    assert response == 'answer'
+    stats = cache.get_stats()
+    assert (stats.hits, stats.misses, stats.entries) == (0, 0, 0)
+
+
+async def test_hedge_answer_is_found_by_the_same_request(cache, monkeypatch):
+    user = User(id=1, gender='male')
+    calls = []
+
+    async def call_model(model: str) -> str:
+        calls.append(model)
+        return f'{model} answer'
+
+    async def hedge(call, model, priority, tokens, discard=None):
+        # the hedge model answered first
+        return 'hedge-model', await call('hedge-model')
+
+    monkeypatch.setattr(AIClient, '_hedge', hedge)
+
+    async def call() -> str:
+        _, response = await AIClient._hedge(call_model, 'model', Priority.INTERACTIVE, 0)
+        return response
+
+    for _ in range(2):
+        response = await AIClient._get_response(user, 'chat', MESSAGES, 'model', 60, call)
+        assert response == 'hedge-model answer'
+    assert calls == ['hedge-model']
+    assert cache.get_stats().hits == 1
+
+
+async def test_level_change_makes_a_new_key(cache):
+    level = ActivityLevel(level=1, name='Низкий', description='Мало двигается')
+    user = User(id=1, gender='male', activity_level=1, activity_level_info=level)
+    calls = []
+
+    async def call() -> str:
+        calls.append(True)
+        return f'answer {len(calls)}'
+
+    async def get_response(user: User) -> str:
+        return await AIClient._get_response(user, 'chat', MESSAGES, 'model', 60, call)
+
+    assert await get_response(user) == 'answer 1'
+    assert await get_response(user) == 'answer 1'
+    # the level was edited, the user wasn't
+    edited_level = level.model_copy(update={'description': 'Ходит пешком каждый день'})
+    edited = user.model_copy(update={'activity_level_info': edited_level})
+    assert await get_response(edited) == 'answer 2'
+
+
+async def test_interactive_call_joins_the_speculative_one(cache):
+    user = User(id=1, gender='male')
+    calls = []
+    finish = asyncio.Event()
+
+    async def call() -> str:
+        calls.append(True)
+        await finish.wait()
+        return 'answer'
+
+    speculative = asyncio.create_task(AIClient._get_response(
+        user, 'plan', MESSAGES, 'model', 0, call))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(AIClient._get_response(
+        user, 'plan', MESSAGES, 'model', 0, call))
+    await asyncio.sleep(0)
+    finish.set()
+    assert await asyncio.gather(speculative, interactive) == ['answer', 'answer']
+    assert len(calls) == 1
@@ -0,0 +1,93 @@
+"""FAQ answers are shared as hints, and sent directly only to their user."""
+import pytest
+from api.config import config
+from api.llm.ai_client import AIClient
+from api.llm.retrieval import FAQIndex, HashedNgramEmbedder
+from api.schemas.stats import AIFAQStats
+from api.schemas.user import User
+
+
+pytestmark = pytest.mark.anyio
+
+
+def test_search_finds_answers_of_every_owner():
+    index = FAQIndex(HashedNgramEmbedder(256), capacity=10)
+    index.add(1, "Как правильно приседать?", "ответ первому")
+    index.add(2, "Сколько отдыхать между подходами?", "ответ второму")
+
+    matches = index.search("как правильно приседать", top_k=2)
+    assert [match.answer for match in matches] == ["ответ первому", "ответ второму"]
+    assert matches[0].score > 0.9
+    assert matches[0].owner == 1
+
+
+def test_owner_search_skips_other_owners_and_versions():
+    index = FAQIndex(HashedNgramEmbedder(256), capacity=10)
+    index.add(1, "Как правильно приседать?", "старый ответ", version="v1")
+    index.add(1, "Как правильно приседать?", "новый ответ", version="v2")
+    index.add(2, "Как правильно приседать?", "ответ второму", version="v2")
+
+    matches = index.search("Как правильно приседать?", top_k=5, owner=1, version="v2")
+    assert [match.answer for match in matches] == ["новый ответ"]
+    assert index.search("Как правильно приседать?", owner=1, version="v3") == []
+    assert index.search("Как правильно приседать?", owner=3) == []
+
+
+def test_oldest_pairs_are_replaced():
+    index = FAQIndex(HashedNgramEmbedder(256), capacity=2)
+    index.add(1, "Как правильно приседать?", "старый ответ")
+    index.add(2, "Сколько отдыхать между подходами?", "ответ")
+    index.add(2, "Как правильно приседать?", "новый ответ")
+
+    assert len(index) == 2
+    assert index.search("Как правильно приседать?", owner=1) == []
+    assert index.search("Как правильно приседать?")[0].answer == "новый ответ"
+
+
+@pytest.fixture
+def faq_index(monkeypatch) -> FAQIndex:
+    index = FAQIndex(HashedNgramEmbedder(256), capacity=10)
+    monkeypatch.setattr(AIClient, 'FAQ_INDEX', index)
+    monkeypatch.setattr(AIClient, 'FAQ_STATS', AIFAQStats())
+    monkeypatch.setattr(config, 'AI_FAQ_ANSWER_DIRECTLY', True)
+    monkeypatch.setattr(config, 'AI_CACHE_CHAT_TTL_SECONDS', 0)
+    return index
+
+
+@pytest.fixture
+def model_prompts(monkeypatch) -> list[list[dict]]:
+    """Prompts sent to the model, it answers with a new answer."""
+    prompts = []
+
+    async def create_text_response(messages, priority, model, hedge=False):
+        prompts.append(messages)
+        return "ответ модели"
+
+    monkeypatch.setattr(AIClient, '_create_text_response', create_text_response)
+    return prompts
+
+
+async def test_profile_update_stops_the_direct_answer(faq_index, model_prompts):
+    user = User(id=1, gender='male', weight_kg=90, updated_at='2026-01-01T10:00:00+00:00')
+    faq_index.add(1, "Сколько мне бегать?", "При весе 90 кг бегайте 20 минут",
+                  AIClient._get_profile_version(user))
+
+    assert await AIClient.generate_user_response(user, "Сколько мне бегать?") == \
+        "При весе 90 кг бегайте 20 минут"
+    assert model_prompts == []
+
+    updated = user.model_copy(update={'weight_kg': 70,
+                                      'updated_at': '2026-02-01T10:00:00+00:00'})
+    assert await AIClient.generate_user_response(updated, "Сколько мне бегать?") == \
+        "ответ модели"
+    # the old answer is only a hint now
+    assert "При весе 90 кг" in model_prompts[0][-1]['content']
+
+
+async def test_other_users_answer_is_a_hint(faq_index, model_prompts):
+    faq_index.add(2, "Как правильно приседать?", "Держите спину прямо", "v1")
+    user = User(id=1, gender='female')
+
+    assert await AIClient.generate_user_response(user, "как правильно приседать") == \
+        "ответ модели"
+    assert "Держите спину прямо" in model_prompts[0][-1]['content']
@@ -0,0 +1,46 @@
+"""Scheduler slots are not lost when waiters are cancelled."""
+import asyncio
+import pytest
+from api.llm.scheduler import LLMScheduler, Priority
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def use_slot(scheduler: LLMScheduler, priority: Priority):
+    async with scheduler.slot(priority, tokens=0):
+        await asyncio.sleep(0)
+
+
+async def test_slot_goes_to_next_waiter_when_first_is_cancelled():
+    scheduler = LLMScheduler(max_concurrency=1)
+    async with scheduler.slot(Priority.BACKGROUND, tokens=0):
+        cancelled = asyncio.create_task(use_slot(scheduler, Priority.BACKGROUND))
+        waiting = asyncio.create_task(use_slot(scheduler, Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        assert scheduler.get_stats().queued_background == 2
+        # the slot is released before the cancelled task removes its waiter
+        cancelled.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    await waiting
+
+    stats = scheduler.get_stats()
+    assert stats.active == 0
+    assert stats.queued_background == 0
+
+
+async def test_cancelled_last_waiter_frees_the_slot():
+    scheduler = LLMScheduler(max_concurrency=1)
+    async with scheduler.slot(Priority.INTERACTIVE, tokens=0):
+        cancelled = asyncio.create_task(use_slot(scheduler, Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+    stats = scheduler.get_stats()
+    assert stats.active == 0
+    assert stats.queued_interactive == 0
@@ -0,0 +1,72 @@
+"""Identical AI calls are shared between API workers."""
+import asyncio
+import pytest
+from api.llm.single_flight import SingleFlight
+
+
+pytestmark = pytest.mark.anyio
+
+KEY = SingleFlight.make_key(1, 'chat', 'Вопрос')
+
+
+class FinishingRedis:
+    """Redis that finishes the other worker's call right before the first GET."""
+
+    def __init__(self, redis, finish):
+        self._redis = redis
+        self._finish = finish
+        self._finished = False
+
+    def __getattr__(self, name):
+        return getattr(self._redis, name)
+
+    async def get(self, key):
+        if not self._finished:
+            self._finished = True
+            await self._finish()
+        return await self._redis.get(key)
+
+
+async def test_expired_lock_of_another_worker_is_kept(redis):
+    slow_worker = SingleFlight(redis, lock_ttl_seconds=0.05, poll_interval_seconds=0.01)
+
+    async def slow_call() -> str:
+        await asyncio.sleep(0.1)
+        return 'Ответ'
+
+    call = asyncio.create_task(slow_worker.run(KEY, slow_call))
+    await asyncio.sleep(0.07)
+    # the lock has expired, another worker takes it
+    await redis.set(KEY, 'other-flight')
+    assert await call == 'Ответ'
+    assert await redis.get(KEY) == b'other-flight'
+
+
+async def test_call_finished_after_lock_check_is_not_repeated(redis):
+    # another worker holds the lock when this one tries to take it
+    await redis.set(KEY, 'other-flight')
+
+    async def finish_other_call():
+        await redis.set(f"{KEY}:other-flight", 'Ответ')
+        await redis.set(f"{KEY}:last", 'other-flight')
+        await redis.delete(KEY)
+
+    async def repeated_call() -> str:
+        raise AssertionError("The call was made twice")
+
+    worker = SingleFlight(FinishingRedis(redis, finish_other_call), poll_interval_seconds=0.01)
+    assert await worker.run(KEY, repeated_call) == 'Ответ'
+
+
+async def test_failed_call_of_another_worker_is_retried(redis):
+    await redis.set(KEY, 'other-flight')
+
+    async def fail_other_call():
+        await redis.set(f"{KEY}:last", 'other-flight')
+        await redis.delete(KEY)
+
+    async def call() -> str:
+        return 'Новый ответ'
+
+    worker = SingleFlight(FinishingRedis(redis, fail_other_call), poll_interval_seconds=0.01)
+    assert await worker.run(KEY, call) == 'Новый ответ'
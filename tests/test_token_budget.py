@@ -0,0 +1,54 @@
+"""Prompts stay within the token budget."""
+from api.config import config
+from api.llm.prompt import PromptManager
+from api.llm.token_budget import estimate_messages_tokens, estimate_tokens, get_max_tokens, \
+    truncate_to_tokens
+from api.schemas.training_plan import TrainingPlan, TrainingPlanDay
+from api.schemas.user import User
+
+
+def test_truncated_text_fits_the_limit():
+    text = 'Хочу бегать по утрам и не уставать. ' * 100
+    truncated = truncate_to_tokens(text, 50)
+    assert estimate_tokens(truncated) <= 50
+    assert truncated.endswith('…')
+    # short texts and None are kept
+    assert truncate_to_tokens('Бегать', 50) == 'Бегать'
+    assert truncate_to_tokens(None, 50) is None
+
+
+def test_max_tokens_is_the_rest_of_the_context(monkeypatch):
+    monkeypatch.setattr(config, 'AI_CONTEXT_TOKENS', 1000)
+    monkeypatch.setattr(config, 'AI_MAX_OUTPUT_TOKENS', 500)
+    monkeypatch.setattr(config, 'AI_MIN_OUTPUT_TOKENS', 100)
+    short = [{'role': 'user', 'content': 'a' * 40}]
+    long = [{'role': 'user', 'content': 'a' * 2800}]
+    huge = [{'role': 'user', 'content': 'a' * 4000}]
+    assert get_max_tokens(short) == 500
+    assert get_max_tokens(long) == 1000 - estimate_messages_tokens(long)
+    assert get_max_tokens(huge) == 100
+
+
+def test_long_goal_is_cut_in_the_prompt(monkeypatch):
+    monkeypatch.setattr(config, 'AI_MAX_TEXT_FIELD_TOKENS', 20)
+    user = User(id=1, gender='male', goal='Похудеть к лету. ' * 200)
+    user_message = PromptManager.get_user_request_prompt(user, 'Как начать?')[1]['content']
+    assert estimate_tokens(user_message) < estimate_tokens(user.goal)
+
+
+def test_previous_plan_is_sent_as_day_titles():
+    days = [TrainingPlanDay(weekday=weekday, title=f'Тренировка {weekday}',
+                            description='Подробное описание упражнений. ' * 50)
+            for weekday in range(7)]
+    plan = TrainingPlan(id=1, user_id=1, plan_description='План', days=days)
+    summary = PromptManager.get_plan_summary(plan)
+    assert summary.splitlines()[0] == 'Понедельник: Тренировка 0'
+    assert len(summary.splitlines()) == 7
+    assert 'Подробное описание' not in summary
+
+
+def test_previous_plan_text_is_summarized_by_days():
+    plan = TrainingPlan(id=1, user_id=1, plan_description=(
+        'ПОНЕДЕЛЬНИК:\nБег 5 км\nРазминка и заминка\n\n'
+        'ВТОРНИК:\nОтдых\nПрогулка'))
+    assert PromptManager.get_plan_summary(plan) == 'Понедельник: Бег 5 км\nВторник: Отдых'
@@ -0,0 +1,118 @@
+"""Users and plans are created or replaced with one statement, same data changes nothing."""
+import warnings
+import httpx
+import pytest
+from sqlalchemy.exc import SAWarning
+from api.config import config
+from api.exceptions import NotFoundError
+from api.main import app
+from api.schemas.training_plan import TrainingPlanInput, TrainingPlanUpdate, WEEKDAYS
+from api.schemas.user import UserUpsert
+from api.service import training_plan as plan_service
+from api.service import user as user_service
+from api.service.plan_job import plan_job_queue
+
+
+pytestmark = pytest.mark.anyio
+
+DESCRIPTION = ' '.join(WEEKDAYS)
+
+
+def make_days(title: str) -> list[dict]:
+    return [{'weekday': weekday, 'title': title, 'description': 'Упражнения'}
+            for weekday in range(7)]
+
+
+@pytest.fixture(autouse=True)
+def fail_on_sqlalchemy_warnings():
+    # e.g. a cartesian product in the upsert statements
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', SAWarning)
+        yield
+
+
+async def test_user_is_created_then_replaced(database):
+    async with database() as session:
+        created, _ = await user_service.upsert(
+            1, UserUpsert(age=30, gender='male', goal='Похудеть'), session=session)
+        replaced, _ = await user_service.upsert(
+            1, UserUpsert(age=31, gender='female'), session=session)
+        user = await user_service.get_by_id(1, session=session)
+
+    assert created.goal == 'Похудеть'
+    assert (replaced.age, replaced.gender, replaced.goal) == (31, 'female', None)
+    assert replaced.updated_at > created.updated_at
+    assert (user.age, user.gender, user.goal) == (31, 'female', None)
+
+
+async def test_same_data_changes_nothing(database):
+    async with database() as session:
+        created, created_changed = await user_service.upsert(
+            1, UserUpsert(age=30, gender='male'), session=session)
+        same, same_changed = await user_service.upsert(
+            1, UserUpsert(age=30, gender='male'), session=session)
+        _, goal_changed = await user_service.upsert(
+            1, UserUpsert(age=30, gender='male', goal='Похудеть'), session=session)
+
+    assert (created_changed, same_changed, goal_changed) == (True, False, True)
+    # the plan draft made for the profile stays valid
+    assert same.updated_at == created.updated_at
+
+
+async def test_draft_is_queued_only_for_changed_users(database, monkeypatch):
+    drafts = []
+    monkeypatch.setattr(config, 'PLAN_PREGENERATE', True)
+    monkeypatch.setattr(plan_job_queue, 'submit_draft', drafts.append)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        for age in (30, 30, 31):
+            response = await client.put('/user/1', json={'age': age, 'gender': 'male'})
+            assert response.status_code == 200
+    assert drafts == [1, 1]
+
+
+async def test_user_with_unknown_level_is_not_found(database):
+    async with database() as session:
+        with pytest.raises(NotFoundError):
+            await user_service.upsert(1, UserUpsert(age=30, gender='male', activity_level=7),
+                                      session=session)
+
+
+async def test_plan_days_are_replaced(database):
+    async with database() as session:
+        await user_service.upsert(1, UserUpsert(age=30, gender='male'), session=session)
+        created = await plan_service.upsert_user_plan(
+            1, TrainingPlanInput(plan_description=DESCRIPTION, days=make_days('Ноги')),
+            session=session)
+        replaced = await plan_service.upsert_user_plan(
+            1, TrainingPlanInput(plan_description=DESCRIPTION, days=make_days('Спина')),
+            session=session)
+        plan = await plan_service.get_user_plan(1, session=session)
+
+    assert replaced.id == created.id
+    assert [day.title for day in plan.days] == ['Спина'] * 7
+
+
+async def test_plan_days_are_updated_and_cleared(database):
+    async with database() as session:
+        await user_service.upsert(1, UserUpsert(age=30, gender='male'), session=session)
+        await plan_service.upsert_user_plan(
+            1, TrainingPlanInput(plan_description=DESCRIPTION, days=make_days('Ноги')),
+            session=session)
+        await plan_service.update_user_plan(
+            1, TrainingPlanUpdate(days=make_days('Кардио')), session=session)
+        updated = await plan_service.get_user_plan(1, session=session)
+        await plan_service.upsert_user_plan(
+            1, TrainingPlanInput(plan_description=DESCRIPTION), session=session)
+        cleared = await plan_service.get_user_plan(1, session=session)
+
+    assert [day.title for day in updated.days] == ['Кардио'] * 7
+    assert cleared.days == []
+
+
+async def test_plan_of_unknown_user_is_not_found(database):
+    async with database() as session:
+        with pytest.raises(NotFoundError):
+            await plan_service.upsert_user_plan(
+                1, TrainingPlanInput(plan_description=DESCRIPTION, days=make_days('Ноги')),
+                session=session)
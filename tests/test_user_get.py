@@ -0,0 +1,57 @@
+"""The user is served with the plan by default, and without it on request."""
+import httpx
+import pytest
+from api.main import app
+from api.schemas.training_plan import TrainingPlanInput, TrainingPlanUpdate, WEEKDAYS
+from api.schemas.user import UserUpsert
+from api.service import training_plan as plan_service
+from api.service import user as user_service
+
+
+pytestmark = pytest.mark.anyio
+
+DESCRIPTION = ' '.join(WEEKDAYS)
+
+
+async def add_user_with_plan(session_maker):
+    async with session_maker() as session:
+        await user_service.upsert(1, UserUpsert(age=30, gender='male'), session=session)
+        await plan_service.upsert_user_plan(1, TrainingPlanInput(plan_description=DESCRIPTION),
+                                            session=session)
+
+
+async def get_user(params: dict | None = None, etag: str | None = None) -> httpx.Response:
+    headers = {'If-None-Match': etag} if etag is not None else {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        return await client.get('/user/get/1', params=params, headers=headers)
+
+
+async def test_plan_is_loaded_by_default(database):
+    await add_user_with_plan(database)
+    full = await get_user()
+    summary = await get_user({'exclude': 'training_plan'})
+
+    assert full.status_code == summary.status_code == 200
+    assert full.json()['training_plan']['plan_description'] == DESCRIPTION
+    assert summary.json()['training_plan'] is None
+    assert full.json() | {'training_plan': None} == summary.json()
+
+
+async def test_profiles_have_their_own_etags(database):
+    await add_user_with_plan(database)
+    full_etag = (await get_user()).headers['ETag']
+    summary_etag = (await get_user({'exclude': 'training_plan'})).headers['ETag']
+    assert full_etag != summary_etag
+
+    # the ETag of one profile doesn't match the other one
+    assert (await get_user(etag=summary_etag)).status_code == 200
+    assert (await get_user({'exclude': 'training_plan'}, full_etag)).status_code == 200
+    assert (await get_user(etag=full_etag)).status_code == 304
+
+    async with database() as session:
+        await plan_service.update_user_plan(
+            1, TrainingPlanUpdate(plan_description=DESCRIPTION.upper()), session=session)
+    # the plan is not a part of the user without it
+    assert (await get_user(etag=full_etag)).status_code == 200
+    assert (await get_user({'exclude': 'training_plan'}, summary_etag)).status_code == 304
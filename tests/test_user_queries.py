@@ -0,0 +1,68 @@
+"""Listing users makes the same number of queries for any number of users."""
+from contextlib import contextmanager
+import httpx
+import pytest
+from sqlalchemy import event
+from api.database.database import engine
+from api.database.models import ActivityLevelModel, TrainingPlanDayModel, TrainingPlanModel, \
+    UserModel
+from api.main import app
+
+
+pytestmark = pytest.mark.anyio
+
+
+@contextmanager
+def count_statements():
+    """Count statements executed by the engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+
+
+async def add_users(session_maker, user_ids: range):
+    """Add users with activity levels and plans to the test database."""
+    async with session_maker() as session:
+        for user_id in user_ids:
+            session.add(ActivityLevelModel(level=user_id, name=f'Уровень {user_id}',
+                                           description='Описание'))
+            session.add(UserModel(id=user_id, age=30, weight_kg=80, height_cm=180,
+                                  gender='male', activity_level=user_id))
+            session.add(TrainingPlanModel(
+                user_id=user_id, plan_description='План',
+                days=[TrainingPlanDayModel(weekday=weekday, title='Отдых', description='Прогулка')
+                      for weekday in range(7)]))
+        await session.commit()
+
+
+async def get_all_users() -> tuple[list[dict], int]:
+    """Get the users page and the number of statements it took."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url='http://test') as client:
+        with count_statements() as statements:
+            response = await client.get('/user/all')
+    assert response.status_code == 200
+    return response.json(), len(statements)
+
+
+async def test_user_list_statements_dont_grow_with_users(database):
+    await add_users(database, range(1, 3))
+    users, few_users_statements = await get_all_users()
+    assert len(users) == 2
+
+    await add_users(database, range(3, 11))
+    users, many_users_statements = await get_all_users()
+    assert len(users) == 10
+    assert all(user['activity_level_info'] is not None for user in users)
+    assert all(len(user['training_plan']['days']) == 7 for user in users)
+
+    assert many_users_statements == few_users_statements
+    # users joined with levels and plans, then the days of all plans
+    assert many_users_statements == 2
@@ -0,0 +1,21 @@
+"""Last-Modified is right whatever the database time zone is."""
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import pytest
+from sqlalchemy import text
+from api.routes.utils import get_version_headers
+from api.schemas.user import UserUpsert
+from api.service import user as user_service
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_last_modified_is_utc_on_a_non_utc_server(database):
+    async with database() as session:
+        await session.execute(text("SET TIME ZONE 'Asia/Tokyo'"))
+        await user_service.upsert(1, UserUpsert(age=30, gender='male'), session=session)
+        version = await user_service.get_version(1, session=session)
+
+    last_modified = parsedate_to_datetime(get_version_headers(version)['Last-Modified'])
+    assert abs(last_modified - datetime.now(timezone.utc)) < timedelta(minutes=1)
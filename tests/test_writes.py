@@ -0,0 +1,100 @@
+"""Entries are updated and deleted with one statement, related rows by the database."""
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event, func, select
+from api.database.crud import ActivityLevelCRUD, TrainingPlanCRUD, UserCRUD
+from api.database.database import engine
+from api.database.models import ActivityLevelModel, TrainingPlanDayModel, TrainingPlanModel, \
+    UserModel
+from api.exceptions import NotFoundError
+from api.schemas.training_plan import TrainingPlanDayInput, TrainingPlanUpdate
+from api.schemas.user import UserUpdate
+
+
+pytestmark = pytest.mark.anyio
+
+
+@contextmanager
+def count_statements():
+    """Count statements executed by the engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+
+
+async def add_user_with_plan(session_maker):
+    """Add a user with an activity level and a plan of 7 days."""
+    async with session_maker() as session:
+        session.add(ActivityLevelModel(level=1, name='Низкий', description='Мало двигается'))
+        session.add(UserModel(id=1, age=30, weight_kg=80, height_cm=180,
+                              gender='male', activity_level=1))
+        session.add(TrainingPlanModel(
+            user_id=1, plan_description='План',
+            days=[TrainingPlanDayModel(weekday=weekday, title='Отдых', description='Прогулка')
+                  for weekday in range(7)]))
+        await session.commit()
+
+
+async def count_rows(session, model) -> int:
+    return await session.scalar(select(func.count()).select_from(model))
+
+
+async def test_user_is_updated_with_one_statement(database):
+    await add_user_with_plan(database)
+    async with database() as session:
+        with count_statements() as statements:
+            await UserCRUD.update_by_id(1, UserUpdate(weight_kg=75), session=session)
+        assert len(statements) == 1
+        assert await session.scalar(select(UserModel.weight_kg)) == 75
+
+
+async def test_missing_entries_are_not_found(database):
+    async with database() as session:
+        with pytest.raises(NotFoundError):
+            await UserCRUD.update_by_id(1, UserUpdate(weight_kg=75), session=session)
+        # an empty update still checks the user
+        with pytest.raises(NotFoundError):
+            await UserCRUD.update_by_id(1, UserUpdate(), session=session)
+        with pytest.raises(NotFoundError):
+            await UserCRUD.delete_by_id(1, session=session)
+        with pytest.raises(NotFoundError):
+            await TrainingPlanCRUD.delete_by_user_id(1, session=session)
+
+
+async def test_deleted_user_takes_the_plan_and_days(database):
+    await add_user_with_plan(database)
+    async with database() as session:
+        with count_statements() as statements:
+            await UserCRUD.delete_by_id(1, session=session)
+        assert len(statements) == 1
+        assert await count_rows(session, TrainingPlanModel) == 0
+        assert await count_rows(session, TrainingPlanDayModel) == 0
+
+
+async def test_deleted_level_is_unset_for_users(database):
+    await add_user_with_plan(database)
+    async with database() as session:
+        await ActivityLevelCRUD.delete_by_id(1, session=session)
+        assert await session.scalar(select(UserModel.activity_level)) is None
+        assert await count_rows(session, UserModel) == 1
+
+
+async def test_plan_days_are_replaced_with_one_statement(database):
+    await add_user_with_plan(database)
+    days = [TrainingPlanDayInput(weekday=weekday, title='Бег', description='5 км')
+            for weekday in range(7)]
+    async with database() as session:
+        with count_statements() as statements:
+            plan = await TrainingPlanCRUD.update_by_user_id(
+                1, TrainingPlanUpdate(days=days), session=session)
+        assert len(statements) == 1
+        assert plan['plan_description'] == 'План'
+        titles = await session.scalars(select(TrainingPlanDayModel.title))
+        assert list(titles) == ['Бег'] * 7